@@ -1,38 +1,52 @@
+import argparse
+import signal
+import threading
 import cv2
-from ultralytics import YOLO
-import os
 import time
 import serial
 import serial.tools.list_ports
-import sqlite3
-from collections import Counter
-import pytesseract
-import random
+from frame_grabber import FrameGrabber
+from frame_ring import RingGrabber
+from ocr_engine import get_engine, close_engine
+from plate_tracker import PlateTracker
+from plate_pipeline import PlatePipeline, EntryDecider, adaptive_threshold, add_ocr_arguments
+from plate_detector import add_detector_arguments, detector_from_args, draw_boxes
+from motion_trigger import make_lane_trigger
+from gate_controller import GateController
+import db
+import metrics
+from write_behind import WriteBehind
+from plate_archive import PlateArchive
+from debug_preview import PreviewServer
+
+# === Run mode ===
+# --headless is for display-less gate PCs: no windows, no annotation and no
+# per-frame console output. --preview-port serves a throttled MJPEG preview
+# instead (http://<gate-pc>:<port>/), encoded only while someone watches.
+PREVIEW_FPS = 2
+parser = argparse.ArgumentParser(description="Entry gate")
+parser.add_argument('--headless', action='store_true', help="run without preview windows")
+parser.add_argument('--preview-port', type=int, help="serve a debug MJPEG preview on this port")
+parser.add_argument('--preview-fps', type=float, default=PREVIEW_FPS)
+parser.add_argument('--capture-process', action='store_true',
+                    help="read the camera in a separate process through shared memory (frame_ring.py)")
+add_ocr_arguments(parser)  # --ocr-variants (plate_pipeline.py)
+add_detector_arguments(parser)  # --backend, --imgsz, --roi, --detect-width, ... (plate_detector.py)
+args = parser.parse_args()
+headless = args.headless
 
 # === Setup ===
 
-# Path to Tesseract
-pytesseract.pytesseract.tesseract_cmd = r'C:\Users\mugis\AppData\Local\Programs\Tesseract-OCR\tesseract.exe'
-
-# Load model and create folder for saving plates
-model = YOLO('best.pt')
-save_dir = 'plates'
-os.makedirs(save_dir, exist_ok=True)
-
-# Connect to SQLite
-db_file = 'car_logs.db'
-conn = sqlite3.connect(db_file)
-cursor = conn.cursor()
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS car_entries (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        plate TEXT,
-        payment_status INTEGER,
-        entry_time TEXT,
-        exit_time TEXT
-    )
-''')
-conn.commit()
+# Shared OCR engine (whitelist and psm are configured once in ocr_engine)
+ocr = get_engine(pool_size=max(2, len(args.ocr_variants or ())))
+
+# Load the plate detector and warm it up before the first car arrives
+detector = detector_from_args(args)
+
+# Snapshots and DB inserts are written in the background; snapshots go to
+# the date-sharded archive under plates/
+writer = WriteBehind()
+archive = PlateArchive(writer=writer)
 
 # Detect Arduino
 def detect_arduino_port():
@@ -51,103 +65,102 @@ else:
     print("[ERROR] Arduino not detected.")
     arduino = None
 
-# Mock sensor distance (for testing)
-def mock_ultrasonic_distance():
-    return random.choice([random.randint(10, 40)] + [random.randint(60, 150)] * 10)
+# Gate runs on its own thread; the barrier stays up for GATE_HOLD_SECONDS
+GATE_HOLD_SECONDS = 2
+gate = GateController(arduino, hold_seconds=GATE_HOLD_SECONDS, name='entry-gate')
+
+# Lane trigger: 'motion' watches the camera, 'distance' reads the Arduino's ultrasonic sensor
+TRIGGER_SOURCE = 'motion'
+DISTANCE_THRESHOLD_CM = 50
+lane = make_lane_trigger(TRIGGER_SOURCE, arduino, DISTANCE_THRESHOLD_CM)
+
+# Prometheus scrape target for this lane (stage timings and counters);
+# `kill -USR1 <pid>` toggles a cProfile capture of the detection loop
+METRICS_PORT = 9101
+metrics.start_http_server(METRICS_PORT)
+metrics.install_profile_toggle()
 
 # === Main Logic ===
 
-cap = cv2.VideoCapture(0)
-plate_buffer = []
-last_saved_plate = None
-last_entry_time = 0
-entry_cooldown = 300  # seconds
+grabber = (RingGrabber if args.capture_process else FrameGrabber)(0, name='entry').start()
+tracker = PlateTracker()  # One consensus buffer per plate track
+pipeline = PlatePipeline(detector, ocr, tracker, adaptive_threshold, variants=args.ocr_variants)
+
+def record_entry(plate, timestamp, crop):
+    writer.log_entry(plate, timestamp)  # Insert into DB
+    archive.store(plate, crop)  # Save plate image (queued behind the entry so it links to its session)
+    print(f"[QUEUED] {plate} queued for DB.")
+
+decider = EntryDecider(gate, record_entry, cooldown_seconds=300)
+preview = PreviewServer(args.preview_port, fps=args.preview_fps).start() if args.preview_port else None
+
+# Ctrl+C / SIGTERM end the loop cleanly (there is no 'q' key without a window)
+stop_requested = threading.Event()
+for sig in (signal.SIGINT, signal.SIGTERM):
+    signal.signal(sig, lambda *_: stop_requested.set())
 
-print("[SYSTEM] Ready. Press 'q' to exit.")
+print("[SYSTEM] Ready. Press Ctrl+C to exit." if headless else "[SYSTEM] Ready. Press 'q' to exit.")
 
-while True:
-    ret, frame = cap.read()
-    if not ret:
+while not stop_requested.is_set():
+    captured = grabber.read()
+    if captured is None:
         break
+    frame = captured.image
+
+    lane_active = lane.update(frame)
+
+    if lane_active:
+        boxes, reads = pipeline.process(frame, intact=lambda: grabber.intact(captured))
+
+        for read in reads:
+            if read.candidate and not headless:
+                print(f"[VALID] Track {read.track.id}: Plate Detected: {read.candidate}")
+
+            decider.decide(read)
+
+            if not headless:
+                cv2.imshow("Plate Preview", read.crop)
+                cv2.imshow("Processed OCR", read.processed)
+
+    metrics.inc('frames', state='active' if lane_active else 'idle')
+    if lane_active:
+        # Latency is measured from when the camera delivered the frame
+        latency_ms = (time.monotonic() - captured.captured_at) * 1000
+        metrics.observe('frame', latency_ms / 1000)
+        if not headless:
+            print(f"[LATENCY] Frame {captured.seq}: {latency_ms:.0f} ms from capture")
+
+    if preview:
+        # Annotated at the preview rate, and only while a browser is watching
+        preview.offer(lambda: draw_boxes(frame, boxes) if lane_active else frame)
 
-    distance = mock_ultrasonic_distance()
-    print(f"[SENSOR] Distance: {distance} cm")
-
-    if distance <= 50:
-        results = model(frame)
-        for result in results:
-            for box in result.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                plate_img = frame[y1:y2, x1:x2]
-
-                # OCR Preprocessing
-                gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY)
-                blur = cv2.GaussianBlur(gray, (3, 3), 0)
-                thresh = cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                               cv2.THRESH_BINARY_INV, 11, 2)
-
-                plate_text = pytesseract.image_to_string(
-                    thresh, config='--psm 8 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-                ).strip().replace(" ", "")
-
-                if "RA" in plate_text:
-                    start_idx = plate_text.find("RA")
-                    plate_candidate = plate_text[start_idx:start_idx + 7]
-
-                    if len(plate_candidate) == 7:
-                        prefix, digits, suffix = plate_candidate[:3], plate_candidate[3:6], plate_candidate[6]
-                        if prefix.isalpha() and digits.isdigit() and suffix.isalpha():
-                            print(f"[VALID] Plate Detected: {plate_candidate}")
-                            plate_buffer.append(plate_candidate)
-
-                            if len(plate_buffer) >= 3:
-                                most_common = Counter(plate_buffer).most_common(1)[0][0]
-                                current_time = time.time()
-
-                                if (most_common != last_saved_plate or
-                                        (current_time - last_entry_time) > entry_cooldown):
-
-                                    # Save plate image
-                                    timestamp_str = time.strftime('%Y%m%d_%H%M%S')
-                                    image_filename = f"{plate_candidate}_{timestamp_str}.jpg"
-                                    save_path = os.path.join(save_dir, image_filename)
-                                    cv2.imwrite(save_path, plate_img)
-
-                                    # Insert into DB
-                                    cursor.execute('''
-                                        INSERT INTO car_entries (plate, payment_status, entry_time, exit_time)
-                                        VALUES (?, ?, ?, ?)
-                                    ''', (most_common, 0, time.strftime('%Y-%m-%d %H:%M:%S'), ''))
-                                    conn.commit()
-
-                                    print(f"[SAVED] {most_common} logged to DB.")
-                                    if arduino:
-                                        arduino.write(b'1')  # Open gate
-                                        print("[GATE] Opening gate")
-                                        time.sleep(2)
-                                        arduino.write(b'0')  # Close gate
-                                        print("[GATE] Closing gate")
-
-                                    last_saved_plate = most_common
-                                    last_entry_time = current_time
-                                else:
-                                    print("[SKIPPED] Duplicate plate in cooldown window.")
-
-                                plate_buffer.clear()
-
-                cv2.imshow("Plate Preview", plate_img)
-                cv2.imshow("Processed OCR", thresh)
+    if headless:
+        continue
 
     # Show webcam feed
-    annotated_frame = results[0].plot() if distance <= 50 else frame
+    annotated_frame = draw_boxes(frame, boxes) if lane_active else frame
     cv2.imshow('Webcam Feed', annotated_frame)
 
     if cv2.waitKey(1) & 0xFF == ord('q'):
         break
 
 # Cleanup
-cap.release()
+grabber.stop()
+print(f"[CAPTURE] {grabber.stats()}")
+print(f"[TRACKER] {tracker.stats()}")
+print(f"[LANE] {lane.stats()}")
+lane.stop()
+gate.stop()
+writer.close()  # Flush queued snapshots and rows before the DB pool closes
+print(f"[WRITER] {writer.stats()}")
+print(f"[ARCHIVE] {archive.stats()}")
+print(f"[METRICS] {metrics.REGISTRY.summary()}")
 if arduino:
     arduino.close()
-conn.close()
-cv2.destroyAllWindows()
+if preview:
+    preview.stop()
+db.close_all()
+pipeline.close()
+close_engine()
+if not headless:
+    cv2.destroyAllWindows()
@@ -1,19 +1,36 @@
+import argparse
+import signal
+import threading
 import cv2
-from ultralytics import YOLO
-import pytesseract
-pytesseract.pytesseract.tesseract_cmd = r'C:\Users\mugis\AppData\Local\Programs\Tesseract-OCR\tesseract.exe'
 import time
 import serial
 import serial.tools.list_ports
-from collections import Counter
-import random
-import sqlite3
-import datetime
-
-DB_FILE = 'car_logs.db'
-
-# Load YOLOv8 model (same model as entry)
-model = YOLO(r'best.pt')
+from frame_grabber import FrameGrabber
+from frame_ring import RingGrabber
+from ocr_engine import get_engine, close_engine
+from plate_tracker import PlateTracker
+from plate_pipeline import PlatePipeline, ExitDecider, otsu_threshold, add_ocr_arguments
+from plate_detector import add_detector_arguments, detector_from_args, draw_boxes
+from motion_trigger import make_lane_trigger
+from gate_controller import GateController
+import db
+import metrics
+from session_cache import SessionCache
+from debug_preview import PreviewServer
+
+# Lane trigger: 'motion' watches the camera, 'distance' reads the Arduino's ultrasonic sensor
+TRIGGER_SOURCE = 'motion'
+DISTANCE_THRESHOLD_CM = 50
+
+# Barrier hold time after a paid car is recognised, and buzzer duration for unpaid ones
+GATE_HOLD_SECONDS = 15
+ALARM_SECONDS = 5
+
+# Prometheus scrape target for this lane; `kill -USR1 <pid>` toggles cProfile
+METRICS_PORT = 9102
+
+# Debug preview rate for --preview-port (frames per second)
+PREVIEW_FPS = 2
 
 # ===== Auto-detect Arduino Serial Port =====
 def detect_arduino_port():
@@ -23,49 +40,31 @@ def detect_arduino_port():
             return port.device
     return None
 
-# ===== Check payment status in database =====
-def is_payment_complete(plate_number):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT exit_time 
-        FROM car_entries 
-        WHERE plate = ? AND payment_status = 1
-        ORDER BY exit_time DESC 
-        LIMIT 1
-    ''', (plate_number,))
-    row = cursor.fetchone()
-    conn.close()
-    return bool(row)
-
 # ===== Log unauthorized exit incident =====
 def log_unauthorized_exit(plate):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    # Create incidents table if not exists
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS incidents (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            plate TEXT NOT NULL,
-            timestamp TEXT NOT NULL,
-            incident_type TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    cursor.execute('''
-        INSERT INTO incidents (plate, timestamp, incident_type) VALUES (?, ?, ?)
-    ''', (plate, timestamp, 'Unauthorized Exit'))
-    conn.commit()
-    conn.close()
-    print(f"[LOG] Unauthorized exit logged for plate {plate} at {timestamp}")
-
-# ===== Ultrasonic Sensor (mock for now) =====
-def mock_ultrasonic_distance():
-    return random.choice([random.randint(10, 40)])
+    timestamp = int(time.time())
+    with metrics.span('db_incident'):
+        db.log_incident(plate, timestamp, 'Unauthorized Exit')
+    print(f"[LOG] Unauthorized exit logged for plate {plate} at {db.format_time(timestamp)}")
 
 # ===== Main =====
+def parse_args():
+    parser = argparse.ArgumentParser(description="Exit gate")
+    parser.add_argument('--headless', action='store_true',
+                        help="no windows, no annotation, no per-frame console output")
+    parser.add_argument('--preview-port', type=int,
+                        help="serve a throttled MJPEG debug preview on this port")
+    parser.add_argument('--preview-fps', type=float, default=PREVIEW_FPS)
+    parser.add_argument('--capture-process', action='store_true',
+                        help="read the camera in a separate process through shared memory (frame_ring.py)")
+    add_ocr_arguments(parser)  # --ocr-variants (plate_pipeline.py)
+    add_detector_arguments(parser)  # --backend, --imgsz, --roi, --detect-width, ... (plate_detector.py)
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    headless = args.headless
+
     arduino_port = detect_arduino_port()
     if arduino_port:
         print(f"[CONNECTED] Arduino on {arduino_port}")
@@ -75,82 +74,90 @@ def main():
         print("[ERROR] Arduino not detected.")
         arduino = None
 
-    cap = cv2.VideoCapture(0)
-    plate_buffer = []
+    metrics.start_http_server(METRICS_PORT)
+    metrics.install_profile_toggle()
+
+    # Same plate model as entry, warmed up before the first car arrives
+    detector = detector_from_args(args)
+    ocr = get_engine(pool_size=max(2, len(args.ocr_variants or ())))
+    grabber = (RingGrabber if args.capture_process else FrameGrabber)(0, name='exit').start()
+    gate = GateController(arduino, hold_seconds=GATE_HOLD_SECONDS,
+                          alarm_seconds=ALARM_SECONDS, name='exit-gate')
+    sessions = SessionCache().start()  # Paid/open sessions, kept fresh from the change log
+    lane = make_lane_trigger(TRIGGER_SOURCE, arduino, DISTANCE_THRESHOLD_CM)
+    tracker = PlateTracker()  # One consensus buffer per plate track
+    pipeline = PlatePipeline(detector, ocr, tracker, otsu_threshold, variants=args.ocr_variants)
+    decider = ExitDecider(sessions, tracker, gate, log_unauthorized_exit)  # Open if paid, else alarm + incident
+    preview = PreviewServer(args.preview_port, fps=args.preview_fps).start() if args.preview_port else None
+
+    # Ctrl+C / SIGTERM end the loop cleanly (there is no 'q' key without a window)
+    stop_requested = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop_requested.set())
+
+    print("[EXIT SYSTEM] Ready. Press Ctrl+C to quit." if headless
+          else "[EXIT SYSTEM] Ready. Press 'q' to quit.")
+
+    while not stop_requested.is_set():
+        captured = grabber.read()
+        if captured is None:
+            break
+        frame = captured.image
 
-    print("[EXIT SYSTEM] Ready. Press 'q' to quit.")
+        lane_active = lane.update(frame)
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+        if lane_active:
+            boxes, reads = pipeline.process(frame, intact=lambda: grabber.intact(captured))
+
+            for read in reads:
+                if read.candidate and not headless:
+                    print(f"[VALID] Track {read.track.id}: Plate Detected: {read.candidate}")
+
+                decider.decide(read)
+
+                if not headless:
+                    cv2.imshow("Plate", read.crop)
+                    cv2.imshow("Processed", read.processed)
+
+        metrics.inc('frames', state='active' if lane_active else 'idle')
+        if lane_active:
+            # Latency is measured from when the camera delivered the frame
+            latency_ms = (time.monotonic() - captured.captured_at) * 1000
+            metrics.observe('frame', latency_ms / 1000)
+            if not headless:
+                print(f"[LATENCY] Frame {captured.seq}: {latency_ms:.0f} ms from capture")
+
+        if preview:
+            # Annotated at the preview rate, and only while a browser is watching
+            preview.offer(lambda: draw_boxes(frame, boxes) if lane_active else frame)
+
+        if headless:
+            continue
 
-        distance = mock_ultrasonic_distance()
-        print(f"[SENSOR] Distance: {distance} cm")
-
-        if distance <= 50:
-            results = model(frame)
-
-            for result in results:
-                for box in result.boxes:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    plate_img = frame[y1:y2, x1:x2]
-
-                    # Preprocessing for OCR
-                    gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY)
-                    blur = cv2.GaussianBlur(gray, (5, 5), 0)
-                    thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-
-                    # OCR to get plate text
-                    plate_text = pytesseract.image_to_string(
-                        thresh, config='--psm 8 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-                    ).strip().replace(" ", "")
-
-                    if "RA" in plate_text:
-                        start_idx = plate_text.find("RA")
-                        plate_candidate = plate_text[start_idx:]
-                        if len(plate_candidate) >= 7:
-                            plate_candidate = plate_candidate[:7]
-                            prefix, digits, suffix = plate_candidate[:3], plate_candidate[3:6], plate_candidate[6]
-                            if (prefix.isalpha() and prefix.isupper() and
-                                digits.isdigit() and suffix.isalpha() and suffix.isupper()):
-                                print(f"[VALID] Plate Detected: {plate_candidate}")
-                                plate_buffer.append(plate_candidate)
-
-                                if len(plate_buffer) >= 3:
-                                    most_common = Counter(plate_buffer).most_common(1)[0][0]
-                                    plate_buffer.clear()
-
-                                    if is_payment_complete(most_common):
-                                        print(f"[ACCESS GRANTED] Payment complete for {most_common}")
-                                        if arduino:
-                                            arduino.write(b'1')  # Open gate
-                                            print("[GATE] Opening gate (sent '1')")
-                                            time.sleep(15)
-                                            arduino.write(b'0')  # Close gate
-                                            print("[GATE] Closing gate (sent '0')")
-                                    else:
-                                        print(f"[ACCESS DENIED] Payment NOT complete for {most_common}")
-                                        if arduino:
-                                            arduino.write(b'2')  # Trigger warning buzzer
-                                            print("[ALERT] Buzzer triggered (sent '2')")
-                                        # Log unauthorized exit
-                                        log_unauthorized_exit(most_common)
-
-                    cv2.imshow("Plate", plate_img)
-                    cv2.imshow("Processed", thresh)
-                    time.sleep(0.5)
-
-        annotated_frame = results[0].plot() if distance <= 50 else frame
+        annotated_frame = draw_boxes(frame, boxes) if lane_active else frame
         cv2.imshow("Exit Webcam Feed", annotated_frame)
 
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
-    cap.release()
+    grabber.stop()
+    print(f"[CAPTURE] {grabber.stats()}")
+    print(f"[TRACKER] {tracker.stats()}")
+    print(f"[LANE] {lane.stats()}")
+    print(f"[SESSIONS] {sessions.stats()}")
+    print(f"[METRICS] {metrics.REGISTRY.summary()}")
+    sessions.stop()
+    lane.stop()
+    gate.stop()
     if arduino:
         arduino.close()
-    cv2.destroyAllWindows()
+    if preview:
+        preview.stop()
+    pipeline.close()
+    close_engine()
+    db.close_all()
+    if not headless:
+        cv2.destroyAllWindows()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,129 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import db
+
+# kind is 'entry' (new session), 'payment' (session updated) or 'incident';
+# row is the changed row as a plain dict.
+ChangeEvent = namedtuple('ChangeEvent', ['seq', 'kind', 'row'])
+
+# Put on a subscriber's queue when it fell too far behind to be caught up
+RESET = ChangeEvent(0, 'reset', None)
+
+_KINDS = {
+    ('car_entries', 'insert'): 'entry',
+    ('car_entries', 'update'): 'payment',
+    ('incidents', 'insert'): 'incident',
+}
+
+
+def build_events(conn, changes):
+    """Resolves change_log rows into ChangeEvents with the current row data."""
+    entry_ids = {c['row_id'] for c in changes if c['table_name'] == 'car_entries'}
+    incident_ids = {c['row_id'] for c in changes if c['table_name'] == 'incidents'}
+    rows = {('car_entries', r['id']): dict(r) for r in db.fetch_sessions_by_id(conn, entry_ids)}
+    rows.update({('incidents', r['id']): dict(r) for r in db.fetch_incidents_by_id(conn, incident_ids)})
+
+    events = []
+    for change in changes:
+        kind = _KINDS.get((change['table_name'], change['op']))
+        row = rows.get((change['table_name'], change['row_id']))
+        if kind and row is not None:
+            events.append(ChangeEvent(change['seq'], kind, row))
+    return events
+
+
+class ChangeBroadcaster:
+    """
+    One poller per process that fans database changes out to any number of
+    subscribers (e.g. dashboard SSE connections).
+
+    The change log is read once per poll no matter how many subscribers are
+    attached, and PRAGMA data_version skips the read entirely when nothing
+    was committed.
+    """
+
+    def __init__(self, poll_interval=0.5, queue_size=1000):
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.last_seq = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._data_version = None
+        self._thread = None
+
+    def start(self):
+        self._conn = db.open_connection()
+        _, self.last_seq = db.change_seq_bounds(self._conn)
+        self._data_version = db.data_version(self._conn)
+        self._thread = threading.Thread(target=self._run, name='change-broadcaster', daemon=True)
+        self._thread.start()
+        return self
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def replay(self, after_seq, until_seq):
+        """
+        Events with after_seq < seq <= until_seq, for a client resuming from
+        a Last-Event-ID. Returns None if the log no longer reaches back that
+        far and the client has to reload instead.
+        """
+        with db.connection() as conn:
+            oldest, _ = db.change_seq_bounds(conn)
+            if oldest > after_seq + 1:
+                return None
+            events = []
+            while after_seq < until_seq:
+                changes = [c for c in db.fetch_changes(conn, after_seq) if c['seq'] <= until_seq]
+                if not changes:
+                    break
+                events.extend(build_events(conn, changes))
+                after_seq = changes[-1]['seq']
+            return events
+
+    def _publish(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            for event in events:
+                try:
+                    q.put_nowait(event)
+                except queue.Full:
+                    # Slow client: drop its backlog and tell it to reload
+                    while not q.empty():
+                        q.get_nowait()
+                    q.put_nowait(RESET)
+                    break
+
+    def poll(self):
+        version = db.data_version(self._conn)
+        if version == self._data_version:
+            return
+        self._data_version = version
+        while True:
+            changes = db.fetch_changes(self._conn, self.last_seq)
+            if not changes:
+                break
+            events = build_events(self._conn, changes)
+            self.last_seq = changes[-1]['seq']
+            if events:
+                self._publish(events)
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"[ERROR] Change feed poll failed: {e}")
+            time.sleep(self.poll_interval)
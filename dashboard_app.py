@@ -1,23 +1,112 @@
-import sqlite3
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, send_from_directory, request, Response, stream_with_context, g
 from datetime import datetime
+import base64
+import json
 import os
+import queue
+import threading
+import time
+import db
+import metrics
+from change_feed import ChangeBroadcaster, RESET
+import parking_stats
+from response_cache import conditional
+from plate_archive import ARCHIVE_ROOT
 
 app = Flask(__name__)
 
-# Define the path to your SQLite database
-DB_FILE = 'car_logs.db'
-
 # Ensure the database file exists (it should be created by car_entry/exit scripts)
-if not os.path.exists(DB_FILE):
-    print(f"WARNING: Database file '{DB_FILE}' not found. Dashboard will be empty.")
+if not os.path.exists(db.DB_FILE):
+    print(f"WARNING: Database file '{db.DB_FILE}' not found. Dashboard will be empty.")
     print("Please ensure car_entry.py and car_exit.py have been run to create the DB.")
 
-def get_db_connection():
-    """Establishes and returns a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row # Allows accessing columns by name
-    return conn
+# Pagination defaults for the list endpoints
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(time_value, row_id):
+    """Opaque keyset cursor: the (time, id) of the last row on a page."""
+    return base64.urlsafe_b64encode(json.dumps([time_value, row_id]).encode()).decode()
+
+def decode_cursor(token):
+    try:
+        time_value, row_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return int(time_value), int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError('invalid cursor')
+
+def time_arg(name):
+    """
+    Reads a local-time filter ('YYYY-MM-DD HH:MM[:SS]', or the browser's
+    datetime-local form with a 'T') as epoch seconds.
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    value = value.replace('T', ' ')
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return int(time.mktime(time.strptime(value, fmt)))
+        except ValueError:
+            pass
+    raise ValueError(f'{name} must be a date and time, e.g. 2025-06-02 11:17')
+
+def page_args():
+    """Parses the limit/cursor/plate/from/to query parameters shared by the list endpoints."""
+    limit = min(max(int(request.args.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    cursor = request.args.get('cursor')
+    return {
+        'limit': limit,
+        'after': decode_cursor(cursor) if cursor else None,
+        'plate_prefix': request.args.get('plate') or None,
+        'since': time_arg('from'),
+        'until': time_arg('to'),
+    }
+
+def stream_page(rows, limit, time_key, to_dict):
+    """
+    Streams {"items": [...], "next_cursor": ...}, serializing one row at a
+    time. `rows` holds up to limit + 1 rows; the extra row only signals that
+    another page exists.
+    """
+    def generate():
+        yield '{"items": ['
+        page = rows[:limit]
+        for count, row in enumerate(page):
+            yield (', ' if count else '') + json.dumps(to_dict(row))
+        has_more = len(rows) > limit
+        next_cursor = encode_cursor(page[-1][time_key], page[-1]['id']) if has_more else None
+        yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def log_to_dict(log):
+    log_dict = dict(log)
+    # Convert payment_status to a more readable string
+    log_dict['payment_status'] = 'Yes' if log_dict['payment_status'] == 1 else 'No'
+    log_dict['entry_time'] = db.format_time(log_dict['entry_time'])
+    log_dict['exit_time'] = db.format_time(log_dict['exit_time'])
+    return log_dict
+
+def alert_to_dict(alert):
+    alert_dict = dict(alert)
+    alert_dict['timestamp'] = db.format_time(alert_dict['timestamp'])
+    return alert_dict
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_timing(response):
+    # Streamed responses are timed up to the first byte
+    if request.endpoint and 'started' in g:
+        metrics.observe(f'http_{request.endpoint}', time.perf_counter() - g.started)
+        metrics.inc('http_requests', endpoint=request.endpoint, status=response.status_code)
+    return response
+
+@app.errorhandler(ValueError)
+def bad_request(error):
+    return jsonify({'error': str(error)}), 400
 
 @app.route('/')
 def index():
@@ -25,54 +114,133 @@ def index():
     return render_template('index.html')
 
 @app.route('/api/logs')
+@conditional()
 def get_logs():
-    """Fetches all vehicle activity logs from the 'car_entries' table."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    # Fetch all logs, ordered by entry time descending for most recent first
-    cursor.execute("""
-        SELECT 
-            id,
-            plate,
-            payment_status,
-            entry_time,
-            exit_time
-        FROM car_entries 
-        ORDER BY entry_time DESC
-    """)
-    logs = cursor.fetchall()
-    conn.close()
-
-    # Convert Row objects to dictionaries for JSON serialization
-    logs_list = []
-    for log in logs:
-        log_dict = dict(log)
-        # Convert payment_status to a more readable string
-        log_dict['payment_status'] = 'Yes' if log_dict['payment_status'] == 1 else 'No'
-        logs_list.append(log_dict)
-    return jsonify(logs_list)
+    """
+    Returns one page of vehicle activity logs, newest first.
+
+    Query parameters: limit, cursor (from the previous page's next_cursor),
+    plate (prefix), paid (yes/no), from and to (entry time range).
+    """
+    args = page_args()
+    paid = request.args.get('paid')
+    if paid:
+        if paid.lower() not in ('yes', 'no', '1', '0'):
+            raise ValueError('paid must be yes or no')
+        args['paid'] = paid.lower() in ('yes', '1')
+    limit = args.pop('limit')
+    rows = db.logs_page(limit + 1, **args)
+    return stream_page(rows, limit, 'entry_time', log_to_dict)
 
 @app.route('/api/alerts')
+@conditional()
 def get_alerts():
-    """Fetches unauthorized exit alerts from the 'incidents' table."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    # Fetch all alerts, ordered by timestamp descending
-    cursor.execute("""
-        SELECT 
-            id,
-            plate,
-            timestamp,
-            incident_type
-        FROM incidents
-        ORDER BY timestamp DESC
-    """)
-    alerts = cursor.fetchall()
-    conn.close()
-
-    # Convert Row objects to dictionaries for JSON serialization
-    alerts_list = [dict(alert) for alert in alerts]
-    return jsonify(alerts_list)
+    """
+    Returns one page of unauthorized exit alerts, newest first. Takes the
+    same limit/cursor/plate/from/to parameters as /api/logs.
+    """
+    args = page_args()
+    limit = args.pop('limit')
+    rows = db.alerts_page(limit + 1, **args)
+    return stream_page(rows, limit, 'timestamp', alert_to_dict)
+
+@app.route('/api/stats')
+@conditional(vary=lambda: datetime.now().strftime('%Y%m%d%H'))  # Window moves every hour
+def get_stats():
+    """
+    Occupancy, entries/exits, revenue, average dwell time and incidents for
+    the last 24 hours (hourly) and 7 days (daily), read from the summary
+    buckets rather than computed from car_entries.
+    """
+    return jsonify(parking_stats.get_stats())
+
+# One change-log poller shared by every open /api/stream connection
+STREAM_HEARTBEAT_SECONDS = 15
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+def get_broadcaster():
+    global _broadcaster
+    with _broadcaster_lock:
+        if _broadcaster is None:
+            _broadcaster = ChangeBroadcaster().start()
+        return _broadcaster
+
+def sse_event(event):
+    """Formats a ChangeEvent as a Server-Sent Event."""
+    row = log_to_dict(event.row) if event.kind in ('entry', 'payment') else alert_to_dict(event.row)
+    return f"id: {event.seq}\nevent: {event.kind}\ndata: {json.dumps(row)}\n\n"
+
+@app.route('/api/stream')
+def stream_changes():
+    """
+    Server-Sent Events feed of new entries ('entry'), payments ('payment')
+    and incidents ('incident'). Clients resuming with Last-Event-ID first get
+    the changes they missed; if those are no longer in the change log they
+    get a 'reset' event and should reload.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if last_event_id and not last_event_id.isdecimal():
+        raise ValueError('Last-Event-ID must be the id of an earlier event')  # 400, see bad_request
+    resume_seq = int(last_event_id) if last_event_id else None
+    broadcaster = get_broadcaster()
+
+    def generate():
+        # Subscribed only once the response is being sent, so a client that
+        # is gone before then leaves nothing behind; before the replay, so
+        # nothing committed in between is missed
+        subscription = broadcaster.subscribe()
+        try:
+            sent_seq = broadcaster.last_seq
+            backlog = [] if resume_seq is None else broadcaster.replay(resume_seq, sent_seq)
+            yield "retry: 3000\n\n"
+            if backlog is None:
+                yield "event: reset\ndata: {}\n\n"
+            else:
+                for event in backlog:
+                    yield sse_event(event)
+            while True:
+                try:
+                    event = subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is RESET:
+                    yield "event: reset\ndata: {}\n\n"
+                    continue
+                if event.seq <= sent_seq:
+                    continue  # Already delivered by the replay
+                sent_seq = event.seq
+                yield sse_event(event)
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics')
+def get_metrics():
+    """This process's stage timings and counters in Prometheus text format."""
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+@app.route('/api/sessions/<int:session_id>/images')
+def get_session_images(session_id):
+    """Lists the plate snapshots recorded for one parking session."""
+    images = db.images_for_session(session_id)
+    return jsonify([
+        {
+            'id': image['id'],
+            'plate': image['plate'],
+            'captured_at': db.format_time(image['captured_at']),
+            'url': f"/snapshots/{image['path']}",
+        }
+        for image in images
+    ])
+
+@app.route('/snapshots/<path:relative_path>')
+def get_snapshot(relative_path):
+    """Serves a snapshot file from the plate archive."""
+    return send_from_directory(ARCHIVE_ROOT, relative_path)
 
 if __name__ == '__main__':
     # Ensure the 'templates' directory exists
@@ -81,5 +249,5 @@ if __name__ == '__main__':
     os.makedirs('static/js', exist_ok=True)
 
     print(f"Dashboard backend running. Access at http://127.0.0.1:5000/")
-    print(f"API Endpoints: http://127.0.0.1:5000/api/logs and http://127.0.0.1:5000/api/alerts")
+    print(f"API Endpoints: http://127.0.0.1:5000/api/logs, /api/alerts, /api/stats and /api/stream")
     app.run(debug=True) # debug=True allows auto-reloading and better error messages
@@ -0,0 +1,394 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import migrations
+
+DB_FILE = 'car_logs.db'
+
+# Connections wait this long for a competing writer instead of failing with
+# "database is locked" straight away.
+BUSY_TIMEOUT_MS = 5000
+POOL_SIZE = 4
+# close() waits this long for borrowed connections to come back before closing them anyway
+POOL_CLOSE_TIMEOUT = 5
+RATE_PER_HOUR = 500  # RWF per started hour
+CHANGE_LOG_KEEP = 50000
+
+# All times are stored as Unix epoch seconds (see migrations.py)
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+# ===== Queries =====
+# Kept as constants so sqlite3's per-connection statement cache reuses the
+# prepared statements.
+SQL_INSERT_ENTRY = '''
+    INSERT INTO car_entries (plate, payment_status, entry_time, exit_time)
+    VALUES (?, 0, ?, NULL)
+'''
+SQL_FIND_UNPAID = '''
+    SELECT id, payment_status, entry_time
+    FROM car_entries
+    WHERE plate = ? AND payment_status = 0
+    ORDER BY entry_time ASC
+    LIMIT 1
+'''
+SQL_MARK_PAID = '''
+    UPDATE car_entries
+    SET payment_status = 1,
+        exit_time = ?,
+        amount_paid = ?
+    WHERE id = ?
+'''
+SQL_LATEST_PAID = '''
+    SELECT exit_time
+    FROM car_entries
+    WHERE plate = ? AND payment_status = 1
+    ORDER BY exit_time DESC
+    LIMIT 1
+'''
+SQL_LATEST_SESSION = '''
+    SELECT id, plate, payment_status, entry_time, exit_time, amount_paid
+    FROM car_entries
+    WHERE plate = ?
+    ORDER BY id DESC
+    LIMIT 1
+'''
+SQL_RECENT_SESSIONS = '''
+    SELECT id, plate, payment_status, entry_time, exit_time, amount_paid
+    FROM car_entries
+    ORDER BY id DESC
+    LIMIT ?
+'''
+SQL_CHANGES_SINCE = '''
+    SELECT seq, table_name, row_id, op
+    FROM change_log
+    WHERE seq > ?
+    ORDER BY seq
+    LIMIT ?
+'''
+SQL_MAX_CHANGE_SEQ = 'SELECT COALESCE(MAX(seq), 0) FROM change_log'
+SQL_MIN_CHANGE_SEQ = 'SELECT COALESCE(MIN(seq), 0) FROM change_log'
+SQL_INSERT_INCIDENT = '''
+    INSERT INTO incidents (plate, timestamp, incident_type) VALUES (?, ?, ?)
+'''
+# session_id is resolved at insert time to the plate's latest session, so the
+# row can be queued right behind the entry insert it belongs to.
+SQL_INSERT_PLATE_IMAGE = '''
+    INSERT OR IGNORE INTO plate_images (plate, captured_at, session_id, path, dhash)
+    VALUES (?, ?, (SELECT MAX(id) FROM car_entries WHERE plate = ?), ?, ?)
+'''
+SQL_INSERT_PLATE_IMAGE_FOR_SESSION = '''
+    INSERT OR IGNORE INTO plate_images (plate, captured_at, session_id, path, dhash)
+    VALUES (?, ?, ?, ?, ?)
+'''
+SQL_SESSION_AT = '''
+    SELECT id
+    FROM car_entries
+    WHERE plate = ? AND entry_time <= ?
+    ORDER BY entry_time DESC
+    LIMIT 1
+'''
+SQL_IMAGES_FOR_SESSION = '''
+    SELECT id, plate, captured_at, session_id, path
+    FROM plate_images
+    WHERE session_id = ?
+    ORDER BY captured_at
+'''
+SQL_IMAGES_FOR_PLATE = '''
+    SELECT id, plate, captured_at, session_id, path
+    FROM plate_images
+    WHERE plate = ?
+    ORDER BY captured_at DESC
+    LIMIT ?
+'''
+# Dashboard listings are keyset-paginated: newest first, and each page
+# continues strictly after the (time, id) of the last row of the previous one.
+SQL_LOGS_PAGE = '''
+    SELECT id, plate, payment_status, entry_time, exit_time, amount_paid
+    FROM car_entries
+    WHERE {where}
+    ORDER BY entry_time DESC, id DESC
+    LIMIT ?
+'''
+SQL_ALERTS_PAGE = '''
+    SELECT id, plate, timestamp, incident_type
+    FROM incidents
+    WHERE {where}
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+
+
+def open_connection():
+    """
+    Opens a dedicated (unpooled) connection, e.g. for a reader that relies on
+    per-connection state such as PRAGMA data_version.
+    """
+    conn = _connect()
+    init_schema(conn)
+    return conn
+
+
+def _connect():
+    conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT_MS / 1000,
+                           check_same_thread=False, cached_statements=128)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    # WAL lets the dashboard read while the gates and payment service write
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    return conn
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of SQLite connections shared by all threads of a process.
+
+    Connections are created lazily up to `size`; callers beyond that wait for
+    one to be returned.
+    """
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._connections = set()  # Every open connection, idle or borrowed
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._connections) < self.size:
+                conn = _connect()
+                self._connections.add(conn)
+                if not self._schema_ready:
+                    init_schema(conn)
+                    self._schema_ready = True
+                return conn
+        return self._idle.get()
+
+    def release(self, conn):
+        with self._lock:
+            if conn not in self._connections:
+                return  # Already closed by close() while it was borrowed
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close(self, timeout=POOL_CLOSE_TIMEOUT):
+        """
+        Closes every connection the pool created: idle ones at once, borrowed
+        ones as they are returned, and any still out after `timeout` seconds
+        regardless.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._connections:
+                    break
+            try:
+                conn = self._idle.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            with self._lock:
+                self._connections.discard(conn)
+            conn.close()
+        with self._lock:
+            borrowed, self._connections = self._connections, set()
+        for conn in borrowed:
+            print(f"[DB] Closing a connection still in use after {timeout}s")
+            conn.close()
+
+
+_pool = ConnectionPool()
+
+
+@contextmanager
+def connection():
+    """Borrows a pooled connection for the duration of a `with` block."""
+    conn = _pool.acquire()
+    try:
+        yield conn
+    finally:
+        _pool.release(conn)
+
+
+def init_schema(conn):
+    """Applies any pending schema migrations; a no-op once up to date."""
+    migrations.migrate(conn, RATE_PER_HOUR, CHANGE_LOG_KEEP)
+
+
+def schema_version(conn):
+    return migrations.schema_version(conn)
+
+
+def format_time(timestamp):
+    """Epoch seconds -> local 'YYYY-MM-DD HH:MM:SS', or None."""
+    if timestamp is None:
+        return None
+    return time.strftime(TIME_FORMAT, time.localtime(timestamp))
+
+
+def close_all():
+    _pool.close()
+
+
+# ===== Gate / payment operations =====
+def log_entry(plate, entry_time):
+    with connection() as conn:
+        cursor = conn.execute(SQL_INSERT_ENTRY, (plate, entry_time))
+        conn.commit()
+        return cursor.lastrowid
+
+
+def run_batch(statements):
+    """Executes a list of (sql, params) pairs in a single transaction."""
+    with connection() as conn:
+        with conn:
+            for sql, params in statements:
+                conn.execute(sql, params)
+
+
+def find_unpaid_entry(plate):
+    """Returns the oldest unpaid session row for a plate, or None."""
+    with connection() as conn:
+        return conn.execute(SQL_FIND_UNPAID, (plate,)).fetchone()
+
+
+def mark_paid(record_id, exit_time, amount_paid):
+    with connection() as conn:
+        conn.execute(SQL_MARK_PAID, (exit_time, amount_paid, record_id))
+        conn.commit()
+
+
+def is_payment_complete(plate):
+    with connection() as conn:
+        return conn.execute(SQL_LATEST_PAID, (plate,)).fetchone() is not None
+
+
+def latest_session(plate):
+    """Returns the most recent session row for a plate, or None."""
+    with connection() as conn:
+        return conn.execute(SQL_LATEST_SESSION, (plate,)).fetchone()
+
+
+def log_incident(plate, timestamp, incident_type):
+    with connection() as conn:
+        conn.execute(SQL_INSERT_INCIDENT, (plate, timestamp, incident_type))
+        conn.commit()
+
+
+# ===== Plate snapshot index =====
+def session_at(plate, captured_at):
+    """Returns the id of the session a snapshot taken at `captured_at` belongs to."""
+    with connection() as conn:
+        row = conn.execute(SQL_SESSION_AT, (plate, captured_at)).fetchone()
+        return row['id'] if row else None
+
+
+def images_for_session(session_id):
+    with connection() as conn:
+        return conn.execute(SQL_IMAGES_FOR_SESSION, (session_id,)).fetchall()
+
+
+def images_for_plate(plate, limit=100):
+    with connection() as conn:
+        return conn.execute(SQL_IMAGES_FOR_PLATE, (plate, limit)).fetchall()
+
+
+# ===== Dashboard queries =====
+def _prefix_range(prefix):
+    """Turns a plate prefix into an index-friendly [low, high) range."""
+    prefix = prefix.upper()
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _page_filters(time_column, after, plate_prefix, since, until):
+    where, params = [], []
+    if after:
+        where.append(f'({time_column}, id) < (?, ?)')
+        params.extend(after)
+    if plate_prefix:
+        where.append('plate >= ? AND plate < ?')
+        params.extend(_prefix_range(plate_prefix))
+    if since:
+        where.append(f'{time_column} >= ?')
+        params.append(since)
+    if until:
+        where.append(f'{time_column} < ?')
+        params.append(until)
+    return where, params
+
+
+def logs_page(limit, after=None, plate_prefix=None, paid=None, since=None, until=None):
+    """
+    Up to `limit` car_entries rows, newest first. `after` is the
+    (entry_time, id) of the last row already delivered. The page is fetched
+    in full so the pooled connection is back before the response streams
+    to a possibly slow client.
+    """
+    where, params = _page_filters('entry_time', after, plate_prefix, since, until)
+    if paid is not None:
+        where.append('payment_status = ?')
+        params.append(1 if paid else 0)
+    sql = SQL_LOGS_PAGE.format(where=' AND '.join(where) or '1')
+    with connection() as conn:
+        return conn.execute(sql, params + [limit]).fetchall()
+
+
+def alerts_page(limit, after=None, plate_prefix=None, since=None, until=None):
+    """Like logs_page, for incidents ordered by timestamp."""
+    where, params = _page_filters('timestamp', after, plate_prefix, since, until)
+    sql = SQL_ALERTS_PAGE.format(where=' AND '.join(where) or '1')
+    with connection() as conn:
+        return conn.execute(sql, params + [limit]).fetchall()
+
+
+# ===== Change feed =====
+def fetch_recent_sessions(conn, limit):
+    return conn.execute(SQL_RECENT_SESSIONS, (limit,)).fetchall()
+
+
+def fetch_sessions_by_id(conn, ids):
+    if not ids:
+        return []
+    placeholders = ','.join('?' * len(ids))
+    return conn.execute(
+        f'SELECT id, plate, payment_status, entry_time, exit_time, amount_paid FROM car_entries '
+        f'WHERE id IN ({placeholders})', list(ids)).fetchall()
+
+
+def fetch_incidents_by_id(conn, ids):
+    if not ids:
+        return []
+    placeholders = ','.join('?' * len(ids))
+    return conn.execute(
+        f'SELECT id, plate, timestamp, incident_type FROM incidents '
+        f'WHERE id IN ({placeholders})', list(ids)).fetchall()
+
+
+def fetch_changes(conn, after_seq, limit=1000):
+    return conn.execute(SQL_CHANGES_SINCE, (after_seq, limit)).fetchall()
+
+
+def change_seq_bounds(conn):
+    """Returns (oldest, newest) sequence numbers still held in the change log."""
+    return (conn.execute(SQL_MIN_CHANGE_SEQ).fetchone()[0],
+            conn.execute(SQL_MAX_CHANGE_SEQ).fetchone()[0])
+
+
+def current_change_seq():
+    """Newest change-log sequence number: a cheap marker that moves on every write."""
+    with connection() as conn:
+        return conn.execute(SQL_MAX_CHANGE_SEQ).fetchone()[0]
+
+
+def data_version(conn):
+    """Changes whenever another connection commits; cheap "anything new?" check."""
+    return conn.execute('PRAGMA data_version').fetchone()[0]
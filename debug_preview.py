@@ -0,0 +1,135 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+BOUNDARY = 'frame'
+PAGE = b"""<!doctype html>
+<title>Gate preview</title>
+<body style="margin:0;background:#111">
+<img src="/stream.mjpg" style="width:100%;height:auto">
+</body>
+"""
+
+
+class PreviewServer:
+    """
+    Low-rate MJPEG debug preview of a headless gate, served over HTTP.
+
+    The detection loop calls offer() every frame with a function that builds
+    the preview image (e.g. the annotated frame). It returns straight away
+    unless a browser is watching and 1 / `fps` seconds have passed, so
+    annotation and JPEG encoding cost nothing when nobody looks and never
+    run at the detection rate. Open http://<gate-pc>:<port>/ to watch.
+    """
+
+    def __init__(self, port=8081, fps=2.0, width=640, quality=70, host='0.0.0.0'):
+        self.port = port
+        self.interval = 1.0 / fps
+        self.width = width
+        self.quality = quality
+        self.host = host
+        self._cond = threading.Condition()
+        self._jpeg = None
+        self._seq = 0
+        self._next_due = 0.0
+        self._clients = 0
+        self._stopped = False
+        self._server = None
+
+        self.frames_encoded = 0
+
+    def start(self):
+        preview = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/':
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/html')
+                    self.end_headers()
+                    self.wfile.write(PAGE)
+                elif self.path == '/stream.mjpg':
+                    preview._stream(self)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            print(f"[PREVIEW] Not serving preview on port {self.port}: {e}")
+            return self
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='preview-http', daemon=True).start()
+        print(f"[PREVIEW] Debug preview at http://{self.host}:{self.port}/")
+        return self
+
+    @property
+    def watching(self):
+        return self._clients > 0
+
+    def offer(self, build_image):
+        """Publishes build_image() if someone is watching and a preview frame is due."""
+        if not self._clients:
+            return False
+        now = time.monotonic()
+        if now < self._next_due:
+            return False
+        self._next_due = now + self.interval
+
+        image = build_image()
+        height, width = image.shape[:2]
+        if width > self.width:
+            image = cv2.resize(image, (self.width, int(height * self.width / width)),
+                               interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return False
+        with self._cond:
+            self._jpeg = jpeg.tobytes()
+            self._seq += 1
+            self.frames_encoded += 1
+            self._cond.notify_all()
+        return True
+
+    def _stream(self, handler):
+        handler.send_response(200)
+        handler.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+        handler.send_header('Cache-Control', 'no-cache')
+        handler.end_headers()
+        with self._cond:
+            self._clients += 1
+        sent = 0
+        try:
+            while True:
+                with self._cond:
+                    while self._seq == sent and not self._stopped:
+                        self._cond.wait(timeout=5)
+                    if self._stopped:
+                        return
+                    jpeg, sent = self._jpeg, self._seq
+                handler.wfile.write(
+                    f'--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n'
+                    f'Content-Length: {len(jpeg)}\r\n\r\n'.encode())
+                handler.wfile.write(jpeg)
+                handler.wfile.write(b'\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Browser tab closed
+        finally:
+            with self._cond:
+                self._clients -= 1
+
+    def stats(self):
+        return {'clients': self._clients, 'frames_encoded': self.frames_encoded}
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
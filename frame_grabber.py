@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+import metrics
+
+# A frame as handed to the detection loop. `captured_at` is a time.monotonic()
+# stamp taken right after the camera returned the frame, so latency can be
+# measured from capture rather than from when processing started.
+CapturedFrame = namedtuple('CapturedFrame', ['image', 'seq', 'captured_at'])
+
+
+class FrameGrabber:
+    """
+    Reads a camera on its own thread into a single "latest frame wins" slot.
+
+    The detection loop always gets the newest frame. Frames that were
+    overwritten before anyone read them are counted in `frames_dropped`.
+    """
+
+    def __init__(self, source=0, name='camera'):
+        self.source = source
+        self.name = name
+        self.cap = cv2.VideoCapture(source)
+        # Keep OpenCV's own queue as short as the backend allows.
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self._cond = threading.Condition()
+        self._latest = None
+        self._last_read_seq = 0
+        self._stopped = False
+        self._thread = None
+
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.frames_read = 0
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f'{self.name}-grabber', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped:
+            started = time.monotonic()
+            ret, image = self.cap.read()
+            captured_at = time.monotonic()
+            metrics.observe('capture', captured_at - started)
+            if not ret:
+                print(f"[CAPTURE] {self.name}: stream ended")
+                break
+
+            with self._cond:
+                self.frames_captured += 1
+                metrics.inc('frames_captured')
+                if self._latest is not None and self._latest.seq > self._last_read_seq:
+                    # Previous frame was never picked up: it is superseded.
+                    self.frames_dropped += 1
+                    metrics.inc('frames_dropped')
+                self._latest = CapturedFrame(image, self.frames_captured, captured_at)
+                self._cond.notify_all()
+
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def read(self, timeout=2.0):
+        """
+        Blocks until a frame newer than the last one returned is available.
+        Returns a CapturedFrame, or None once the stream has ended or the wait
+        timed out.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._latest is None or self._latest.seq <= self._last_read_seq:
+                if self._stopped:
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            frame = self._latest
+            self._last_read_seq = frame.seq
+            self.frames_read += 1
+        # How long the frame sat in the slot before the loop picked it up
+        metrics.observe('capture_wait', time.monotonic() - frame.captured_at)
+        return frame
+
+    def intact(self, frame):
+        """Always True: every frame is its own array (RingGrabber frames can be overwritten)."""
+        return True
+
+    def stats(self):
+        with self._cond:
+            return {
+                'captured': self.frames_captured,
+                'read': self.frames_read,
+                'dropped': self.frames_dropped,
+            }
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self.cap.release()
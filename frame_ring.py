@@ -0,0 +1,377 @@
+"""
+Shared-memory frame ring between a capture process and processing processes.
+
+    python car_entry.py --capture-process        # camera read in its own process
+    python frame_ring.py capture --source 0 --name pms-entry
+
+The capture process decodes camera frames straight into fixed-size slots of
+a multiprocessing.shared_memory block; the processes that run detection
+and OCR (the lane script) read NumPy views of those slots, so a 1080p frame
+(~6 MB) is never pickled or copied between processes and capture no longer
+competes with detection and OCR for the lane's GIL.
+
+Layout of the block (all int64/float64, then 64-byte aligned frame slots):
+    control      magic, slots, height, width, channels, write_seq, latest_slot, closed
+    slot_seq     sequence number of the frame in each slot (0: empty or being written)
+    slot_time    time.monotonic() capture stamp of each slot
+    reader_read  last sequence number each reader has returned
+    reader_held  sequence number each reader is still using (0: none)
+    frames       slots x height x width x channels uint8
+
+Like FrameGrabber, every reader always gets the newest frame and skips the
+ones it was too slow for. A reader keeps its last frame "held" until its next
+read(); the writer never reuses a slot it sees held, so the view stays valid
+while the frame is processed. Hold and reuse are plain shared-memory stores
+with no fence between them, so the two can race; each slot's sequence
+number therefore also works as a seqlock: the writer zeroes it before
+filling the slot, and intact(frame) re-checks it after the frame was used,
+so results computed from a frame the writer touched are dropped instead of
+trusted. Each process that attaches uses its own reader index
+(0..MAX_READERS-1).
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import cv2
+import numpy as np
+
+from frame_grabber import CapturedFrame
+
+MAGIC = 0x504D5352494E4731  # 'PMSRING1'
+SLOTS = 4
+MAX_READERS = 4
+POLL_INTERVAL = 0.001  # Seconds between checks for a new frame
+ATTACH_TIMEOUT = 10.0  # Seconds to wait for the capture process to open the camera
+
+# Indices into the control words
+_MAGIC, _SLOTS, _HEIGHT, _WIDTH, _CHANNELS, _WRITE_SEQ, _LATEST, _CLOSED = range(8)
+_CONTROL_WORDS = 8
+
+
+def _layout(slots, height, width, channels):
+    """Byte offsets of each region and the total block size."""
+    offsets = {}
+    position = 0
+    for region, count in (('control', _CONTROL_WORDS), ('slot_seq', slots), ('slot_time', slots),
+                          ('reader_read', MAX_READERS), ('reader_held', MAX_READERS)):
+        offsets[region] = position
+        position += 8 * count
+    position = (position + 63) // 64 * 64
+    offsets['frames'] = position
+    frame_bytes = height * width * channels
+    return offsets, position + slots * frame_bytes
+
+
+def _attach_block(name):
+    block = shared_memory.SharedMemory(name=name)
+    # Before Python 3.13 attaching also registers the block with this process's
+    # resource tracker, which would unlink it when a reader exits
+    try:
+        resource_tracker.unregister(block._name, 'shared_memory')
+    except Exception:
+        pass
+    return block
+
+
+class FrameRing:
+    """
+    A ring of frame slots in shared memory. The capture side uses create()
+    and write() (or begin_write()/commit()); processing sides use attach()
+    and read().
+    """
+
+    def __init__(self, block, owner, reader=None):
+        self.block = block
+        self.owner = owner
+        self.reader = reader
+        control = np.ndarray((_CONTROL_WORDS,), dtype=np.int64, buffer=block.buf)
+        if control[_MAGIC] != MAGIC:
+            raise ValueError(f"shared memory block {block.name} is not a frame ring")
+        self.slots = int(control[_SLOTS])
+        self.shape = (int(control[_HEIGHT]), int(control[_WIDTH]), int(control[_CHANNELS]))
+        offsets, _ = _layout(self.slots, *self.shape)
+
+        self.control = control
+        self.slot_seq = np.ndarray((self.slots,), dtype=np.int64, buffer=block.buf,
+                                   offset=offsets['slot_seq'])
+        self.slot_time = np.ndarray((self.slots,), dtype=np.float64, buffer=block.buf,
+                                    offset=offsets['slot_time'])
+        self.reader_read = np.ndarray((MAX_READERS,), dtype=np.int64, buffer=block.buf,
+                                      offset=offsets['reader_read'])
+        self.reader_held = np.ndarray((MAX_READERS,), dtype=np.int64, buffer=block.buf,
+                                      offset=offsets['reader_held'])
+        self.frames = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=block.buf,
+                                 offset=offsets['frames'])
+        self._writing = None
+        self._held_slot = None
+
+        self.frames_read = 0
+        self.frames_skipped = 0
+        self.torn_reads = 0
+
+    @property
+    def name(self):
+        return self.block.name
+
+    @classmethod
+    def create(cls, name, shape, slots=SLOTS):
+        """New ring for frames of `shape` (height, width[, channels])."""
+        height, width = shape[:2]
+        channels = shape[2] if len(shape) > 2 else 1
+        _, size = _layout(slots, height, width, channels)
+        try:
+            block = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a capture process that was killed
+            stale = _attach_block(name)
+            stale.close()
+            stale.unlink()
+            block = shared_memory.SharedMemory(name=name, create=True, size=size)
+        control = np.ndarray((_CONTROL_WORDS,), dtype=np.int64, buffer=block.buf)
+        control[:] = (0, slots, height, width, channels, 0, -1, 0)
+        offsets, _ = _layout(slots, height, width, channels)
+        np.ndarray((offsets['frames'] // 8 - _CONTROL_WORDS,), dtype=np.int64, buffer=block.buf,
+                   offset=8 * _CONTROL_WORDS)[:] = 0
+        control[_MAGIC] = MAGIC  # Written last: readers treat the block as ready from here
+        return cls(block, owner=True)
+
+    @classmethod
+    def attach(cls, name, reader=0):
+        if not 0 <= reader < MAX_READERS:
+            raise ValueError(f"reader index must be 0..{MAX_READERS - 1}")
+        return cls(_attach_block(name), owner=False, reader=reader)
+
+    # ===== Writer =====
+    def begin_write(self):
+        """Claims the next slot no reader holds; returns a view to fill."""
+        latest = int(self.control[_LATEST])
+        for step in range(1, self.slots + 1):
+            slot = (latest + step) % self.slots
+            previous = int(self.slot_seq[slot])
+            if previous and previous in self.reader_held:
+                continue
+            # Readers skip the slot from here, and intact() fails for one that raced us
+            self.slot_seq[slot] = 0
+            self._writing = slot
+            return self.frames[slot]
+        raise RuntimeError(f"all {self.slots} slots are held by readers")
+
+    def commit(self, captured_at=None):
+        """Publishes the slot filled since begin_write() as the newest frame."""
+        slot, self._writing = self._writing, None
+        seq = int(self.control[_WRITE_SEQ]) + 1
+        self.slot_time[slot] = time.monotonic() if captured_at is None else captured_at
+        self.slot_seq[slot] = seq
+        self.control[_LATEST] = slot
+        self.control[_WRITE_SEQ] = seq
+        return seq
+
+    def write(self, image, captured_at=None):
+        view = self.begin_write()
+        np.copyto(view, image.reshape(view.shape))
+        return self.commit(captured_at)
+
+    def close_stream(self):
+        """Tells readers no more frames are coming."""
+        self.control[_CLOSED] = 1
+
+    # ===== Reader =====
+    def _claim_latest(self):
+        """(slot, seq) of the newest frame if it is newer than the last one read, marked as held."""
+        while True:
+            seq = int(self.control[_WRITE_SEQ])
+            if seq <= self.reader_read[self.reader]:
+                return None
+            slot = int(self.control[_LATEST])
+            if int(self.slot_seq[slot]) != seq:
+                continue  # Writer moved on between the two loads
+            self.reader_held[self.reader] = seq
+            if int(self.slot_seq[slot]) == seq:
+                return slot, seq
+            # The writer took the slot before our hold landed: try again
+
+    def read(self, timeout=2.0):
+        """
+        Blocks until a newer frame is available and returns it as a
+        CapturedFrame whose image is a read-only view into shared memory,
+        held until the next read() or release(). Returns None once the
+        stream has ended or the wait timed out.
+        """
+        deadline = time.monotonic() + timeout
+        self.release()
+        while True:
+            claimed = self._claim_latest()
+            if claimed is not None:
+                break
+            if self.control[_CLOSED] or time.monotonic() >= deadline:
+                return None
+            time.sleep(POLL_INTERVAL)
+        slot, seq = claimed
+        self._held_slot = slot
+        self.frames_skipped += seq - int(self.reader_read[self.reader]) - 1
+        self.reader_read[self.reader] = seq
+        self.frames_read += 1
+        image = self.frames[slot]
+        image.flags.writeable = False
+        return CapturedFrame(image, seq, float(self.slot_time[slot]))
+
+    def intact(self, frame):
+        """
+        True if the slot behind `frame` (the last one read) still holds it.
+        Check after using the view and discard the results if False: the
+        writer only reuses a held slot if it raced with the hold.
+        """
+        if self._held_slot is None or int(self.slot_seq[self._held_slot]) != frame.seq:
+            self.torn_reads += 1
+            return False
+        return True
+
+    def release(self):
+        self.reader_held[self.reader] = 0
+        self._held_slot = None
+
+    def stats(self):
+        return {
+            'captured': int(self.control[_WRITE_SEQ]),
+            'read': self.frames_read,
+            'dropped': self.frames_skipped,
+            'torn': self.torn_reads,
+        }
+
+    def close(self):
+        if self.reader is not None:
+            self.release()
+        # Drop our views before closing the mapping
+        self.control = self.slot_seq = self.slot_time = self.frames = None
+        self.reader_read = self.reader_held = None
+        try:
+            self.block.close()
+        except BufferError:
+            pass  # A caller still holds a view of the block; the mapping goes with the process
+        if self.owner:
+            self.block.unlink()
+
+
+# ===== Capture process =====
+def run_capture(source, name, slots=SLOTS):
+    """Reads a camera into a new ring until the stream ends or the process is stopped."""
+    cap = cv2.VideoCapture(source)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    ret, image = cap.read()
+    if not ret:
+        print(f"[CAPTURE] {name}: cannot read from {source}")
+        return 1
+    ring = FrameRing.create(name, image.shape, slots)
+    ring.write(image)
+    print(f"[CAPTURE] {name}: {image.shape[1]}x{image.shape[0]} frames into {slots} shared slots")
+    try:
+        while True:
+            view = ring.begin_write()
+            # Decode straight into the slot when OpenCV can reuse it
+            ret, image = cap.read(view)
+            captured_at = time.monotonic()
+            if not ret:
+                print(f"[CAPTURE] {name}: stream ended")
+                break
+            if image is not view and not np.shares_memory(image, view):
+                np.copyto(view, image.reshape(view.shape))
+            ring.commit(captured_at)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Readers keep their own mapping after the unlink and see `closed`
+        ring.close_stream()
+        ring.close()
+        cap.release()
+    return 0
+
+
+class RingGrabber:
+    """
+    FrameGrabber drop-in that runs the camera in a separate capture process
+    and reads frames from the shared-memory ring. Frames are views, valid
+    until the next read(); check intact(frame) before acting on results.
+    """
+
+    def __init__(self, source=0, name='camera', slots=SLOTS):
+        self.source = source
+        self.name = name
+        self.ring_name = f'pms-{name}-{os.getpid()}'
+        self.slots = slots
+        self.process = None
+        self.ring = None
+
+    def start(self):
+        script = os.path.abspath(__file__)
+        self.process = subprocess.Popen([sys.executable, script, 'capture', '--source', str(self.source),
+                                         '--name', self.ring_name, '--slots', str(self.slots)])
+        deadline = time.monotonic() + ATTACH_TIMEOUT
+        while self.ring is None:
+            try:
+                self.ring = FrameRing.attach(self.ring_name)
+            except (FileNotFoundError, ValueError):
+                if self.process.poll() is not None or time.monotonic() >= deadline:
+                    print(f"[CAPTURE] {self.name}: capture process did not start")
+                    break
+                time.sleep(0.05)
+        if self.ring is not None:
+            print(f"[CAPTURE] {self.name}: reading shared ring {self.ring_name} "
+                  f"(capture pid {self.process.pid})")
+        return self
+
+    def is_opened(self):
+        return self.ring is not None
+
+    def read(self, timeout=2.0):
+        if self.ring is None:
+            return None
+        return self.ring.read(timeout)
+
+    def intact(self, frame):
+        """False if the capture process overwrote `frame` while it was in use (see FrameRing.intact)."""
+        return self.ring is not None and self.ring.intact(frame)
+
+    def stats(self):
+        return self.ring.stats() if self.ring is not None else {}
+
+    def stop(self):
+        if self.ring is not None:
+            self.ring.release()
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=3)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+def _interrupt(signum, frame):
+    # RingGrabber.stop() terminates the capture process: end like Ctrl+C so the ring is unlinked
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared-memory camera ring")
+    sub = parser.add_subparsers(dest='command', required=True)
+    capture = sub.add_parser('capture', help="read a camera into a shared ring")
+    capture.add_argument('--source', default='0', help="camera index, file or stream URL")
+    capture.add_argument('--name', required=True, help="shared memory block name")
+    capture.add_argument('--slots', type=int, default=SLOTS)
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    signal.signal(signal.SIGTERM, _interrupt)
+    sys.exit(run_capture(source, args.name, args.slots))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import queue
+import threading
+import time
+
+import metrics
+
+# Single-byte commands understood by autogatedemokit/init.ino
+CMD_OPEN = b'1'
+CMD_CLOSE = b'0'
+CMD_ALARM = b'2'
+CMD_CLEAR_ALARM = b'3'
+
+CLOSED = 'closed'
+OPEN = 'open'
+ALARM = 'alarm'
+
+
+class GateController:
+    """
+    Drives the barrier from a background thread so the vision loop never
+    sleeps.
+
+    open(), close(), alarm() and clear_alarm() only enqueue a command and
+    return immediately. The worker thread writes to the Arduino and enforces
+    the hold time with a deadline instead of time.sleep(): opening an already
+    open gate just extends the deadline, so the next car can be read and
+    let through while the barrier is still up. `state` always reflects what
+    was last sent to the Arduino; `on_change(state)` is called on every
+    transition if given.
+    """
+
+    def __init__(self, ser, hold_seconds=2.0, alarm_seconds=5.0, name='gate', on_change=None):
+        self.ser = ser
+        self.hold_seconds = hold_seconds
+        self.alarm_seconds = alarm_seconds
+        self.name = name
+        self.on_change = on_change
+        self.state = CLOSED
+
+        self._commands = queue.Queue()
+        self._deadline = None
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=f'{name}-controller', daemon=True)
+        self._thread.start()
+
+    # ===== Public API (non-blocking) =====
+    def open(self, hold_seconds=None):
+        self._commands.put(('open', hold_seconds or self.hold_seconds))
+
+    def close(self):
+        self._commands.put(('close', None))
+
+    def alarm(self, duration=None):
+        self._commands.put(('alarm', duration or self.alarm_seconds))
+
+    def clear_alarm(self):
+        self._commands.put(('clear_alarm', None))
+
+    def stop(self):
+        """Closes the gate and stops the worker thread."""
+        self._commands.put(('stop', None))
+        self._thread.join(timeout=5)
+
+    # ===== Worker =====
+    def _write(self, command, message):
+        if self.ser:
+            try:
+                with metrics.span('gate_serial_write'):
+                    self.ser.write(command)
+            except Exception as e:
+                print(f"[ERROR] {self.name}: serial write failed: {e}")
+                metrics.inc('gate_write_errors')
+                return
+        metrics.inc('gate_commands', command=command.decode())
+        print(message)
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            if self.on_change:
+                self.on_change(state)
+
+    def _run(self):
+        while not self._stopped:
+            timeout = None
+            if self._deadline is not None:
+                timeout = max(0.0, self._deadline - time.monotonic())
+            try:
+                action, arg = self._commands.get(timeout=timeout)
+            except queue.Empty:
+                self._expire()
+                continue
+
+            if action == 'open':
+                if self.state == ALARM:
+                    self._write(CMD_CLEAR_ALARM, "[ALERT] Buzzer cleared (sent '3')")
+                if self.state != OPEN:
+                    self._write(CMD_OPEN, "[GATE] Opening gate (sent '1')")
+                    self._set_state(OPEN)
+                else:
+                    print(f"[GATE] Gate already open; holding for another {arg:g}s")
+                self._deadline = time.monotonic() + arg
+            elif action == 'close':
+                self._close()
+            elif action == 'alarm':
+                if self.state == OPEN:
+                    self._close()
+                self._write(CMD_ALARM, "[ALERT] Buzzer triggered (sent '2')")
+                self._set_state(ALARM)
+                self._deadline = time.monotonic() + arg
+            elif action == 'clear_alarm':
+                self._clear_alarm()
+            elif action == 'stop':
+                self._stopped = True
+
+        if self.state == OPEN:
+            self._close()
+        elif self.state == ALARM:
+            self._clear_alarm()
+
+    def _expire(self):
+        if self._deadline is None or time.monotonic() < self._deadline:
+            return
+        if self.state == OPEN:
+            self._close()
+        elif self.state == ALARM:
+            self._clear_alarm()
+        self._deadline = None
+
+    def _close(self):
+        if self.state == OPEN:
+            self._write(CMD_CLOSE, "[GATE] Closing gate (sent '0')")
+        self._set_state(CLOSED)
+        self._deadline = None
+
+    def _clear_alarm(self):
+        if self.state == ALARM:
+            self._write(CMD_CLEAR_ALARM, "[ALERT] Buzzer cleared (sent '3')")
+        self._set_state(CLOSED)
+        self._deadline = None
@@ -0,0 +1,360 @@
+"""
+Shared plate detector for gate PCs that run several lanes.
+
+    python inference_server.py --backend openvino --max-batch 4
+    python car_entry.py --server
+    python car_exit.py --server
+
+Each lane process normally loads its own copy of the model and runs its own
+forward passes, so two lanes on one PC hold the weights twice and fight over
+the same cores. This service loads the detector once; lanes connect over a
+Unix socket (TCP host:port on Windows), send frames and get Box lists back.
+Frames that arrive within a few milliseconds of each other are run as one
+batched forward pass (export with --dynamic-batch for ONNX/OpenVINO to batch;
+static models still share the one loaded copy). ROI cropping and downscaling
+stay in the lane process, so only the small detector input crosses the socket.
+
+Wire format (all integers big-endian):
+    server hello   b'PMS1', imgsz:u32
+    request        req_id:u32, height:u16, width:u16, channels:u8, raw uint8 pixels
+    response       req_id:u32, count:u16, count x (x1, y1, x2, y2:i32, confidence:f32)
+"""
+import argparse
+import os
+import queue
+import signal
+import socket
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+from plate_detector import Box, Detector, SERVER_ADDRESS, add_detector_arguments, make_detector
+
+MAGIC = b'PMS1'
+HELLO = struct.Struct('!4sI')
+REQUEST = struct.Struct('!IHHB')
+RESPONSE = struct.Struct('!IH')
+BOX = struct.Struct('!iiiif')
+
+MAX_BATCH = 4
+# How long the first frame of a batch waits for other lanes' frames
+BATCH_WINDOW_MS = 5
+CLIENT_TIMEOUT = 2.0  # Seconds a lane waits for its boxes before giving up on the frame
+CONNECT_WAIT = 30  # Seconds a lane keeps retrying at start-up while the server loads
+RECONNECT_INTERVAL = 1.0
+METRICS_PORT = 9104
+
+
+def parse_address(address):
+    """('unix', path) or ('tcp', (host, port)) for an address string."""
+    if ':' in address and not address.startswith('/'):
+        host, port = address.rsplit(':', 1)
+        return 'tcp', (host or '127.0.0.1', int(port))
+    return 'unix', address
+
+
+def _recv_exact(sock, size):
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if not n:
+            raise ConnectionError("connection closed")
+        received += n
+    return data
+
+
+# ===== Server =====
+class _Client:
+    def __init__(self, sock, name):
+        self.sock = sock
+        self.name = name
+        self.send_lock = threading.Lock()
+
+    def reply(self, req_id, boxes):
+        payload = RESPONSE.pack(req_id, len(boxes)) + b''.join(
+            BOX.pack(box.x1, box.y1, box.x2, box.y2, box.confidence) for box in boxes)
+        with self.send_lock:
+            self.sock.sendall(payload)
+
+
+class InferenceServer:
+    """
+    Accepts lane connections and feeds their frames to one detector.
+
+    One reader thread per lane puts requests on a queue; a single batching
+    thread takes the first waiting request, collects whatever else arrives
+    within `batch_window_ms` (up to `max_batch` frames) and runs them through
+    detector.detect_batch() together.
+    """
+
+    def __init__(self, detector, address=SERVER_ADDRESS, max_batch=MAX_BATCH,
+                 batch_window_ms=BATCH_WINDOW_MS):
+        self.detector = detector
+        self.address = address
+        self.max_batch = max_batch
+        self.batch_window = batch_window_ms / 1000.0
+        self._requests = queue.Queue()
+        self._stopped = threading.Event()
+        self._listener = None
+        self._clients = set()
+        self._lock = threading.Lock()
+
+        self.frames_served = 0
+        self.batches_run = 0
+
+    def start(self):
+        kind, target = parse_address(self.address)
+        if kind == 'unix':
+            if os.path.exists(target):
+                os.unlink(target)  # Left behind by a server that did not shut down cleanly
+            self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(target)
+        self._listener.listen()
+        threading.Thread(target=self._accept_loop, name='inference-accept', daemon=True).start()
+        threading.Thread(target=self._batch_loop, name='inference-batch', daemon=True).start()
+        print(f"[INFERENCE] Serving {self.detector.name} detector on {self.address} "
+              f"(batches of up to {self.max_batch}, {self.batch_window * 1000:.0f} ms window)")
+        return self
+
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            try:
+                sock, peer = self._listener.accept()
+            except OSError:
+                break  # Listener closed by stop()
+            if sock.family != socket.AF_UNIX:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _Client(sock, str(peer) if peer else f'lane-{sock.fileno()}')
+            try:
+                sock.sendall(HELLO.pack(MAGIC, self.detector.imgsz))
+            except OSError:
+                sock.close()
+                continue
+            with self._lock:
+                self._clients.add(client)
+            print(f"[INFERENCE] Lane connected: {client.name}")
+            threading.Thread(target=self._read_loop, args=(client,),
+                             name=f'inference-{client.name}', daemon=True).start()
+
+    def _read_loop(self, client):
+        try:
+            while not self._stopped.is_set():
+                req_id, height, width, channels = REQUEST.unpack(_recv_exact(client.sock, REQUEST.size))
+                pixels = _recv_exact(client.sock, height * width * channels)
+                image = np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, channels)
+                self._requests.put((client, req_id, image, time.perf_counter()))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self._lock:
+                self._clients.discard(client)
+            client.sock.close()
+            print(f"[INFERENCE] Lane disconnected: {client.name}")
+
+    def _next_batch(self):
+        try:
+            batch = [self._requests.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _batch_loop(self):
+        while not self._stopped.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            started = time.perf_counter()
+            metrics.observe('batch_wait', started - batch[0][3])
+            try:
+                with metrics.span('batch_detect'):
+                    results = self.detector.detect_batch([image for _, _, image, _ in batch])
+            except Exception as e:
+                print(f"[INFERENCE] Detection failed for a batch of {len(batch)}: {e}")
+                metrics.inc('batch_errors')
+                results = [[] for _ in batch]
+
+            self.batches_run += 1
+            self.frames_served += len(batch)
+            metrics.inc('batches')
+            metrics.inc('batched_frames', len(batch))
+            for (client, req_id, _, _), boxes in zip(batch, results):
+                try:
+                    client.reply(req_id, boxes)
+                except OSError:
+                    pass  # Lane went away; its reader thread cleans up
+
+    def stats(self):
+        with self._lock:
+            lanes = len(self._clients)
+        return {
+            'lanes': lanes,
+            'frames': self.frames_served,
+            'batches': self.batches_run,
+            'mean_batch': round(self.frames_served / self.batches_run, 2) if self.batches_run else None,
+        }
+
+    def stop(self):
+        self._stopped.set()
+        if self._listener is not None:
+            self._listener.close()
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        kind, target = parse_address(self.address)
+        if kind == 'unix' and os.path.exists(target):
+            os.unlink(target)
+
+
+# ===== Lane client =====
+class RemoteDetector(Detector):
+    """
+    Detector that sends frames to inference_server.py. Frames larger than the
+    server's imgsz are shrunk here first (the model would letterbox them to
+    imgsz anyway), so a lane sends at most imgsz x imgsz pixels per frame.
+
+    If the server goes away, detect() logs, returns no boxes and reconnects
+    at most once a second, so the lane loop keeps running.
+    """
+
+    name = 'remote'
+
+    def __init__(self, address=SERVER_ADDRESS, timeout=CLIENT_TIMEOUT, connect_wait=CONNECT_WAIT):
+        self.address = address
+        self.timeout = timeout
+        self.imgsz = None
+        self._sock = None
+        self._next_id = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+        deadline = time.monotonic() + connect_wait
+        while True:
+            try:
+                self._connect()
+                break
+            except OSError as e:
+                if time.monotonic() >= deadline:
+                    raise ConnectionError(f"inference server at {address} is not reachable: {e}") from e
+                print(f"[DETECTOR] Waiting for inference server at {address}...")
+                time.sleep(RECONNECT_INTERVAL)
+
+    def _connect(self):
+        kind, target = parse_address(self.address)
+        family = socket.AF_UNIX if kind == 'unix' else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(target)
+            if kind == 'tcp':
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            magic, imgsz = HELLO.unpack(_recv_exact(sock, HELLO.size))
+        except OSError:
+            sock.close()
+            raise
+        if magic != MAGIC:
+            sock.close()
+            raise ConnectionError(f"unexpected server greeting {magic!r}")
+        self._sock = sock
+        self.imgsz = imgsz
+
+    def _disconnect(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        self._retry_at = time.monotonic() + RECONNECT_INTERVAL
+
+    def detect(self, frame):
+        height, width = frame.shape[:2]
+        scale = 1.0
+        if max(height, width) > self.imgsz:
+            scale = self.imgsz / max(height, width)
+            frame = cv2.resize(frame, (max(1, int(round(width * scale))), max(1, int(round(height * scale)))),
+                               interpolation=cv2.INTER_AREA)
+        if frame.ndim == 2:
+            frame = frame[:, :, None]
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+
+        with self._lock:
+            try:
+                if self._sock is None:
+                    if time.monotonic() < self._retry_at:
+                        return []
+                    self._connect()
+                    print(f"[DETECTOR] Reconnected to inference server at {self.address}")
+                self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+                h, w, c = frame.shape
+                self._sock.sendall(REQUEST.pack(self._next_id, h, w, c))
+                self._sock.sendall(memoryview(frame).cast('B'))
+                req_id, count = RESPONSE.unpack(_recv_exact(self._sock, RESPONSE.size))
+                if req_id != self._next_id:
+                    raise ConnectionError(f"response {req_id} for request {self._next_id}")
+                payload = _recv_exact(self._sock, count * BOX.size)
+            except OSError as e:
+                print(f"[DETECTOR] Inference server error: {e}")
+                metrics.inc('remote_detect_errors')
+                self._disconnect()
+                return []
+
+        return [Box(min(width, int(round(x1 / scale))), min(height, int(round(y1 / scale))),
+                    min(width, int(round(x2 / scale))), min(height, int(round(y2 / scale))), confidence)
+                for x1, y1, x2, y2, confidence in BOX.iter_unpack(payload)]
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared plate detector for the gate lanes on this PC")
+    add_detector_arguments(parser, lane=False)
+    parser.add_argument('--address', default=SERVER_ADDRESS,
+                        help="Unix socket path, or host:port for TCP")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--batch-window-ms', type=float, default=BATCH_WINDOW_MS,
+                        help="how long a frame waits for others to batch with")
+    args = parser.parse_args()
+
+    detector = make_detector(args.backend, args.weights, imgsz=args.imgsz, conf=args.conf,
+                             threads=args.threads)
+    if args.max_batch > 1 and not getattr(detector, 'batchable', True):
+        print("[INFERENCE] Model has a static batch size; frames run one by one "
+              "(re-export with --dynamic-batch to batch)")
+    server = InferenceServer(detector, args.address, args.max_batch, args.batch_window_ms).start()
+    metrics.start_http_server(METRICS_PORT)
+    metrics.install_profile_toggle()
+
+    stop_requested = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_requested.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_requested.set())
+    try:
+        while not stop_requested.wait(60):
+            print(f"[INFERENCE] {server.stats()}")
+    finally:
+        server.stop()
+        print(f"[INFERENCE] Stopped: {server.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+In-process timing spans and counters, exposed in Prometheus text format.
+
+    with metrics.span('ocr'):
+        text = ocr.recognize(image).text
+    metrics.inc('ocr_calls')
+
+Every stage gets a histogram (cumulative buckets for Prometheus to
+aggregate) plus p50/p95/p99 over its most recent samples. Recording is a
+perf_counter() pair and a short lock, so spans can stay on in production.
+The gate scripts and the payment service serve /metrics from a small
+per-process listener (start_http_server); the dashboard serves its own
+registry on its /metrics route.
+"""
+import bisect
+import cProfile
+import math
+import os
+import pstats
+import signal
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = 'pms'
+
+# Upper bounds (seconds) of the latency buckets: 1 ms .. 10 s
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+# Quantiles are computed over this many of the most recent samples per stage
+WINDOW = 1024
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile (q in 0..100) of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values) / 100.0) - 1))
+    return sorted_values[index]
+
+
+class Histogram:
+    """Latency distribution of one stage."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=WINDOW)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+            self.recent.append(seconds)
+
+    def quantiles(self):
+        with self._lock:
+            values = sorted(self.recent)
+        return {q: percentile(values, q * 100) for q in QUANTILES}
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class Registry:
+    """Stage histograms and counters of one process."""
+
+    def __init__(self, prefix=PREFIX):
+        self.prefix = prefix
+        self._stages = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(stage, Histogram())
+        return histogram
+
+    def observe(self, stage, seconds):
+        self.histogram(stage).observe(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def _sorted_stages(self):
+        with self._lock:
+            return sorted(self._stages.items())
+
+    def summary(self):
+        """{stage: {'count', 'p50', 'p95', 'p99'}} in milliseconds, for logs and reports."""
+        result = {}
+        for stage, histogram in self._sorted_stages():
+            quantiles = histogram.quantiles()
+            result[stage] = {'count': histogram.count}
+            for q, value in quantiles.items():
+                result[stage][f'p{int(q * 100)}'] = round(value * 1000, 2) if value is not None else None
+        return result
+
+    def render(self):
+        """The registry in Prometheus text exposition format."""
+        p = self.prefix
+        lines = [
+            f'# HELP {p}_stage_seconds Time spent in each pipeline stage.',
+            f'# TYPE {p}_stage_seconds histogram',
+        ]
+        stages = self._sorted_stages()
+        for stage, histogram in stages:
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += bucket
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {count}')
+
+        lines += [
+            f'# HELP {p}_stage_recent_seconds Stage latency quantiles over the last {WINDOW} samples.',
+            f'# TYPE {p}_stage_recent_seconds gauge',
+        ]
+        for stage, histogram in stages:
+            for q, value in histogram.quantiles().items():
+                if value is not None:
+                    lines.append(f'{p}_stage_recent_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+        seen = set()
+        for (name, labels), value in counters:
+            metric = f'{p}_{name}_total'
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f'# TYPE {metric} counter')
+            label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f'{metric}{{{label_text}}} {value}' if label_text else f'{metric} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class span:
+    """Times a `with` block into a stage histogram of REGISTRY (or `registry`)."""
+
+    __slots__ = ('stage', 'registry', 'started')
+
+    def __init__(self, stage, registry=None):
+        self.stage = stage
+        self.registry = registry or REGISTRY
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+def observe(stage, seconds):
+    REGISTRY.observe(stage, seconds)
+
+
+def inc(name, amount=1, **labels):
+    REGISTRY.inc(name, amount, **labels)
+
+
+def render():
+    return REGISTRY.render()
+
+
+# ===== Per-process /metrics listener =====
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the gate's console
+
+
+def start_http_server(port, host='0.0.0.0'):
+    """Serves GET /metrics on a daemon thread. Returns the server, or None if the port is taken."""
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"[METRICS] Not serving metrics on port {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    print(f"[METRICS] Serving http://{host}:{port}/metrics")
+    return server
+
+
+# ===== On-demand profiling =====
+def install_profile_toggle(output_dir='profiles', signum=getattr(signal, 'SIGUSR1', None)):
+    """
+    `kill -USR1 <pid>` starts cProfile on the main thread (the detection or
+    payment loop); the next USR1 stops it and writes a .prof file (open with
+    snakeviz or `python -m pstats`). For sampling the whole process without
+    touching it, py-spy works as well: `py-spy top --pid <pid>`; threads
+    carry descriptive names. Not available on Windows.
+    """
+    if signum is None:
+        return False
+    state = {'profiler': None}
+
+    def toggle(signum, frame):
+        if state['profiler'] is None:
+            state['profiler'] = cProfile.Profile()
+            state['profiler'].enable()
+            print("[PROFILE] cProfile started")
+            return
+        profiler, state['profiler'] = state['profiler'], None
+        profiler.disable()
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"{os.getpid()}_{time.strftime('%Y%m%d_%H%M%S')}.prof")
+        profiler.dump_stats(path)
+        print(f"[PROFILE] Saved {path}")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+
+    signal.signal(signum, toggle)
+    return True
@@ -0,0 +1,336 @@
+"""
+Versioned schema for car_logs.db.
+
+The schema version lives in PRAGMA user_version. Each process runs
+migrate() once when it opens the database; pending migrations are applied
+in order inside a single write transaction, so concurrent processes either
+see the old schema or the new one, never a mix.
+"""
+
+# ===== v1: legacy text-timestamp tables =====
+# What car_entry.py / car_exit.py used to create on the fly. Applied with
+# IF NOT EXISTS so existing databases are adopted as they are.
+V1_STATEMENTS = [
+    '''
+    CREATE TABLE IF NOT EXISTS car_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        plate TEXT,
+        payment_status INTEGER,
+        entry_time TEXT,
+        exit_time TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS incidents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        plate TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        incident_type TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS plate_images (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        plate TEXT NOT NULL,
+        captured_at TEXT NOT NULL,
+        session_id INTEGER,
+        path TEXT NOT NULL UNIQUE,
+        dhash INTEGER
+    )
+    ''',
+]
+
+
+def _apply_v1(conn, rate_per_hour, change_log_keep):
+    for statement in V1_STATEMENTS:
+        conn.execute(statement)
+
+
+# ===== v2: unified schema with epoch-integer timestamps =====
+# All times are Unix epoch seconds. exit_time is when the session was paid
+# at the terminal; amount_paid is what was actually charged.
+# Hourly buckets are keyed by the epoch of the hour start; that is also the
+# local hour boundary for whole-hour UTC offsets such as Kigali's.
+
+# Legacy text times were written in local time
+_TO_EPOCH = "CAST(strftime('%s', {column}, 'utc') AS INTEGER)"
+
+V2_TABLES = [
+    '''
+    CREATE TABLE car_entries_v2 (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        plate TEXT NOT NULL,
+        payment_status INTEGER NOT NULL DEFAULT 0,
+        entry_time INTEGER,
+        exit_time INTEGER,
+        amount_paid INTEGER
+    )
+    ''',
+    '''
+    CREATE TABLE incidents_v2 (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        plate TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
+        incident_type TEXT NOT NULL
+    )
+    ''',
+    # path is relative to the archive root (see plate_archive.py)
+    '''
+    CREATE TABLE plate_images_v2 (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        plate TEXT NOT NULL,
+        captured_at INTEGER NOT NULL,
+        session_id INTEGER,
+        path TEXT NOT NULL UNIQUE,
+        dhash INTEGER
+    )
+    ''',
+]
+
+V2_COPY = [
+    f'''
+    INSERT INTO car_entries_v2 (id, plate, payment_status, entry_time, exit_time, amount_paid)
+    SELECT id, COALESCE(plate, ''), COALESCE(payment_status, 0),
+           {_TO_EPOCH.format(column='entry_time')},
+           {_TO_EPOCH.format(column='exit_time')},
+           NULL
+    FROM car_entries
+    ''',
+    f'''
+    INSERT INTO incidents_v2 (id, plate, timestamp, incident_type)
+    SELECT id, plate, COALESCE({_TO_EPOCH.format(column='timestamp')}, 0), incident_type
+    FROM incidents
+    ''',
+    f'''
+    INSERT INTO plate_images_v2 (id, plate, captured_at, session_id, path, dhash)
+    SELECT id, plate, COALESCE({_TO_EPOCH.format(column='captured_at')}, 0), session_id, path, dhash
+    FROM plate_images
+    ''',
+]
+
+# setup_database.py's car_logs table was never written by the gate scripts,
+# but any rows it holds are folded into car_entries.
+V2_IMPORT_CAR_LOGS = f'''
+    INSERT INTO car_entries_v2 (plate, payment_status, entry_time, exit_time, amount_paid)
+    SELECT Plate, COALESCE(Paid, 0),
+           {_TO_EPOCH.format(column='`Entry Time`')},
+           {_TO_EPOCH.format(column='`Exit Time`')},
+           `Amount Paid`
+    FROM car_logs
+'''
+
+V2_SWAP = [
+    'DROP TABLE car_entries',
+    'ALTER TABLE car_entries_v2 RENAME TO car_entries',
+    'DROP TABLE incidents',
+    'ALTER TABLE incidents_v2 RENAME TO incidents',
+    'DROP TABLE plate_images',
+    'ALTER TABLE plate_images_v2 RENAME TO plate_images',
+    'DROP TABLE IF EXISTS car_logs',
+    'DROP TABLE IF EXISTS hourly_stats',
+    'DROP TABLE IF EXISTS parking_totals',
+]
+
+V2_SCHEMA = [
+    # Exit/payment lookups: WHERE plate = ? AND payment_status = ? ORDER BY ...
+    'CREATE INDEX idx_car_entries_plate_status_entry ON car_entries (plate, payment_status, entry_time)',
+    # Dashboard listings and range scans, newest first
+    'CREATE INDEX idx_car_entries_entry_time ON car_entries (entry_time)',
+    'CREATE INDEX idx_car_entries_status_entry ON car_entries (payment_status, entry_time)',
+    'CREATE INDEX idx_incidents_timestamp ON incidents (timestamp)',
+    'CREATE INDEX idx_plate_images_plate_time ON plate_images (plate, captured_at)',
+    'CREATE INDEX idx_plate_images_session ON plate_images (session_id)',
+
+    # Hourly summary buckets, maintained by triggers as rows are written
+    # (see parking_stats.py). dwell_seconds sums over paid exits.
+    '''
+    CREATE TABLE hourly_stats (
+        hour INTEGER PRIMARY KEY,
+        entries INTEGER NOT NULL DEFAULT 0,
+        exits INTEGER NOT NULL DEFAULT 0,
+        revenue INTEGER NOT NULL DEFAULT 0,
+        dwell_seconds INTEGER NOT NULL DEFAULT 0,
+        incidents INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE parking_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        occupancy INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    'INSERT INTO parking_totals (id, occupancy) VALUES (1, 0)',
+
+    # Change feed: every write to the tables above appends a row here, so
+    # readers can follow new and updated rows by sequence number instead of
+    # re-querying whole tables. Triggers catch writes from every process.
+    '''
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        op TEXT NOT NULL
+    )
+    ''',
+    'DROP TRIGGER IF EXISTS trg_change_log_prune',
+]
+
+# Triggers are created after the data copy so converted rows are not
+# counted twice; the rebuild below backfills the buckets instead.
+V2_TRIGGERS = [
+    '''
+    CREATE TRIGGER trg_car_entries_insert AFTER INSERT ON car_entries
+    BEGIN
+        INSERT INTO change_log (table_name, row_id, op) VALUES ('car_entries', NEW.id, 'insert');
+    END
+    ''',
+    '''
+    CREATE TRIGGER trg_car_entries_update AFTER UPDATE ON car_entries
+    BEGIN
+        INSERT INTO change_log (table_name, row_id, op) VALUES ('car_entries', NEW.id, 'update');
+    END
+    ''',
+    '''
+    CREATE TRIGGER trg_incidents_insert AFTER INSERT ON incidents
+    BEGIN
+        INSERT INTO change_log (table_name, row_id, op) VALUES ('incidents', NEW.id, 'insert');
+    END
+    ''',
+    '''
+    CREATE TRIGGER trg_stats_entry AFTER INSERT ON car_entries
+    WHEN NEW.entry_time IS NOT NULL
+    BEGIN
+        INSERT INTO hourly_stats (hour, entries)
+        VALUES (NEW.entry_time - NEW.entry_time % 3600, 1)
+        ON CONFLICT (hour) DO UPDATE SET entries = entries + 1;
+        UPDATE parking_totals SET occupancy = occupancy + 1 WHERE id = 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER trg_stats_payment AFTER UPDATE OF payment_status ON car_entries
+    WHEN OLD.payment_status = 0 AND NEW.payment_status = 1 AND NEW.exit_time IS NOT NULL
+    BEGIN
+        INSERT INTO hourly_stats (hour, exits, revenue, dwell_seconds)
+        VALUES (
+            NEW.exit_time - NEW.exit_time % 3600,
+            1,
+            COALESCE(NEW.amount_paid, 0),
+            COALESCE(NEW.exit_time - NEW.entry_time, 0)
+        )
+        ON CONFLICT (hour) DO UPDATE SET
+            exits = exits + 1,
+            revenue = revenue + excluded.revenue,
+            dwell_seconds = dwell_seconds + excluded.dwell_seconds;
+        UPDATE parking_totals SET occupancy = occupancy - 1 WHERE id = 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER trg_stats_incident AFTER INSERT ON incidents
+    BEGIN
+        INSERT INTO hourly_stats (hour, incidents)
+        VALUES (NEW.timestamp - NEW.timestamp % 3600, 1)
+        ON CONFLICT (hour) DO UPDATE SET incidents = incidents + 1;
+    END
+    ''',
+]
+
+# Recomputes every bucket and the occupancy counter from history. Shared by
+# the v2 migration and `python parking_stats.py rebuild`.
+REBUILD_STATS = [
+    'DELETE FROM hourly_stats',
+    '''
+    INSERT INTO hourly_stats (hour, entries)
+    SELECT entry_time - entry_time % 3600, COUNT(*)
+    FROM car_entries
+    WHERE entry_time IS NOT NULL
+    GROUP BY 1
+    ''',
+    '''
+    INSERT INTO hourly_stats (hour, exits, revenue, dwell_seconds)
+    SELECT exit_time - exit_time % 3600, COUNT(*),
+           SUM(COALESCE(amount_paid, 0)), SUM(COALESCE(exit_time - entry_time, 0))
+    FROM car_entries
+    WHERE payment_status = 1 AND exit_time IS NOT NULL
+    GROUP BY 1
+    ON CONFLICT (hour) DO UPDATE SET
+        exits = excluded.exits,
+        revenue = excluded.revenue,
+        dwell_seconds = excluded.dwell_seconds
+    ''',
+    '''
+    INSERT INTO hourly_stats (hour, incidents)
+    SELECT timestamp - timestamp % 3600, COUNT(*)
+    FROM incidents
+    WHERE true
+    GROUP BY 1
+    ON CONFLICT (hour) DO UPDATE SET incidents = excluded.incidents
+    ''',
+    '''
+    UPDATE parking_totals
+    SET occupancy = (SELECT COUNT(*) FROM car_entries WHERE payment_status = 0)
+    WHERE id = 1
+    ''',
+]
+
+
+def _table_exists(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def _apply_v2(conn, rate_per_hour, change_log_keep):
+    for statement in V2_TABLES + V2_COPY:
+        conn.execute(statement)
+    if _table_exists(conn, 'car_logs'):
+        conn.execute(V2_IMPORT_CAR_LOGS)
+    # Sessions paid before amounts were recorded: charge as process_payment did
+    conn.execute(f'''
+        UPDATE car_entries_v2
+        SET amount_paid = (exit_time - entry_time + 3599) / 3600 * {int(rate_per_hour)}
+        WHERE payment_status = 1 AND amount_paid IS NULL
+          AND exit_time IS NOT NULL AND entry_time IS NOT NULL
+    ''')
+    for statement in V2_SWAP + V2_SCHEMA + V2_TRIGGERS + REBUILD_STATS:
+        conn.execute(statement)
+    # Keep the feed bounded; readers further behind than this reload instead
+    conn.execute(f'''
+        CREATE TRIGGER trg_change_log_prune AFTER INSERT ON change_log
+        BEGIN
+            DELETE FROM change_log WHERE seq <= NEW.seq - {int(change_log_keep)};
+        END
+    ''')
+
+
+# (version, description, apply(conn, rate_per_hour, change_log_keep)), in order
+MIGRATIONS = [
+    (1, 'legacy text-timestamp tables', _apply_v1),
+    (2, 'unified schema with integer timestamps and amount_paid', _apply_v2),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, rate_per_hour, change_log_keep):
+    """Brings the database up to LATEST_VERSION. Returns the version it started at."""
+    if schema_version(conn) >= LATEST_VERSION:
+        return LATEST_VERSION
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Re-read under the write lock: another process may have just migrated
+        start = version = schema_version(conn)
+        for target, description, apply in MIGRATIONS:
+            if target > version:
+                apply(conn, rate_per_hour, change_log_keep)
+                conn.execute(f'PRAGMA user_version = {target}')
+                version = target
+                print(f"[DB] Migrated schema to v{target}: {description}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return start
@@ -0,0 +1,159 @@
+import threading
+import time
+
+import cv2
+
+
+class MotionDetector:
+    """
+    Background-subtraction presence detector on a small grayscale copy of the
+    frame. Costs well under a millisecond per frame at the default width.
+
+    The background adapts quickly while the lane is idle and very slowly
+    while it is active, so a car waiting at the barrier keeps the lane
+    active instead of fading into the background.
+    """
+
+    def __init__(self, width=160, pixel_threshold=25, min_area=0.02,
+                 learning_rate=0.05, active_learning_rate=0.002):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area  # Fraction of the downscaled frame that must change
+        self.learning_rate = learning_rate
+        self.active_learning_rate = active_learning_rate
+        self.score = 0.0
+        self._background = None
+
+    def present(self, frame, active=False):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, h * self.width // w)),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype('float32')
+            self.score = 0.0
+            return False
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1]
+        self.score = cv2.countNonZero(mask) / float(mask.size)
+
+        rate = self.active_learning_rate if active else self.learning_rate
+        cv2.accumulateWeighted(gray, self._background, rate)
+        return self.score >= self.min_area
+
+
+class SerialDistanceSensor:
+    """
+    Presence from the gate Arduino's ultrasonic sensor.
+
+    The sketch prints "[DISTANCE] <cm>" lines continuously; a background
+    thread keeps the latest reading so present() never blocks the vision
+    loop. Readings older than `max_age` seconds count as "no vehicle".
+    """
+
+    def __init__(self, ser, threshold_cm=50, max_age=1.0):
+        self.ser = ser
+        self.threshold_cm = threshold_cm
+        self.max_age = max_age
+        self.distance = None
+        self._read_at = 0.0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='distance-sensor', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                line = self.ser.readline().decode(errors='ignore').strip()
+            except Exception as e:
+                print(f"[ERROR] Distance sensor read failed: {e}")
+                time.sleep(1)
+                continue
+            if line.startswith('[DISTANCE]'):
+                try:
+                    self.distance = float(line.split()[1])
+                    self._read_at = time.monotonic()
+                except (IndexError, ValueError):
+                    pass
+
+    def present(self, frame=None, active=False):
+        if self.distance is None or time.monotonic() - self._read_at > self.max_age:
+            return False
+        return self.distance <= self.threshold_cm
+
+    def stop(self):
+        self._stopped = True
+
+
+class LaneTrigger:
+    """
+    Turns a noisy per-frame presence signal into a stable "lane active" state.
+
+    The lane becomes active after `on_frames` consecutive positive frames and
+    goes idle again only after `off_seconds` without any. YOLO and OCR should
+    run only while update() returns True.
+    """
+
+    def __init__(self, source, on_frames=2, off_seconds=3.0):
+        self.source = source
+        self.on_frames = on_frames
+        self.off_seconds = off_seconds
+        self.active = False
+        self._streak = 0
+        self._last_present = 0.0
+
+        self.frames_total = 0
+        self.frames_active = 0
+        self.frames_skipped = 0
+
+    def update(self, frame):
+        now = time.monotonic()
+        self.frames_total += 1
+        if self.source.present(frame, active=self.active):
+            self._streak += 1
+            self._last_present = now
+        else:
+            self._streak = 0
+
+        if not self.active and self._streak >= self.on_frames:
+            self.active = True
+            print(f"[LANE] Vehicle present (skipped {self.frames_skipped} idle frames so far)")
+        elif self.active and now - self._last_present > self.off_seconds:
+            self.active = False
+            print("[LANE] Lane idle")
+
+        if self.active:
+            self.frames_active += 1
+        else:
+            self.frames_skipped += 1
+        return self.active
+
+    def stats(self):
+        return {
+            'frames': self.frames_total,
+            'active': self.frames_active,
+            'skipped': self.frames_skipped,
+        }
+
+    def stop(self):
+        if hasattr(self.source, 'stop'):
+            self.source.stop()
+
+
+def make_lane_trigger(kind='motion', ser=None, distance_threshold_cm=50):
+    """
+    Builds the lane trigger for a gate script. kind is 'motion' (camera) or
+    'distance' (Arduino ultrasonic over serial); 'distance' falls back to
+    motion when no Arduino is connected.
+    """
+    if kind == 'distance' and ser is not None:
+        print(f"[LANE] Using ultrasonic distance trigger (<= {distance_threshold_cm} cm)")
+        return LaneTrigger(SerialDistanceSensor(ser, threshold_cm=distance_threshold_cm))
+    if kind == 'distance':
+        print("[LANE] No Arduino for distance trigger; using camera motion instead")
+    else:
+        print("[LANE] Using camera motion trigger")
+    return LaneTrigger(MotionDetector())
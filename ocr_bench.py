@@ -0,0 +1,251 @@
+"""
+OCR throughput and accuracy over the labelled plate crops.
+
+    python ocr_bench.py                                   # entry + exit chains, all cores
+    python ocr_bench.py --chains entry exit fused --out results/ocr.json
+    python ocr_bench.py --chains otsu upscaled deskewed --workers 4 --limit 500
+    python ocr_bench.py --labels plates/labels.csv       # hand-labelled plate_N.jpg crops
+
+Ground truth comes from the file names the entry lane writes
+(RAG187P_20250602_111755.jpg, flat or in the dated archive under plates/)
+and from an optional labels manifest: a CSV with file,plate columns or a
+JSON object {file: plate}, paths relative to the manifest. Manifest labels
+win over file names; crops with neither are skipped. Below --min-crops
+labelled crops the run is refused, as its accuracy figures would mean little. Each chain (a preprocessing
+variant plus an OCR backend) runs over the whole corpus on a process pool,
+one chain at a time, so crops/second is that chain's real parallel
+throughput. Latency is per crop (preprocess + OCR, image decode excluded),
+measured inside the workers.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from plate_archive import ARCHIVE_ROOT, FLAT_NAME
+from plate_pipeline import (PLATE_LENGTH, VARIANTS, adaptive_threshold, extract_plate, fuse_reads,
+                            otsu_threshold)
+from replay_bench import git_revision, summarize_latencies
+
+# Preprocessing chains: the two lanes' own, each variant alone, and all variants fused
+CHAINS = {'entry': adaptive_threshold, 'exit': otsu_threshold, **VARIANTS, 'fused': None}
+DEFAULT_CHAINS = ('entry', 'exit')
+
+
+def _tesseract():
+    from ocr_engine import get_engine
+    return get_engine(pool_size=1)
+
+
+# OCR backends by name: a function that returns an object with recognize(image) -> OcrResult
+BACKENDS = {'tesseract': _tesseract}
+MISSING = '_'  # Confusion-matrix column for a position the read did not cover
+MIN_CROPS = 100  # Fewer labelled crops than this and one misread moves accuracy by over a point
+
+
+def _valid_plate(plate):
+    return extract_plate(plate) == plate
+
+
+def load_labels(path):
+    """{crop path: plate} from a CSV (file,plate columns) or JSON ({file: plate}) manifest."""
+    base = os.path.dirname(path)
+    with open(path, newline='') as f:
+        if path.lower().endswith('.json'):
+            rows = json.load(f).items()
+        else:
+            rows = ((row['file'], row['plate']) for row in csv.DictReader(f))
+        labels = {os.path.normpath(os.path.join(base, name)): plate.strip().upper()
+                  for name, plate in rows}
+    invalid = [name for name, plate in labels.items() if not _valid_plate(plate)]
+    if invalid:
+        print(f"[OCR-BENCH] {len(invalid)} manifest labels are not valid plates, ignored: {invalid[:5]}")
+    return {name: plate for name, plate in labels.items() if name not in invalid}
+
+
+def load_corpus(root=ARCHIVE_ROOT, limit=None, labels=None):
+    """
+    ([(path, plate)], unlabelled count) for every crop under `root` whose
+    name carries a valid plate or that `labels` ({path: plate}) labels.
+    """
+    labels = labels or {}
+    corpus, skipped = {}, 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.normpath(os.path.join(directory, name))
+            match = FLAT_NAME.match(name)
+            if path in labels:
+                corpus[path] = labels[path]
+            elif match and _valid_plate(match.group(1)):
+                corpus[path] = match.group(1)
+            elif name.lower().endswith('.jpg'):
+                skipped += 1
+    # Manifest entries outside `root` count too
+    corpus.update((path, plate) for path, plate in labels.items() if os.path.isfile(path))
+    corpus = sorted(corpus.items())
+    return (corpus[:limit] if limit else corpus), skipped
+
+
+# ===== Worker side =====
+_engines = {}
+
+
+def _init_worker():
+    # One Tesseract/OpenCV thread per process: the pool provides the parallelism
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    cv2.setNumThreads(1)
+
+
+def _engine(backend):
+    if backend not in _engines:
+        _engines[backend] = BACKENDS[backend]()
+    return _engines[backend]
+
+
+def _read_window(text):
+    """The 7 characters from the first 'RA' of an OCR text, or None."""
+    start = text.find('RA')
+    if start < 0 or len(text) < start + PLATE_LENGTH:
+        return None
+    return text[start:start + PLATE_LENGTH]
+
+
+def _bench_crop(task):
+    """Runs one chain on one crop; returns (plate read or None, aligned window or None, ms)."""
+    path, chain, backend = task
+    image = cv2.imread(path)
+    if image is None:
+        return None, None, None
+    ocr = _engine(backend)
+    started = time.perf_counter()
+    if chain == 'fused':
+        # Serially here: each worker is already one of N parallel processes
+        fused = fuse_reads({name: ocr.recognize(preprocess(image)) for name, preprocess in VARIANTS.items()})
+        plate, window = fused.plate, fused.plate
+    else:
+        text = ocr.recognize(CHAINS[chain](image)).text
+        plate, window = extract_plate(text), _read_window(text)
+    return plate, window, (time.perf_counter() - started) * 1000
+
+
+# ===== Reporting =====
+def score(corpus, results):
+    """Accuracy and per-character confusion of one chain's results against the corpus."""
+    exact = valid = failed = 0
+    confusion = defaultdict(Counter)  # true char -> Counter(read char)
+    position_hits = [0] * PLATE_LENGTH
+    misreads = Counter()
+    for (_, truth), (plate, window, ms) in zip(corpus, results):
+        if ms is None:
+            failed += 1  # Counted as a miss at every position below
+        if plate:
+            valid += 1
+            if plate == truth:
+                exact += 1
+            else:
+                misreads[f'{truth}->{plate}'] += 1
+        for position, true_char in enumerate(truth):
+            read_char = window[position] if window else MISSING
+            confusion[true_char][read_char] += 1
+            position_hits[position] += read_char == true_char
+
+    total = len(corpus)
+    errors = Counter({f'{t}->{r}': n for t, reads in confusion.items()
+                      for r, n in reads.items() if r != t})
+    return {
+        'crops': total,
+        'unreadable_files': failed,
+        'exact_match': round(exact / total, 4) if total else None,
+        'valid_format': round(valid / total, 4) if total else None,
+        'wrong_plate': round((valid - exact) / total, 4) if total else None,
+        'position_accuracy': [round(hits / total, 4) if total else None for hits in position_hits],
+        'top_confusions': errors.most_common(15),
+        'top_misreads': misreads.most_common(10),
+        'confusion': {t: dict(sorted(reads.items())) for t, reads in sorted(confusion.items())},
+    }
+
+
+def run_chain(pool, corpus, chain, backend, chunksize):
+    tasks = [(path, chain, backend) for path, _ in corpus]
+    started = time.perf_counter()
+    results = list(pool.map(_bench_crop, tasks, chunksize=chunksize))
+    elapsed = time.perf_counter() - started
+    latencies = [round(ms, 2) for _, _, ms in results if ms is not None]
+    return {
+        'chain': chain,
+        'backend': backend,
+        'elapsed_seconds': round(elapsed, 3),
+        'crops_per_second': round(len(corpus) / elapsed, 2) if elapsed > 0 else None,
+        'latency_ms': summarize_latencies(latencies),
+        **score(corpus, results),
+    }
+
+
+def benchmark(root=ARCHIVE_ROOT, chains=DEFAULT_CHAINS, backends=('tesseract',), workers=None,
+              limit=None, chunksize=8, labels=None, min_crops=MIN_CROPS):
+    corpus, skipped = load_corpus(root, limit, labels)
+    plates = len({plate for _, plate in corpus})
+    if len(corpus) < max(min_crops, 1):
+        raise SystemExit(f"[OCR-BENCH] Only {len(corpus)} labelled crops ({plates} plates) under {root}, "
+                         f"{min_crops} needed: label more (--labels) or lower --min-crops")
+    workers = workers or os.cpu_count()
+    print(f"[OCR-BENCH] {len(corpus)} labelled crops of {plates} distinct plates "
+          f"({skipped} unlabelled skipped), {workers} workers")
+
+    runs = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for backend in backends:
+            for chain in chains:
+                result = run_chain(pool, corpus, chain, backend, chunksize)
+                latency = result['latency_ms']
+                print(f"[OCR-BENCH] {backend}/{chain}: {result['crops_per_second']} crops/s, "
+                      f"p50/p95 = {latency['p50']}/{latency['p95']} ms, "
+                      f"exact {result['exact_match']:.1%}, wrong plate {result['wrong_plate']:.1%}, "
+                      f"top confusions {result['top_confusions'][:3]}")
+                runs.append(result)
+
+    return {
+        'corpus': root,
+        'crops': len(corpus),
+        'distinct_plates': plates,
+        'unlabelled_skipped': skipped,
+        'workers': workers,
+        'revision': git_revision(),
+        'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'runs': runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR throughput and accuracy over labelled plate crops")
+    parser.add_argument('--dir', default=ARCHIVE_ROOT, help="folder of crops (searched recursively)")
+    parser.add_argument('--chains', nargs='+', choices=list(CHAINS), default=list(DEFAULT_CHAINS))
+    parser.add_argument('--backends', nargs='+', choices=sorted(BACKENDS), default=['tesseract'])
+    parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    parser.add_argument('--labels', help="CSV (file,plate) or JSON ({file: plate}) labels manifest")
+    parser.add_argument('--limit', type=int, help="only the first N labelled crops")
+    parser.add_argument('--min-crops', type=int, default=MIN_CROPS,
+                        help=f"refuse to run on fewer labelled crops (default {MIN_CROPS})")
+    parser.add_argument('--out', help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels) if args.labels else None
+    report = benchmark(args.dir, args.chains, args.backends, args.workers, args.limit,
+                       labels=labels, min_crops=args.min_crops)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"[OCR-BENCH] Report saved to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import queue
+import threading
+from collections import namedtuple
+
+try:
+    import tesserocr
+except ImportError:  # Fall back to the pytesseract subprocess path
+    tesserocr = None
+
+import pytesseract
+
+# Path to Tesseract (used by the pytesseract fallback only)
+pytesseract.pytesseract.tesseract_cmd = r'C:\Users\mugis\AppData\Local\Programs\Tesseract-OCR\tesseract.exe'
+
+# Directory holding eng.traineddata for tesserocr; None lets Tesseract use its default
+TESSDATA_PATH = None
+
+PLATE_WHITELIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+PLATE_OCR_CONFIG = f'--psm 8 --oem 3 -c tessedit_char_whitelist={PLATE_WHITELIST}'
+
+# text has all whitespace removed; char_confidences holds one 0-100 value per
+# character of text; confidence is the mean of char_confidences (0 if empty).
+OcrResult = namedtuple('OcrResult', ['text', 'char_confidences', 'confidence'])
+
+
+def _make_result(chars, confidences):
+    text = ''.join(chars)
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return OcrResult(text, list(confidences), confidence)
+
+
+class TesseractApiPool:
+    """
+    Pool of warm in-process Tesseract API handles (via tesserocr).
+
+    Each handle is initialised once with the plate whitelist and page
+    segmentation mode, so a recognition call is just SetImage + Recognize with
+    no temp files and no process spawn. tesserocr releases the GIL while
+    recognising, so callers on different threads run in parallel.
+    """
+
+    def __init__(self, size=2):
+        self._handles = queue.LifoQueue()
+        self._all = []
+        for _ in range(size):
+            kwargs = {'psm': tesserocr.PSM.SINGLE_WORD, 'oem': tesserocr.OEM.DEFAULT}
+            if TESSDATA_PATH:
+                kwargs['path'] = TESSDATA_PATH
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            api.SetVariable('tessedit_char_whitelist', PLATE_WHITELIST)
+            self._all.append(api)
+            self._handles.put(api)
+
+    def recognize(self, image):
+        """Recognises a single-channel uint8 image (e.g. a thresholded plate)."""
+        if image.ndim != 2:
+            raise ValueError('OCR engine expects a single-channel image')
+        height, width = image.shape
+        api = self._handles.get()
+        try:
+            api.SetImageBytes(image.tobytes(), width, height, 1, width)
+            api.Recognize()
+            chars, confidences = [], []
+            iterator = api.GetIterator()
+            level = tesserocr.RIL.SYMBOL
+            if iterator is not None:
+                for symbol in tesserocr.iterate_level(iterator, level):
+                    char = symbol.GetUTF8Text(level)
+                    if not char or char.isspace():
+                        continue
+                    chars.append(char)
+                    confidences.append(symbol.Confidence(level))
+            return _make_result(chars, confidences)
+        finally:
+            api.Clear()
+            self._handles.put(api)
+
+    def close(self):
+        for api in self._all:
+            api.End()
+        self._all = []
+
+
+class PytesseractEngine:
+    """
+    Fallback engine for machines without tesserocr.
+
+    Still spawns one tesseract process per call, but returns the same
+    OcrResult shape so callers do not care which engine they got.
+    """
+
+    def recognize(self, image):
+        data = pytesseract.image_to_data(image, config=PLATE_OCR_CONFIG,
+                                         output_type=pytesseract.Output.DICT)
+        chars, confidences = [], []
+        for word, conf in zip(data['text'], data['conf']):
+            word = ''.join(word.split())
+            if not word:
+                continue
+            # Tesseract only reports word-level confidence on this path
+            conf = max(float(conf), 0.0)
+            chars.extend(word)
+            confidences.extend([conf] * len(word))
+        return _make_result(chars, confidences)
+
+    def close(self):
+        pass
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(pool_size=2):
+    """Returns the process-wide OCR engine, creating it on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            if tesserocr is not None:
+                _engine = TesseractApiPool(pool_size)
+                print(f"[OCR] Using in-process Tesseract API pool ({pool_size} handles)")
+            else:
+                _engine = PytesseractEngine()
+                print("[OCR] tesserocr not installed; falling back to pytesseract subprocess calls")
+        return _engine
+
+
+def close_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+            _engine = None
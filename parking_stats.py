@@ -0,0 +1,99 @@
+import argparse
+import time
+
+import db
+import migrations
+
+# Window sizes served by /api/stats
+HOURS_SHOWN = 24
+DAYS_SHOWN = 7
+
+# hour is the epoch second the bucket starts at
+SQL_HOURS = '''
+    SELECT hour, entries, exits, revenue, dwell_seconds, incidents
+    FROM hourly_stats
+    WHERE hour >= ?
+    ORDER BY hour
+'''
+SQL_DAYS = '''
+    SELECT date(hour, 'unixepoch', 'localtime') AS day,
+           SUM(entries) AS entries, SUM(exits) AS exits, SUM(revenue) AS revenue,
+           SUM(dwell_seconds) AS dwell_seconds, SUM(incidents) AS incidents
+    FROM hourly_stats
+    WHERE hour >= ?
+    GROUP BY day
+    ORDER BY day
+'''
+SQL_OCCUPANCY = 'SELECT occupancy FROM parking_totals WHERE id = 1'
+
+
+def _bucket(row, key, label):
+    exits = row['exits']
+    return {
+        key: label,
+        'entries': row['entries'],
+        'exits': exits,
+        'revenue': row['revenue'],
+        'avg_dwell_minutes': round(row['dwell_seconds'] / exits / 60, 1) if exits else None,
+        'incidents': row['incidents'],
+    }
+
+
+def get_stats(hours=HOURS_SHOWN, days=DAYS_SHOWN):
+    """
+    Live occupancy plus hourly and daily summaries. Reads at most
+    `hours` + 24 * `days` bucket rows by primary key, so the cost does not
+    grow with the size of car_entries.
+    """
+    now = int(time.time())
+    first_hour = now - now % 3600 - (hours - 1) * 3600
+    today = time.localtime(now)
+    first_day = int(time.mktime((today.tm_year, today.tm_mon, today.tm_mday - (days - 1),
+                                 0, 0, 0, 0, 0, -1)))
+    with db.connection() as conn:
+        occupancy = conn.execute(SQL_OCCUPANCY).fetchone()
+        hourly = conn.execute(SQL_HOURS, (first_hour,)).fetchall()
+        daily = conn.execute(SQL_DAYS, (first_day,)).fetchall()
+    return {
+        'occupancy': occupancy['occupancy'] if occupancy else 0,
+        'rate_per_hour': db.RATE_PER_HOUR,
+        'hourly': [_bucket(row, 'hour', db.format_time(row['hour'])) for row in hourly],
+        'daily': [_bucket(row, 'day', row['day']) for row in daily],
+    }
+
+
+def rebuild():
+    """Recomputes every bucket and the occupancy counter from history."""
+    with db.connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for statement in migrations.REBUILD_STATS:
+                conn.execute(statement)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        buckets = conn.execute('SELECT COUNT(*) FROM hourly_stats').fetchone()[0]
+    print(f"[STATS] Rebuilt {buckets} hourly buckets")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parking statistics tools")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('rebuild', help="backfill hourly buckets from car_entries and incidents")
+    sub.add_parser('show', help="print the current statistics")
+    args = parser.parse_args()
+    try:
+        if args.command == 'rebuild':
+            rebuild()
+        elif args.command == 'show':
+            stats = get_stats()
+            print(f"Occupancy: {stats['occupancy']}")
+            for bucket in stats['daily']:
+                print(bucket)
+    finally:
+        db.close_all()
+
+
+if __name__ == '__main__':
+    main()
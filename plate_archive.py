@@ -0,0 +1,235 @@
+import argparse
+import os
+import re
+import shutil
+import threading
+import time
+
+import cv2
+
+import db
+
+ARCHIVE_ROOT = 'plates'
+
+# Snapshots of the same plate whose 64-bit dHashes differ in at most this
+# many bits are treated as the same picture and not stored again.
+DEDUPE_MAX_DISTANCE = 6
+# ...but only within this many seconds of it: a later visit of the same car,
+# seen by the same fixed camera, is a new session and keeps its snapshot.
+DEDUPE_WINDOW_SECONDS = 120
+DEDUPE_MAX_PLATES = 1000  # Plates remembered before expired windows are dropped
+
+# Flat files written before the archive existed: RAG187P_20250602_111755.jpg
+FLAT_NAME = re.compile(r'^([A-Z0-9]+)_(\d{8})_(\d{6})\.jpg$')
+
+# Crops with no plate read (crop_plate_extract.py's plate_N.jpg, unreadable
+# plates) are stored under unknown/YYYY/MM/DD/ and indexed with this plate.
+UNKNOWN_PLATE = 'UNKNOWN'
+UNKNOWN_SHARD = 'unknown'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def dhash(image):
+    """64-bit difference hash of an image; robust to small shifts and noise."""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def hamming(a, b):
+    return bin((a ^ b) & ((1 << 64) - 1)).count('1')
+
+
+class PlateArchive:
+    """
+    Date-sharded snapshot store with a SQLite index.
+
+    Files live under <root>/YYYY/MM/DD/<PLATE>_<YYYYMMDD>_<HHMMSS>.jpg, so no
+    directory grows without bound, and the plate_images table maps
+    (plate, captured_at, session_id) to the relative path so the dashboard
+    never has to list directories. Near-identical crops of the same plate
+    within dedupe_window seconds of the last stored one are skipped.
+
+    With a WriteBehind `writer`, the JPEG write and the index insert are
+    queued behind the entry insert instead of running inline.
+    """
+
+    def __init__(self, root=ARCHIVE_ROOT, writer=None, dedupe_distance=DEDUPE_MAX_DISTANCE,
+                 dedupe_window=DEDUPE_WINDOW_SECONDS):
+        self.root = root
+        self.writer = writer
+        self.dedupe_distance = dedupe_distance
+        self.dedupe_window = dedupe_window
+        self._last_hash = {}  # plate -> (dhash, epoch seconds) of the last stored snapshot
+        self._lock = threading.Lock()
+
+        self.stored = 0
+        self.deduped = 0
+
+    def relative_path(self, plate, captured_at, name=None):
+        """captured_at is a time.struct_time (local time); `name` overrides the file name."""
+        shard = time.strftime('%Y/%m/%d', captured_at)
+        stamp = time.strftime('%Y%m%d_%H%M%S', captured_at)
+        if plate == UNKNOWN_PLATE:
+            # Several unread crops can share a second: add microseconds
+            name = name or f"{plate}_{stamp}_{time.time_ns() // 1000 % 1000000:06d}.jpg"
+            return f"{UNKNOWN_SHARD}/{shard}/{name}"
+        return f"{shard}/{name or f'{plate}_{stamp}.jpg'}"
+
+    def full_path(self, relative_path):
+        return os.path.join(self.root, *relative_path.split('/'))
+
+    def is_duplicate(self, plate, image_hash, captured_ts):
+        """
+        True if `image_hash` is within dedupe_distance of the plate's last
+        stored crop, taken less than dedupe_window seconds before
+        `captured_ts`; otherwise it becomes that last crop.
+        """
+        with self._lock:
+            last = self._last_hash.get(plate)
+            if (last is not None and 0 <= captured_ts - last[1] < self.dedupe_window
+                    and hamming(last[0], image_hash) <= self.dedupe_distance):
+                self.deduped += 1
+                return True
+            self._last_hash[plate] = (image_hash, captured_ts)
+            self.stored += 1
+            if len(self._last_hash) > DEDUPE_MAX_PLATES:
+                # Forget plates whose window has passed
+                self._last_hash = {p: entry for p, entry in self._last_hash.items()
+                                   if captured_ts - entry[1] < self.dedupe_window}
+            return False
+
+    def store(self, plate, image, captured_at=None):
+        """
+        Saves a plate crop and indexes it against the plate's latest session
+        (plate None: an unread crop). Returns the relative path, or None if
+        it duplicated the previous crop.
+        """
+        plate = plate or UNKNOWN_PLATE
+        captured_at = captured_at or time.localtime()
+        image_hash = dhash(image)
+        captured_ts = int(time.mktime(captured_at))
+        if self.is_duplicate(plate, image_hash, captured_ts):
+            return None
+
+        rel = self.relative_path(plate, captured_at)
+        path = self.full_path(rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        params = (plate, captured_ts, plate, rel, image_hash)
+        if self.writer:
+            self.writer.save_image(path, image)
+            self.writer.execute(db.SQL_INSERT_PLATE_IMAGE, params)
+        else:
+            cv2.imwrite(path, image)
+            db.run_batch([(db.SQL_INSERT_PLATE_IMAGE, params)])
+        return rel
+
+    def stats(self):
+        return {'stored': self.stored, 'deduped': self.deduped}
+
+
+# ===== Migration from the flat plates/ directory =====
+def _flat_files(source):
+    """
+    ([(plate, captured_at, file name)], number of non-image files): labelled
+    files by name, then unlabelled ones by modification time.
+    """
+    labelled, unlabelled, other = [], [], 0
+    for entry in os.scandir(source):
+        if not entry.is_file():
+            continue
+        match = FLAT_NAME.match(entry.name)
+        if match:
+            plate, day, clock = match.groups()
+            labelled.append((plate, time.strptime(day + clock, '%Y%m%d%H%M%S'), entry.name))
+        elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+            mtime = entry.stat().st_mtime
+            unlabelled.append((mtime, entry.name, (UNKNOWN_PLATE, time.localtime(mtime), entry.name)))
+        else:
+            other += 1
+    labelled.sort(key=lambda item: item[2])  # Groups each plate's files, oldest first
+    unlabelled.sort()
+    return labelled + [item for _, _, item in unlabelled], other
+
+
+def migrate_flat_directory(source, root=ARCHIVE_ROOT, copy=False, dry_run=False, batch_size=200):
+    """
+    Moves (or copies) the snapshots of a flat directory into the sharded
+    layout and indexes them. PLATE_YYYYMMDD_HHMMSS.jpg files are linked to
+    the session whose entry time is the latest one at or before the capture
+    time; other images (plate_N.jpg) go under unknown/, dated by their
+    modification time. Near-duplicates of the previous file of the same
+    plate taken within the dedupe window are left in `source`, as are
+    non-image files.
+    """
+    archive = PlateArchive(root)
+    imported, duplicates, batch = 0, 0, []
+
+    files, skipped = _flat_files(source)
+    for plate, captured_at, name in files:
+        captured_ts = int(time.mktime(captured_at))
+        src = os.path.join(source, name)
+        rel = archive.relative_path(plate, captured_at, name if plate == UNKNOWN_PLATE else None)
+        dst = archive.full_path(rel)
+        if os.path.exists(dst):
+            skipped += 1
+            continue
+
+        image = cv2.imread(src)
+        image_hash = dhash(image) if image is not None else None
+        if image_hash is not None and archive.is_duplicate(plate, image_hash, captured_ts):
+            duplicates += 1
+            continue
+
+        if dry_run:
+            print(f"[MIGRATE] {src} -> {dst}")
+        else:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            (shutil.copy2 if copy else shutil.move)(src, dst)
+            session_id = db.session_at(plate, captured_ts) if plate != UNKNOWN_PLATE else None
+            batch.append((db.SQL_INSERT_PLATE_IMAGE_FOR_SESSION,
+                          (plate, captured_ts, session_id, rel, image_hash)))
+            if len(batch) >= batch_size:
+                db.run_batch(batch)
+                batch = []
+        imported += 1
+
+    if batch:
+        db.run_batch(batch)
+    print(f"[MIGRATE] Imported {imported} snapshots into {root}/ "
+          f"({duplicates} near-duplicates and {skipped} other files left in {source})")
+    return imported, duplicates, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plate snapshot archive tools")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    migrate = sub.add_parser('migrate', help="import a flat directory of plate snapshots")
+    migrate.add_argument('--source', default=ARCHIVE_ROOT, help="flat directory to import")
+    migrate.add_argument('--root', default=ARCHIVE_ROOT, help="archive root")
+    migrate.add_argument('--copy', action='store_true', help="copy instead of moving files")
+    migrate.add_argument('--dry-run', action='store_true', help="only print what would happen")
+
+    show = sub.add_parser('show', help="list indexed snapshots for a plate")
+    show.add_argument('plate')
+    show.add_argument('--limit', type=int, default=20)
+
+    args = parser.parse_args()
+    try:
+        if args.command == 'migrate':
+            migrate_flat_directory(args.source, args.root, copy=args.copy, dry_run=args.dry_run)
+        elif args.command == 'show':
+            for row in db.images_for_plate(args.plate, args.limit):
+                print(f"{db.format_time(row['captured_at'])}  session={row['session_id']}  {row['path']}")
+    finally:
+        db.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,487 @@
+"""
+Plate detector backends for CPU-only gate PCs.
+
+    python plate_detector.py export --format onnx
+    python plate_detector.py export --format openvino
+    python plate_detector.py benchmark --backends torch onnx openvino --out results/detectors.json
+
+'torch' runs best.pt through Ultralytics/PyTorch. 'onnx' (ONNX Runtime)
+and 'openvino' run the exported model directly, with our own letterbox and
+NMS, so neither needs PyTorch at run time and their thread count can be
+pinned. All backends return the same Box tuples in frame coordinates.
+With --server, a lane uses the model loaded by inference_server.py instead.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+import metrics
+
+# Defaults used by car_entry.py / car_exit.py
+DETECTOR_BACKEND = 'torch'
+WEIGHTS = {
+    'torch': 'best.pt',
+    'onnx': 'best.onnx',
+    'openvino': 'best_openvino_model/best.xml',
+}
+IMGSZ = 640
+CONFIDENCE = 0.25
+NMS_IOU = 0.45
+THREADS = None  # None: let the runtime use every core
+WARMUP_RUNS = 3
+
+# Part of the frame where plates can appear, as (x1, y1, x2, y2) fractions
+# of the frame size (None: whole frame), and the width that region is
+# downscaled to before detection (None: detect at full resolution).
+LANE_ROI = None
+DETECT_WIDTH = None
+
+# Where inference_server.py listens: a Unix socket path, or host:port where
+# Unix sockets are unavailable (Windows)
+SERVER_ADDRESS = '/tmp/pms-detector.sock'
+
+VAL_DIR = 'dataset/val'
+MATCH_IOU = 0.5  # A detection counts as correct at this IoU with a labelled plate
+
+Box = namedtuple('Box', ['x1', 'y1', 'x2', 'y2', 'confidence'])
+
+
+class Detector:
+    """Common interface: detect(frame) -> [Box] in frame pixel coordinates."""
+
+    name = 'detector'
+
+    def detect(self, frame):
+        raise NotImplementedError
+
+    def detect_batch(self, frames):
+        """[[Box]] per frame; backends that can run one batched forward pass override this."""
+        return [self.detect(frame) for frame in frames]
+
+    def warmup(self, runs=WARMUP_RUNS):
+        """Runs a few blank frames so lazy allocation and JIT don't hit the first car."""
+        blank = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        started = time.perf_counter()
+        for _ in range(runs):
+            self.detect(blank)
+        print(f"[DETECTOR] {self.name} warmed up in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return self
+
+
+class TorchDetector(Detector):
+    name = 'torch'
+
+    def __init__(self, weights=WEIGHTS['torch'], imgsz=IMGSZ, conf=CONFIDENCE, threads=THREADS):
+        import torch
+        from ultralytics import YOLO
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = YOLO(weights)
+        self.imgsz = imgsz
+        self.conf = conf
+
+    def detect(self, frame):
+        results = self.model.predict(frame, imgsz=self.imgsz, conf=self.conf, verbose=False)
+        boxes = []
+        for result in results:
+            for xyxy, confidence in zip(result.boxes.xyxy.tolist(), result.boxes.conf.tolist()):
+                boxes.append(Box(*map(int, xyxy), confidence))
+        return boxes
+
+    def detect_batch(self, frames):
+        results = self.model.predict(list(frames), imgsz=self.imgsz, conf=self.conf, verbose=False)
+        return [[Box(*map(int, xyxy), confidence)
+                 for xyxy, confidence in zip(result.boxes.xyxy.tolist(), result.boxes.conf.tolist())]
+                for result in results]
+
+
+class _ExportedDetector(Detector):
+    """Letterbox -> raw YOLOv8 head -> confidence filter -> NMS, shared by ONNX and OpenVINO."""
+
+    def __init__(self, imgsz, conf, batchable=False):
+        self.imgsz = imgsz
+        self.conf = conf
+        self.batchable = batchable  # Exported with a dynamic batch dimension
+
+    def _letterbox(self, frame):
+        height, width = frame.shape[:2]
+        ratio = min(self.imgsz / height, self.imgsz / width)
+        new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+        pad_x, pad_y = (self.imgsz - new_w) / 2, (self.imgsz - new_h) / 2
+        resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        canvas = cv2.copyMakeBorder(resized, int(round(pad_y - 0.1)), int(round(pad_y + 0.1)),
+                                    int(round(pad_x - 0.1)), int(round(pad_x + 0.1)),
+                                    cv2.BORDER_CONSTANT, value=(114, 114, 114))
+        blob = cv2.dnn.blobFromImage(canvas, 1 / 255.0, swapRB=True)  # 1x3xHxW float32 RGB
+        return blob, ratio, pad_x, pad_y
+
+    def _postprocess(self, output, frame_shape, ratio, pad_x, pad_y):
+        # (1, 4 + classes, anchors) -> (anchors, 4 + classes)
+        predictions = np.squeeze(output, axis=0).T
+        scores = predictions[:, 4:].max(axis=1)
+        keep = scores >= self.conf
+        if not keep.any():
+            return []
+        predictions, scores = predictions[keep], scores[keep]
+
+        cx, cy, w, h = predictions[:, 0], predictions[:, 1], predictions[:, 2], predictions[:, 3]
+        x1 = (cx - w / 2 - pad_x) / ratio
+        y1 = (cy - h / 2 - pad_y) / ratio
+        widths, heights = w / ratio, h / ratio
+
+        rects = np.stack([x1, y1, widths, heights], axis=1).tolist()
+        indices = cv2.dnn.NMSBoxes(rects, scores.tolist(), self.conf, NMS_IOU)
+        frame_h, frame_w = frame_shape[:2]
+        boxes = []
+        for i in np.array(indices).flatten():
+            bx, by, bw, bh = rects[i]
+            boxes.append(Box(max(0, int(bx)), max(0, int(by)),
+                             min(frame_w, int(bx + bw)), min(frame_h, int(by + bh)),
+                             float(scores[i])))
+        return boxes
+
+    def _infer(self, blob):
+        raise NotImplementedError
+
+    def detect(self, frame):
+        blob, ratio, pad_x, pad_y = self._letterbox(frame)
+        return self._postprocess(self._infer(blob), frame.shape, ratio, pad_x, pad_y)
+
+    def detect_batch(self, frames):
+        if not self.batchable or len(frames) == 1:
+            return super().detect_batch(frames)
+        prepared = [self._letterbox(frame) for frame in frames]
+        output = self._infer(np.concatenate([blob for blob, _, _, _ in prepared]))
+        return [self._postprocess(output[i:i + 1], frame.shape, ratio, pad_x, pad_y)
+                for i, (frame, (_, ratio, pad_x, pad_y)) in enumerate(zip(frames, prepared))]
+
+
+def _static_size(shape, default):
+    """Input size baked into an exported model, if it is static."""
+    size = shape[-1]
+    return size if isinstance(size, int) and size > 0 else default
+
+
+class OnnxDetector(_ExportedDetector):
+    name = 'onnx'
+
+    def __init__(self, weights=WEIGHTS['onnx'], imgsz=IMGSZ, conf=CONFIDENCE, threads=THREADS):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(weights, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batchable = not isinstance(model_input.shape[0], int)
+        super().__init__(_static_size(model_input.shape, imgsz), conf, batchable)
+
+    def _infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoDetector(_ExportedDetector):
+    name = 'openvino'
+
+    def __init__(self, weights=WEIGHTS['openvino'], imgsz=IMGSZ, conf=CONFIDENCE, threads=THREADS):
+        import openvino as ov
+
+        core = ov.Core()
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if threads:
+            config['INFERENCE_NUM_THREADS'] = str(threads)
+        model = core.read_model(weights)
+        self.compiled = core.compile_model(model, 'CPU', config)
+        self.output = self.compiled.output(0)
+        shape = self.compiled.input(0).get_partial_shape()
+        size = shape[3].get_length() if shape[3].is_static else imgsz
+        super().__init__(size, conf, batchable=shape[0].is_dynamic)
+
+    def _infer(self, blob):
+        return self.compiled([blob])[self.output]
+
+
+class RegionDetector(Detector):
+    """
+    Runs a detector on a downscaled copy of the lane's region of interest and
+    maps the boxes back to full-frame pixel coordinates, so OCR still crops
+    from the full-resolution frame.
+
+    The region is a NumPy view of the frame (no copy); the only new image
+    is the downscaled region handed to the detector. Because the plate then
+    fills more of the detector input, a smaller imgsz usually gives the same
+    recall for much less inference time.
+    """
+
+    def __init__(self, detector, roi=LANE_ROI, detect_width=DETECT_WIDTH):
+        self.detector = detector
+        self.roi = roi
+        self.detect_width = detect_width
+        self.name = f'{detector.name}+roi'
+        self._frame_shape = None
+        self._rect = None
+
+    @property
+    def imgsz(self):
+        return self.detector.imgsz
+
+    def region(self, frame_shape):
+        """ROI in pixels for frames of this shape: (x1, y1, x2, y2)."""
+        if frame_shape != self._frame_shape:
+            height, width = frame_shape[:2]
+            fx1, fy1, fx2, fy2 = self.roi or (0.0, 0.0, 1.0, 1.0)
+            self._rect = (int(fx1 * width), int(fy1 * height), int(fx2 * width), int(fy2 * height))
+            self._frame_shape = frame_shape
+        return self._rect
+
+    def detect(self, frame):
+        x1, y1, x2, y2 = self.region(frame.shape)
+        view = frame[y1:y2, x1:x2]
+        scale = 1.0
+        if self.detect_width and view.shape[1] > self.detect_width:
+            scale = self.detect_width / view.shape[1]
+            view = cv2.resize(view, (self.detect_width, max(1, int(round(view.shape[0] * scale)))),
+                              interpolation=cv2.INTER_AREA)
+
+        def to_frame(value, offset, limit):
+            # Clipped to the region: detectors may put a box edge slightly outside their input
+            return max(offset, min(limit, offset + int(round(value / scale))))
+
+        return [Box(to_frame(box.x1, x1, x2), to_frame(box.y1, y1, y2),
+                    to_frame(box.x2, x1, x2), to_frame(box.y2, y1, y2), box.confidence)
+                for box in self.detector.detect(view)]
+
+
+BACKENDS = {
+    'torch': TorchDetector,
+    'onnx': OnnxDetector,
+    'openvino': OpenVinoDetector,
+}
+
+
+def make_detector(backend=DETECTOR_BACKEND, weights=None, imgsz=IMGSZ, conf=CONFIDENCE,
+                  threads=THREADS, roi=LANE_ROI, detect_width=DETECT_WIDTH, server=None, warmup=True):
+    """
+    Loads a detector backend, or with `server` connects to the shared
+    inference server instead (see inference_server.py); the model options
+    are then the server's. ROI and downscaling always run in this process.
+    """
+    if server:
+        from inference_server import RemoteDetector
+        detector = RemoteDetector(server)
+        print(f"[DETECTOR] Using inference server at {server}, imgsz={detector.imgsz}")
+    else:
+        detector = BACKENDS[backend](weights or WEIGHTS[backend], imgsz=imgsz, conf=conf, threads=threads)
+        print(f"[DETECTOR] {backend} backend, {weights or WEIGHTS[backend]}, imgsz={detector.imgsz}, "
+              f"conf={conf}, threads={threads or 'all'}")
+    if roi or detect_width:
+        detector = RegionDetector(detector, roi, detect_width)
+        print(f"[DETECTOR] Lane ROI {roi or 'full frame'}, detecting at width {detect_width or 'full'}")
+    return detector.warmup() if warmup else detector
+
+
+def add_detector_arguments(parser, lane=True):
+    """
+    The detector options shared by the gate scripts, the replay harness and
+    (with lane=False, model options only) the inference server.
+    """
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=DETECTOR_BACKEND,
+                        help="detector runtime")
+    parser.add_argument('--weights', help="model file for the backend (default per backend)")
+    parser.add_argument('--imgsz', type=int, default=IMGSZ)
+    parser.add_argument('--conf', type=float, default=CONFIDENCE)
+    parser.add_argument('--threads', type=int, default=THREADS,
+                        help="detector CPU threads (default: all cores)")
+    if not lane:
+        return
+    parser.add_argument('--server', nargs='?', const=SERVER_ADDRESS, metavar='ADDRESS',
+                        help="use the shared inference server instead of loading the model "
+                             f"(default address {SERVER_ADDRESS})")
+    parser.add_argument('--roi', type=float, nargs=4, default=LANE_ROI, metavar=('X1', 'Y1', 'X2', 'Y2'),
+                        help="lane region as fractions of the frame, e.g. 0.2 0.4 0.8 1.0")
+    parser.add_argument('--detect-width', type=int, default=DETECT_WIDTH,
+                        help="downscale the region to this width before detection")
+
+
+def detector_from_args(args):
+    return make_detector(args.backend, args.weights, imgsz=args.imgsz, conf=args.conf,
+                         threads=args.threads, roi=args.roi, detect_width=args.detect_width,
+                         server=args.server)
+
+
+def draw_boxes(frame, boxes):
+    """Annotated copy of a frame for preview windows."""
+    annotated = frame.copy()
+    for box in boxes:
+        cv2.rectangle(annotated, (box.x1, box.y1), (box.x2, box.y2), (0, 255, 0), 2)
+        cv2.putText(annotated, f"{box.confidence:.2f}", (box.x1, max(0, box.y1 - 5)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    return annotated
+
+
+# ===== Export =====
+def export_model(fmt, weights=WEIGHTS['torch'], imgsz=IMGSZ, dynamic_batch=False):
+    """
+    Exports best.pt for the 'onnx' or 'openvino' backend; returns the path to
+    load. Shapes are static unless dynamic_batch is set, which the inference
+    server needs to run several lanes' frames in one forward pass.
+    """
+    from ultralytics import YOLO
+
+    options = {'simplify': True} if fmt == 'onnx' else {}
+    path = YOLO(weights).export(format=fmt, imgsz=imgsz, dynamic=dynamic_batch, half=False, **options)
+    if fmt == 'openvino' and os.path.isdir(path):
+        path = os.path.join(path, os.path.splitext(os.path.basename(weights))[0] + '.xml')
+    print(f"[EXPORT] {weights} -> {path}")
+    return path
+
+
+# ===== Benchmark =====
+def _box_iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def load_labels(label_path, width, height):
+    """YOLO-format label file -> [(x1, y1, x2, y2)] in pixels."""
+    boxes = []
+    if not os.path.exists(label_path):
+        return boxes
+    with open(label_path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 5:
+                continue
+            cx, cy, w, h = (float(v) for v in parts[1:5])
+            boxes.append(((cx - w / 2) * width, (cy - h / 2) * height,
+                          (cx + w / 2) * width, (cy + h / 2) * height))
+    return boxes
+
+
+def _match(detections, labels):
+    """Greedy one-to-one matching by confidence. Returns (true positives, false positives)."""
+    unmatched = list(labels)
+    tp = 0
+    for box in sorted(detections, key=lambda b: -b.confidence):
+        best = max(unmatched, key=lambda label: _box_iou(box, label), default=None)
+        if best is not None and _box_iou(box, best) >= MATCH_IOU:
+            unmatched.remove(best)
+            tp += 1
+    return tp, len(detections) - tp
+
+
+def benchmark(backends, data_dir=VAL_DIR, imgsz=IMGSZ, conf=CONFIDENCE, threads=THREADS, repeat=1,
+              detect_width=None):
+    """Runs every backend over data_dir/images and scores it against data_dir/labels."""
+    image_paths = sorted(glob.glob(os.path.join(data_dir, 'images', '*.jpg')))
+    images = []
+    for path in image_paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        label_path = os.path.join(data_dir, 'labels', os.path.splitext(os.path.basename(path))[0] + '.txt')
+        images.append((image, load_labels(label_path, image.shape[1], image.shape[0])))
+    if not images:
+        raise SystemExit(f"No images found under {data_dir}/images")
+
+    results = []
+    for backend in backends:
+        try:
+            detector = make_detector(backend, imgsz=imgsz, conf=conf, threads=threads,
+                                     detect_width=detect_width)
+        except (ImportError, OSError, RuntimeError) as e:
+            print(f"[BENCH] Skipping {backend}: {e}")
+            continue
+
+        latencies, tp, fp, total_labels = [], 0, 0, 0
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for image, labels in images:
+                t0 = time.perf_counter()
+                boxes = detector.detect(image)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                hits, misses = _match(boxes, labels)
+                tp, fp, total_labels = tp + hits, fp + misses, total_labels + len(labels)
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        results.append({
+            'backend': backend,
+            'imgsz': detector.imgsz,
+            'detect_width': detect_width,
+            'images': len(latencies),
+            'fps': round(len(latencies) / elapsed, 2),
+            'latency_ms': {q: round(metrics.percentile(latencies, p), 2)
+                           for q, p in (('p50', 50), ('p95', 95), ('p99', 99))},
+            'precision': round(tp / (tp + fp), 3) if tp + fp else None,
+            'recall': round(tp / total_labels, 3) if total_labels else None,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plate detector backends")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    export = sub.add_parser('export', help="export best.pt for ONNX Runtime or OpenVINO")
+    export.add_argument('--format', choices=('onnx', 'openvino'), required=True)
+    export.add_argument('--weights', default=WEIGHTS['torch'])
+    export.add_argument('--imgsz', type=int, default=IMGSZ)
+    export.add_argument('--dynamic-batch', action='store_true',
+                        help="allow batched inference (for inference_server.py)")
+
+    bench = sub.add_parser('benchmark', help="compare backends on the validation set")
+    bench.add_argument('--backends', nargs='+', choices=sorted(BACKENDS), default=sorted(BACKENDS))
+    bench.add_argument('--data', default=VAL_DIR)
+    bench.add_argument('--imgsz', type=int, default=IMGSZ)
+    bench.add_argument('--conf', type=float, default=CONFIDENCE)
+    bench.add_argument('--threads', type=int, default=THREADS)
+    bench.add_argument('--repeat', type=int, default=3, help="passes over the images")
+    bench.add_argument('--detect-width', type=int, help="downscale images to this width first")
+    bench.add_argument('--min-recall', type=float, default=0.95,
+                       help="accuracy bar for picking the fastest backend")
+    bench.add_argument('--out', help="write the results as JSON to this file")
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        export_model(args.format, args.weights, args.imgsz, args.dynamic_batch)
+        return
+
+    results = benchmark(args.backends, args.data, args.imgsz, args.conf, args.threads, args.repeat,
+                        args.detect_width)
+    print(f"{'backend':<10} {'fps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'prec':>6} {'recall':>6}")
+    for r in results:
+        lat = r['latency_ms']
+        print(f"{r['backend']:<10} {r['fps']:>8} {lat['p50']:>8} {lat['p95']:>8} {lat['p99']:>8} "
+              f"{r['precision'] if r['precision'] is not None else '-':>6} "
+              f"{r['recall'] if r['recall'] is not None else '-':>6}")
+    eligible = [r for r in results if (r['recall'] or 0) >= args.min_recall]
+    if eligible:
+        best = max(eligible, key=lambda r: r['fps'])
+        print(f"[BENCH] Fastest with recall >= {args.min_recall}: {best['backend']} ({best['fps']} FPS)")
+    else:
+        print(f"[BENCH] No backend reached recall {args.min_recall}")
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump({'data': args.data, 'conf': args.conf, 'threads': args.threads,
+                       'results': results}, f, indent=2)
+        print(f"[BENCH] Results saved to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
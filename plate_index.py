@@ -0,0 +1,104 @@
+"""
+Approximate plate lookup, for OCR reads that are one character off.
+
+Plates share one fixed format (RA + letter, 3 digits, letter), so a misread
+is a substitution, never a shift. The index keeps every plate under its seven
+one-wildcard keys ('RAB12?C', ...); a read finds every plate within one
+substitution in seven dict lookups, and adding or removing a plate touches
+seven sets, so it can follow entries and exits as they happen.
+
+Substitutions between characters Tesseract confuses on plate fonts cost 1,
+any other 2. With the default max_cost of 1 a read only resolves to a plate
+it differs from by one known confusion, and only if exactly one plate fits.
+"""
+from collections import defaultdict
+
+from plate_pipeline import PLATE_LENGTH, normalize_plate
+
+# Same-class pairs seen swapped in OCR of plate crops
+CONFUSIONS = {frozenset(pair) for pair in (
+    'OD', 'OQ', 'DQ', 'IL', 'IT', 'IJ', 'LT', 'CG', 'EF', 'BE', 'BR', 'PR', 'MN', 'NW',
+    'UV', 'KX', 'HN',
+    '08', '38', '68', '89', '09', '69', '56', '17', '27', '14',
+)}
+CONFUSABLE_COST = 1
+OTHER_COST = 2
+MAX_COST = 1
+
+
+def normalize_read(text):
+    """
+    Maps lookalikes to the class each position requires (an '8' where a
+    letter belongs becomes 'B', an 'O' among the digits becomes '0'), so the
+    0/O, 8/B and 1/I confusions never reach the index as mismatches.
+    """
+    text = ''.join(text.split()).upper()
+    return normalize_plate(text) if len(text) == PLATE_LENGTH else text
+
+
+def substitution_cost(a, b):
+    cost = 0
+    for x, y in zip(a, b):
+        if x != y:
+            cost += CONFUSABLE_COST if frozenset((x, y)) in CONFUSIONS else OTHER_COST
+    return cost
+
+
+def _keys(plate):
+    return [plate[:i] + '?' + plate[i + 1:] for i in range(len(plate))]
+
+
+class PlateIndex:
+    """Set of plates that answers "which plate is this read a near-miss of?"."""
+
+    def __init__(self, max_cost=MAX_COST):
+        self.max_cost = max_cost
+        self._plates = set()
+        self._neighbours = defaultdict(set)  # plate with one position wildcarded -> plates
+
+    def add(self, plate):
+        if plate in self._plates:
+            return
+        self._plates.add(plate)
+        for key in _keys(plate):
+            self._neighbours[key].add(plate)
+
+    def remove(self, plate):
+        if plate not in self._plates:
+            return
+        self._plates.discard(plate)
+        for key in _keys(plate):
+            bucket = self._neighbours[key]
+            bucket.discard(plate)
+            if not bucket:
+                del self._neighbours[key]
+
+    def clear(self):
+        self._plates.clear()
+        self._neighbours.clear()
+
+    def __contains__(self, plate):
+        return plate in self._plates
+
+    def __len__(self):
+        return len(self._plates)
+
+    def match(self, read, accept=None):
+        """
+        The indexed plate `read` most plausibly is: the read itself, or the
+        single plate within max_cost of it. None when nothing is close enough
+        or two plates are equally close. `accept(plate)` can rule plates out
+        (e.g. sessions that cannot be leaving now).
+        """
+        read = normalize_read(read)
+        if read in self._plates and (accept is None or accept(read)):
+            return read
+        candidates = set()
+        for key in _keys(read):
+            candidates.update(self._neighbours.get(key, ()))
+        scored = sorted((substitution_cost(read, plate), plate) for plate in candidates
+                        if accept is None or accept(plate))
+        scored = [(cost, plate) for cost, plate in scored if cost <= self.max_cost]
+        if not scored or (len(scored) > 1 and scored[1][0] == scored[0][0]):
+            return None
+        return scored[0][1]
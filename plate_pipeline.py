@@ -0,0 +1,369 @@
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import cv2
+
+import metrics
+
+# One OCR attempt on a tracked plate box. `candidate` is the valid plate text
+# read from this crop (or None); `consensus` is set on the read that
+# completes the track's vote.
+PlateRead = namedtuple('PlateRead', ['track', 'crop', 'processed', 'candidate', 'consensus'])
+
+# Result of fusing several OCR variants of one crop: the plate (or None), its
+# confidence (0-100, the weakest character's), and {variant: text read}.
+FusedRead = namedtuple('FusedRead', ['plate', 'confidence', 'texts'])
+
+PLATE_LENGTH = 7
+# Character class required at each plate position: RA + letter, 3 digits, letter
+PLATE_PATTERN = ('R', 'A', 'alpha', 'digit', 'digit', 'digit', 'alpha')
+
+# Lookalikes across the letter/digit boundary, fixed from the position's class
+TO_LETTER = {'0': 'O', '1': 'I', '2': 'Z', '4': 'A', '5': 'S', '6': 'G', '7': 'T', '8': 'B'}
+TO_DIGIT = {'O': '0', 'Q': '0', 'D': '0', 'I': '1', 'L': '1', 'Z': '2', 'A': '4', 'S': '5',
+            'G': '6', 'T': '7', 'B': '8'}
+
+UPSCALE_FACTOR = 2
+MAX_DESKEW_DEGREES = 15  # Larger angles are more likely a bad estimate than a tilted plate
+
+
+# ===== OCR preprocessing (one per lane, as tuned on site) =====
+def adaptive_threshold(plate_img):
+    gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY)
+    blur = cv2.GaussianBlur(gray, (3, 3), 0)
+    return cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY_INV, 11, 2)
+
+
+def otsu_threshold(plate_img):
+    gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY)
+    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    return cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+def upscaled_threshold(plate_img):
+    """Otsu on a 2x cubic upscale, for distant plates with small characters."""
+    large = cv2.resize(plate_img, None, fx=UPSCALE_FACTOR, fy=UPSCALE_FACTOR,
+                       interpolation=cv2.INTER_CUBIC)
+    return otsu_threshold(large)
+
+
+def deskewed_threshold(plate_img):
+    """Otsu after rotating the plate level, using the angle of its dark (text) pixels."""
+    gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY)
+    ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    points = cv2.findNonZero(ink)
+    if points is not None and len(points) >= 5:
+        angle = cv2.minAreaRect(points)[-1]
+        # minAreaRect reports the angle of whichever side it picked; fold to -45..45
+        if angle > 45:
+            angle -= 90
+        elif angle < -45:
+            angle += 90
+        if 0.5 <= abs(angle) <= MAX_DESKEW_DEGREES:
+            height, width = gray.shape
+            matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+            gray = cv2.warpAffine(gray, matrix, (width, height), flags=cv2.INTER_CUBIC,
+                                  borderMode=cv2.BORDER_REPLICATE)
+    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    return cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+# Preprocessing variants MultiVariantOcr can run on each crop
+VARIANTS = {
+    'adaptive': adaptive_threshold,
+    'otsu': otsu_threshold,
+    'upscaled': upscaled_threshold,
+    'deskewed': deskewed_threshold,
+}
+
+
+def _normalize_char(char, rule):
+    """A letter/digit lookalike swapped for the class `rule` requires (8 -> B in a letter slot)."""
+    if rule == 'digit':
+        return TO_DIGIT.get(char, char)
+    return TO_LETTER.get(char, char)
+
+
+def _fits(char, rule):
+    if rule == 'alpha':
+        return char.isalpha() and char.isupper()
+    if rule == 'digit':
+        return char.isdigit()
+    return char == rule
+
+
+def normalize_plate(window):
+    """Maps the lookalikes in a 7-character plate window to each position's class."""
+    return ''.join(_normalize_char(char, rule) for char, rule in zip(window, PLATE_PATTERN))
+
+
+def extract_plate(text):
+    """
+    Returns the first Rwandan plate (RA + two letters, three digits, one
+    letter, e.g. RAB123C) found in OCR text, or None. Letter/digit
+    lookalikes are read as the class their position requires, so 'RA8I23C'
+    gives RAB123C.
+    """
+    start = text.find("RA")
+    if start < 0:
+        return None
+    window = text[start:start + PLATE_LENGTH]
+    if len(window) != PLATE_LENGTH:
+        return None
+    candidate = normalize_plate(window)
+    if all(_fits(char, rule) for char, rule in zip(candidate, PLATE_PATTERN)):
+        return candidate
+    return None
+
+
+def fuse_reads(results):
+    """
+    Combines OcrResults of differently preprocessed copies of one plate into a
+    FusedRead. Each result is aligned on its "RA" prefix; at every plate
+    position the characters that fit the format (after swapping letter/digit
+    lookalikes) vote with their Tesseract confidence. A position's
+    confidence is the winning votes divided by the number of variants run,
+    so a variant that found no plate counts as a vote against and a
+    character only some variants agree on scores low. The plate's
+    confidence is its weakest position's.
+
+    `results` maps variant name -> OcrResult.
+    """
+    texts = {name: result.text for name, result in results.items()}
+    windows = []
+    for result in results.values():
+        start = result.text.find('RA')
+        if start >= 0 and len(result.text) >= start + PLATE_LENGTH:
+            windows.append((result.text[start:start + PLATE_LENGTH],
+                            result.char_confidences[start:start + PLATE_LENGTH]))
+    if not windows:
+        return FusedRead(None, 0.0, texts)
+
+    plate, confidence = [], 100.0
+    for position, rule in enumerate(PLATE_PATTERN):
+        votes = defaultdict(float)
+        for chars, confidences in windows:
+            char = _normalize_char(chars[position], rule)
+            if _fits(char, rule):
+                votes[char] += confidences[position]
+        if not votes:
+            return FusedRead(None, 0.0, texts)
+        char, weight = max(votes.items(), key=lambda item: item[1])
+        plate.append(char)
+        confidence = min(confidence, weight / len(results))
+    return FusedRead(''.join(plate), round(confidence, 1), texts)
+
+
+class MultiVariantOcr:
+    """
+    Runs several preprocessing variants of a crop through OCR in parallel and
+    fuses them (fuse_reads). OpenCV and tesserocr release the GIL, so the
+    variants run on separate cores; give the OCR engine at least as many
+    handles as there are variants (get_engine(pool_size=...)).
+    """
+
+    def __init__(self, ocr, variants=tuple(VARIANTS)):
+        self.ocr = ocr
+        self.variants = {name: VARIANTS[name] for name in variants}
+        self._pool = ThreadPoolExecutor(max_workers=len(self.variants), thread_name_prefix='ocr-variant')
+
+    def _read(self, preprocess, crop):
+        processed = preprocess(crop)
+        return processed, self.ocr.recognize(processed)
+
+    def recognize(self, crop):
+        """Returns (FusedRead, the first variant's preprocessed image for display)."""
+        futures = {name: self._pool.submit(self._read, preprocess, crop)
+                   for name, preprocess in self.variants.items()}
+        outputs = {name: future.result() for name, future in futures.items()}
+        fused = fuse_reads({name: result for name, (_, result) in outputs.items()})
+        return fused, next(iter(outputs.values()))[0]
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+def add_ocr_arguments(parser):
+    parser.add_argument('--ocr-variants', nargs='+', choices=sorted(VARIANTS), metavar='VARIANT',
+                        help="OCR each crop with these preprocessing variants in parallel and fuse "
+                             f"the reads ({', '.join(VARIANTS)}); default: the lane's single variant")
+
+
+class PlatePipeline:
+    """
+    Detection -> tracking -> OCR -> consensus for one lane.
+
+    process() runs the detector on a frame, OCRs the boxes whose track has
+    not settled on a plate yet and feeds valid reads into the tracker. Gate
+    decisions are left to the caller, so the live scripts and the offline
+    replay (replay_bench.py) share exactly this path. `detector` is any
+    plate_detector backend.
+
+    With `variants` (names from VARIANTS), each crop is read by
+    MultiVariantOcr instead of `preprocess` alone, and the fused confidence
+    goes to the tracker, which can then settle on one or two frames.
+    """
+
+    def __init__(self, detector, ocr, tracker, preprocess, variants=None):
+        self.detector = detector
+        self.ocr = ocr
+        self.tracker = tracker
+        self.preprocess = preprocess
+        self.variant_ocr = MultiVariantOcr(ocr, variants) if variants else None
+
+    def detect(self, frame):
+        """Returns the plate_detector.Box list for a frame."""
+        with metrics.span('detect'):
+            boxes = self.detector.detect(frame)
+        metrics.inc('detections', len(boxes))
+        return boxes
+
+    def process(self, frame, intact=None):
+        """
+        Returns (detected boxes, [PlateRead for every box that was OCR'd]).
+        `intact()`, if given, is asked before each read reaches the tracker;
+        once it says the frame was overwritten meanwhile (a shared-memory
+        view, see frame_ring.py), the frame's remaining reads are dropped.
+        """
+        boxes = self.detect(frame)
+        reads = []
+        rects = [box[:4] for box in boxes]
+        for track, (x1, y1, x2, y2) in zip(self.tracker.update(rects), rects):
+            if not track.needs_ocr:
+                continue  # Plate already settled for this vehicle
+
+            crop = frame[y1:y2, x1:x2]
+            if crop.size == 0:
+                continue
+            if self.variant_ocr is not None:
+                with metrics.span('ocr_variants'):
+                    fused, processed = self.variant_ocr.recognize(crop)
+                metrics.inc('ocr_calls', len(self.variant_ocr.variants))
+                candidate, confidence = fused.plate, fused.confidence
+            else:
+                with metrics.span('preprocess'):
+                    processed = self.preprocess(crop)
+                with metrics.span('ocr'):
+                    text = self.ocr.recognize(processed).text
+                metrics.inc('ocr_calls')
+                candidate, confidence = extract_plate(text), None
+            if intact is not None and not intact():
+                metrics.inc('torn_frames')
+                break
+            consensus = None
+            if candidate:
+                metrics.inc('valid_plates')
+                consensus = self.tracker.add_read(track, candidate, confidence)
+                if consensus:
+                    metrics.inc('consensus_plates')
+            reads.append(PlateRead(track, crop, processed, candidate, consensus))
+        return boxes, reads
+
+    def close(self):
+        if self.variant_ocr is not None:
+            self.variant_ocr.close()
+
+
+class EntryCooldown:
+    """The entry lane's duplicate filter: the same plate is not admitted twice within `seconds`."""
+
+    def __init__(self, seconds=300):
+        self.seconds = seconds
+        self.last_plate = None
+        self.last_time = 0
+
+    def admit(self, plate, now):
+        if plate == self.last_plate and (now - self.last_time) <= self.seconds:
+            return False
+        self.last_plate, self.last_time = plate, now
+        return True
+
+
+
+class EntryDecider:
+    """
+    The entry lane's gate decision on each PlateRead, shared by car_entry.py
+    and replay_bench.py: a settled plate outside the EntryCooldown opens the
+    gate first, then `record_entry(plate, timestamp, crop)` logs it.
+    """
+
+    def __init__(self, gate, record_entry, cooldown_seconds=300):
+        self.gate = gate
+        self.record_entry = record_entry
+        self.cooldown = EntryCooldown(cooldown_seconds)
+
+    def decide(self, read):
+        """Acts on `read`; returns (plate, 'open'), or None if there is nothing to admit."""
+        plate = read.consensus
+        if not plate:
+            return None
+        now = time.time()
+        if not self.cooldown.admit(plate, now):
+            metrics.inc('decisions', lane='entry', action='cooldown')
+            print("[SKIPPED] Duplicate plate in cooldown window.")
+            return None
+        metrics.inc('decisions', lane='entry', action='open')
+        # Decision made: open first, disk and DB writes happen behind it
+        self.gate.open()  # Returns immediately; closes after the hold time
+        self.record_entry(plate, int(now), read.crop)
+        return plate, 'open'
+
+
+class ExitDecider:
+    """
+    The exit lane's gate decision on each PlateRead, shared by car_exit.py
+    and replay_bench.py.
+
+    A paid car, or a read one OCR confusion off a paid car, is marked exited
+    and let out, on a single read if need be. Any other settled plate raises
+    the alarm and is passed to `log_incident(plate)`; an alarm is only ever
+    raised on the plate that was actually read. `sessions` is a SessionCache
+    (is_paid, match, mark_exited) and `gate` a GateController (open, alarm).
+    """
+
+    def __init__(self, sessions, tracker, gate, log_incident):
+        self.sessions = sessions
+        self.tracker = tracker
+        self.gate = gate
+        self.log_incident = log_incident
+
+    def resolve(self, read):
+        """The plate to decide on for `read`, or None while the track is still voting."""
+        if read.consensus:
+            plate = read.consensus
+            with metrics.span('session_lookup'):
+                if not self.sessions.is_paid(plate):
+                    match = self.sessions.match(plate)
+                    if match and self.sessions.is_paid(match):
+                        plate = match
+            return plate
+        if read.candidate:
+            with metrics.span('session_lookup'):
+                match = self.sessions.match(read.candidate)
+                if match and self.sessions.is_paid(match):
+                    return self.tracker.settle(read.track, match)
+        return None
+
+    def decide(self, read):
+        """Acts on `read`; returns (plate, 'open' or 'alarm'), or None if there is no plate yet."""
+        plate = self.resolve(read)
+        if not plate:
+            return None
+        if plate != (read.consensus or read.candidate):
+            metrics.inc('plate_near_misses')
+            print(f"[MATCH] Read {read.consensus or read.candidate} resolved to parked car {plate}")
+        with metrics.span('session_lookup'):
+            paid = self.sessions.is_paid(plate)
+        action = 'open' if paid else 'alarm'
+        metrics.inc('decisions', lane='exit', action=action)
+        if paid:
+            print(f"[ACCESS GRANTED] Payment complete for {plate}")
+            self.sessions.mark_exited(plate)
+            self.gate.open()  # Detection keeps running while the barrier is up
+        else:
+            print(f"[ACCESS DENIED] Payment NOT complete for {plate}")
+            self.gate.alarm()  # Warning buzzer
+            self.log_incident(plate)
+        return plate, action
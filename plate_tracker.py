@@ -0,0 +1,166 @@
+from collections import Counter, deque
+
+
+def box_iou(a, b):
+    """Intersection over union of two (x1, y1, x2, y2) boxes."""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+def _centroid(box):
+    return (box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0
+
+
+class Track:
+    """One plate box followed across frames, with its own OCR vote buffer."""
+
+    def __init__(self, track_id, box, frame_index, window):
+        self.id = track_id
+        self.box = box
+        self.first_seen = frame_index
+        self.last_seen = frame_index
+        self.reads = deque(maxlen=window)
+        self.ocr_calls = 0
+        self.plate = None  # Set once the votes agree; OCR stops after that
+
+    @property
+    def needs_ocr(self):
+        return self.plate is None
+
+
+class PlateTracker:
+    """
+    Lightweight IoU tracker with a centroid fallback.
+
+    Every frame, call update() with the detector boxes; it returns the Track
+    each box belongs to (same order). Feed valid OCR reads back with
+    add_read(); once `votes_needed` reads in the track's window agree the
+    track is locked to that plate and needs_ocr turns False, so a car idling
+    at the barrier is read a handful of times instead of every frame.
+
+    Reads that carry a fused multi-variant confidence (PlatePipeline with
+    OCR variants) settle sooner: one at `lock_confidence` or above locks the
+    track at once, and two agreeing reads at `confirm_confidence` or above
+    are enough.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_shift=0.5, max_missed=15,
+                 votes_needed=3, window=5, lock_confidence=85, confirm_confidence=60):
+        self.iou_threshold = iou_threshold
+        # Centroid fallback: max shift as a fraction of the track's box width
+        self.max_centroid_shift = max_centroid_shift
+        self.max_missed = max_missed
+        self.votes_needed = votes_needed
+        self.window = window
+        self.lock_confidence = lock_confidence
+        self.confirm_confidence = confirm_confidence
+
+        self.tracks = {}
+        self.frame_index = 0
+        self._next_id = 1
+
+        self.boxes_seen = 0
+        self.ocr_calls = 0
+        self.ocr_skipped = 0
+
+    def update(self, boxes):
+        self.frame_index += 1
+        self.boxes_seen += len(boxes)
+
+        # Greedy matching on IoU, best pairs first
+        pairs = []
+        for box_idx, box in enumerate(boxes):
+            for track in self.tracks.values():
+                iou = box_iou(box, track.box)
+                if iou >= self.iou_threshold:
+                    pairs.append((iou, box_idx, track.id))
+        pairs.sort(reverse=True)
+
+        assigned = [None] * len(boxes)
+        used_tracks = set()
+        for _, box_idx, track_id in pairs:
+            if assigned[box_idx] is None and track_id not in used_tracks:
+                assigned[box_idx] = self.tracks[track_id]
+                used_tracks.add(track_id)
+
+        # Fast-moving plates can lose all overlap; try nearest centroid
+        for box_idx, box in enumerate(boxes):
+            if assigned[box_idx] is not None:
+                continue
+            cx, cy = _centroid(box)
+            best, best_dist = None, None
+            for track in self.tracks.values():
+                if track.id in used_tracks:
+                    continue
+                tx, ty = _centroid(track.box)
+                dist = ((cx - tx) ** 2 + (cy - ty) ** 2) ** 0.5
+                limit = self.max_centroid_shift * max(track.box[2] - track.box[0], 1)
+                if dist <= limit and (best_dist is None or dist < best_dist):
+                    best, best_dist = track, dist
+            if best is not None:
+                assigned[box_idx] = best
+                used_tracks.add(best.id)
+
+        for box_idx, box in enumerate(boxes):
+            track = assigned[box_idx]
+            if track is None:
+                track = Track(self._next_id, box, self.frame_index, self.window)
+                self.tracks[track.id] = track
+                self._next_id += 1
+            track.box = box
+            track.last_seen = self.frame_index
+            assigned[box_idx] = track
+            if track.needs_ocr:
+                self.ocr_calls += 1
+                track.ocr_calls += 1
+            else:
+                self.ocr_skipped += 1
+
+        # Drop tracks that have not been seen for a while (car has left)
+        expired = [tid for tid, t in self.tracks.items()
+                   if self.frame_index - t.last_seen > self.max_missed]
+        for tid in expired:
+            del self.tracks[tid]
+
+        return assigned
+
+    def add_read(self, track, plate, confidence=None):
+        """
+        Records one valid OCR read for a track, with its fused confidence if it
+        has one. Returns the consensus plate the first time the track reaches
+        it, otherwise None.
+        """
+        if track.plate is not None:
+            return None
+        track.reads.append((plate, confidence))
+        if confidence is not None and confidence >= self.lock_confidence:
+            track.plate = plate
+            return plate
+        winner, votes = Counter(read for read, _ in track.reads).most_common(1)[0]
+        confident = sum(1 for read, conf in track.reads
+                        if read == winner and conf is not None and conf >= self.confirm_confidence)
+        if votes >= self.votes_needed or confident >= 2:
+            track.plate = winner
+            return winner
+        return None
+
+    def settle(self, track, plate):
+        """Locks a track to a plate decided outside the vote (e.g. a known session)."""
+        if track.plate is not None:
+            return None
+        track.plate = plate
+        return plate
+
+    def stats(self):
+        return {
+            'active_tracks': len(self.tracks),
+            'boxes': self.boxes_seen,
+            'ocr_calls': self.ocr_calls,
+            'ocr_skipped': self.ocr_skipped,
+        }
@@ -1,31 +1,34 @@
-import serial
-import time
+import argparse
+import asyncio
 import serial.tools.list_ports
-import platform
-import sqlite3
-from datetime import datetime
+import time
 import math
+import weakref
+from serial_service import SerialTerminal
+import db
+import metrics
+
+RATE_PER_HOUR = db.RATE_PER_HOUR  # 500 RWF per hour
+
+# Timeouts for the READY/DONE handshake with a payment terminal (seconds)
+READY_TIMEOUT = 5
+DONE_TIMEOUT = 10
 
-DB_FILE = 'car_logs.db'
-RATE_PER_HOUR = 500  # New rate: 500 RWF per hour
-
-# Detect Arduino port automatically based on OS and port descriptions
-def detect_arduino_port():
-    ports = list(serial.tools.list_ports.comports())
-    system = platform.system()
-    for port in ports:
-        desc = port.description.lower()
-        device = port.device.lower()
-        if system == "Linux":
-            if "ttyusb" in device or "ttyacm" in device or "arduino" in desc:
-                return port.device
-        elif system == "Darwin":
-            if "usbmodem" in device or "usbserial" in device or "arduino" in desc:
-                return port.device
-        elif system == "Windows":
-            if "arduino" in desc or "usb-serial" in desc or "com" in device:
-                return port.device
-    return None
+# Prometheus scrape target (handshake and DB timings, payment outcomes)
+METRICS_PORT = 9103
+
+# Payment terminals are named explicitly: the gate Arduinos and any other USB
+# serial device on this host must never be read as card swipes.
+def find_terminal_ports(serial_numbers):
+    """Devices of the connected USB serial adapters whose serial number is in `serial_numbers`."""
+    wanted = set(serial_numbers)
+    return [port.device for port in serial.tools.list_ports.comports()
+            if port.serial_number in wanted]
+
+def list_serial_ports():
+    for port in serial.tools.list_ports.comports():
+        ids = f"{port.vid:04x}:{port.pid:04x}" if port.vid is not None else "-"
+        print(f"[PORTS] {port.device}  {ids}  serial={port.serial_number}  {port.description}")
 
 def parse_arduino_data(line):
     try:
@@ -45,102 +48,119 @@ def parse_arduino_data(line):
         print(f"[ERROR] Value error in parsing: {e}")
         return None, None
 
-def process_payment(plate, balance, ser, cursor, conn):
+# Serialises payments per plate so two terminals cannot charge the same session.
+# Weak values: a plate's lock goes away once no payment holds or waits on it.
+_plate_locks = weakref.WeakValueDictionary()
+
+async def process_payment(plate, balance, terminal):
+    lock = _plate_locks.get(plate)
+    if lock is None:
+        lock = _plate_locks[plate] = asyncio.Lock()
+    async with lock:
+        try:
+            with metrics.span('payment'):
+                await _charge(plate, balance, terminal)
+        except Exception as e:
+            metrics.inc('payments', result='error')
+            print(f"[ERROR] Payment processing failed: {e}")
+
+async def _charge(plate, balance, terminal):
+    """One payment attempt: look up the open session, run the READY/DONE handshake, mark it paid."""
+    with metrics.span('db_lookup'):
+        row = await asyncio.to_thread(db.find_unpaid_entry, plate)
+    if not row:
+        metrics.inc('payments', result='not_found')
+        print("[PAYMENT] Plate not found or already paid.")
+        return
+
+    record_id, payment_status, entry_time = row
+    exit_time = int(time.time())
+    time_spent_seconds = exit_time - entry_time
+    hours_spent = math.ceil(time_spent_seconds / 3600)
+    amount_due = hours_spent * RATE_PER_HOUR
+
+    if balance < amount_due:
+        metrics.inc('payments', result='insufficient')
+        print("[PAYMENT] Insufficient balance")
+        terminal.write(b'I\n')  # Notify Arduino
+        return
+
+    new_balance = balance - amount_due
+
+    print(f"[WAIT] Waiting for Arduino READY on {terminal.port}...")
     try:
-        cursor.execute(
-            "SELECT id, payment_status, entry_time FROM car_entries WHERE plate = ? AND payment_status = 0 ORDER BY entry_time ASC",
-            (plate,)
-        )
-        row = cursor.fetchone()
-        if not row:
-            print("[PAYMENT] Plate not found or already paid.")
-            return
-
-        record_id, payment_status, entry_time_str = row
-        entry_time = datetime.strptime(entry_time_str, '%Y-%m-%d %H:%M:%S')
-        exit_time = datetime.now()
-        time_spent_seconds = (exit_time - entry_time).total_seconds()
-        hours_spent = math.ceil(time_spent_seconds / 3600)
-        amount_due = hours_spent * RATE_PER_HOUR
-
-        if balance < amount_due:
-            print("[PAYMENT] Insufficient balance")
-            ser.write(b'I\n')  # Notify Arduino
-            return
-        else:
-            new_balance = balance - amount_due
-
-            print("[WAIT] Waiting for Arduino READY...")
-            start_time = time.time()
-            while True:
-                if ser.in_waiting:
-                    arduino_response = ser.readline().decode().strip()
-                    print(f"[ARDUINO] {arduino_response}")
-                    if arduino_response == "READY":
-                        break
-                if time.time() - start_time > 5:
-                    print("[ERROR] Timeout waiting for Arduino READY")
-                    return
-
-            ser.write(f"{new_balance}\r\n".encode())
-            print(f"[PAYMENT] Sent new balance {new_balance}")
-
-            start_time = time.time()
-            print("[WAIT] Waiting for Arduino confirmation...")
-            while True:
-                if ser.in_waiting:
-                    confirm = ser.readline().decode().strip()
-                    print(f"[ARDUINO] {confirm}")
-                    if "DONE" in confirm:
-                        print("[ARDUINO] Payment confirmed")
-                        cursor.execute('''
-                            UPDATE car_entries
-                            SET payment_status = 1,
-                                exit_time = ?
-                            WHERE id = ?
-                        ''', (exit_time.strftime('%Y-%m-%d %H:%M:%S'), record_id))
-                        conn.commit()
-                        break
-                if time.time() - start_time > 10:
-                    print("[ERROR] Timeout waiting for confirmation")
-                    break
-                time.sleep(0.1)
+        with metrics.span('serial_ready'):
+            await terminal.expect("READY", READY_TIMEOUT)
+    except asyncio.TimeoutError:
+        metrics.inc('payments', result='ready_timeout')
+        print("[ERROR] Timeout waiting for Arduino READY")
+        return
 
-    except Exception as e:
-        print(f"[ERROR] Payment processing failed: {e}")
+    terminal.write(f"{new_balance}\r\n")
+    print(f"[PAYMENT] Sent new balance {new_balance}")
 
-def main():
-    port = detect_arduino_port()
-    if not port:
-        print("[ERROR] Arduino not found")
+    print("[WAIT] Waiting for Arduino confirmation...")
+    try:
+        with metrics.span('serial_done'):
+            await terminal.expect("DONE", DONE_TIMEOUT, exact=False)
+    except asyncio.TimeoutError:
+        metrics.inc('payments', result='done_timeout')
+        print("[ERROR] Timeout waiting for confirmation")
         return
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    print("[ARDUINO] Payment confirmed")
+    with metrics.span('db_mark_paid'):
+        await asyncio.to_thread(db.mark_paid, record_id, exit_time, amount_due)
+    metrics.inc('payments', result='paid')
 
+async def serve_terminal(port):
+    """Reads card swipes from one payment terminal until cancelled or disconnected."""
+    terminal = SerialTerminal(port)
     try:
-        ser = serial.Serial(port, 9600, timeout=1)
+        await terminal.open()
         print(f"[CONNECTED] Listening on {port}")
-        time.sleep(2)
-        ser.reset_input_buffer()
-
-        while True:
-            if ser.in_waiting:
-                line = ser.readline().decode().strip()
-                if line:
-                    print(f"[SERIAL] Received: {line}")
-                    plate, balance = parse_arduino_data(line)
-                    if plate and balance is not None:
-                        process_payment(plate, balance, ser, cursor, conn)
+        while terminal.is_open:
+            line = await terminal.readline()
+            print(f"[SERIAL {port}] Received: {line}")
+            plate, balance = parse_arduino_data(line)
+            if plate and balance is not None:
+                await process_payment(plate, balance, terminal)
+    except ConnectionError as e:
+        print(f"[DISCONNECTED] {e}")
+    except Exception as e:
+        print(f"[ERROR] {port}: {e}")
+    finally:
+        terminal.close()
+
+async def serve(ports):
+    try:
+        await asyncio.gather(*(serve_terminal(port) for port in ports))
+    finally:
+        db.close_all()
 
+def main():
+    parser = argparse.ArgumentParser(description="Card payments from the exit payment terminals")
+    parser.add_argument('--ports', nargs='+', default=[], metavar='DEVICE',
+                        help="serial devices of the payment terminals (e.g. /dev/ttyACM1)")
+    parser.add_argument('--serial-numbers', nargs='+', default=[], metavar='SERIAL',
+                        help="USB serial numbers of the payment terminals, found on any port")
+    parser.add_argument('--list-ports', action='store_true', help="list serial ports and exit")
+    args = parser.parse_args()
+
+    if args.list_ports:
+        list_serial_ports()
+        return
+    ports = list(dict.fromkeys(args.ports + find_terminal_ports(args.serial_numbers)))
+    if not ports:
+        print("[ERROR] No payment terminal: pass --ports or --serial-numbers (see --list-ports)")
+        return
+
+    metrics.start_http_server(METRICS_PORT)
+    metrics.install_profile_toggle()
+    try:
+        asyncio.run(serve(ports))
     except KeyboardInterrupt:
         print("[EXIT] Program terminated by user.")
-    except Exception as e:
-        print(f"[ERROR] {e}")
-    finally:
-        if 'ser' in locals() and ser.is_open:
-            ser.close()
-        conn.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,325 @@
+"""
+Offline replay of recorded footage through the gate pipelines.
+
+    python replay_bench.py run entry dataset/val/images --out results/entry.json
+    python replay_bench.py run exit exit_lane.mp4 --paid RAB123C RAC555B
+    python replay_bench.py compare results/before.json results/after.json
+
+Frames come from a video file or an image folder instead of the camera and
+go through the same PlatePipeline as car_entry.py / car_exit.py. The gate
+is a stand-in that only records commands, and the database is a throwaway
+SQLite file. Every frame is processed (nothing is dropped as with the live
+FrameGrabber), so FPS is the pipeline's own throughput.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import cv2
+
+import db
+import metrics
+from frame_grabber import CapturedFrame
+from motion_trigger import make_lane_trigger
+from plate_pipeline import PlatePipeline, EntryDecider, ExitDecider, adaptive_threshold, otsu_threshold, add_ocr_arguments
+from plate_tracker import PlateTracker
+from plate_index import PlateIndex
+from plate_detector import add_detector_arguments, detector_from_args
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Same per-lane settings as the live scripts
+LANES = {
+    'entry': {'preprocess': adaptive_threshold, 'cooldown': 300},
+    'exit': {'preprocess': otsu_threshold},
+}
+
+
+# ===== Stand-ins =====
+class ReplaySource:
+    """Yields CapturedFrames from a video file or a folder of images, in order."""
+
+    def __init__(self, path, limit=None):
+        self.path = path
+        self.limit = limit
+        self.frames_read = 0
+
+    def _images(self):
+        if os.path.isdir(self.path):
+            names = sorted(name for name in os.listdir(self.path)
+                           if name.lower().endswith(IMAGE_EXTENSIONS))
+            for name in names:
+                image = cv2.imread(os.path.join(self.path, name))
+                if image is not None:
+                    yield image
+        else:
+            cap = cv2.VideoCapture(self.path)
+            try:
+                while True:
+                    ret, image = cap.read()
+                    if not ret:
+                        break
+                    yield image
+            finally:
+                cap.release()
+
+    def __iter__(self):
+        for image in self._images():
+            if self.limit is not None and self.frames_read >= self.limit:
+                break
+            self.frames_read += 1
+            yield CapturedFrame(image, self.frames_read, time.monotonic())
+
+    def stats(self):
+        return {'captured': self.frames_read, 'read': self.frames_read, 'dropped': 0}
+
+
+class RecordingGate:
+    """GateController stand-in: counts commands instead of driving a barrier."""
+
+    def __init__(self):
+        self.commands = []
+
+    def open(self):
+        self.commands.append('open')
+
+    def close(self):
+        self.commands.append('close')
+
+    def alarm(self):
+        self.commands.append('alarm')
+
+    def clear_alarm(self):
+        self.commands.append('clear_alarm')
+
+    def stop(self):
+        pass
+
+
+class AlwaysActive:
+    """Lane trigger stand-in for image folders, where frames are not a continuous scene."""
+
+    def update(self, frame):
+        return True
+
+    def stats(self):
+        return {}
+
+    def stop(self):
+        pass
+
+
+class ReplaySessions:
+    """SessionCache stand-in: plates listed as paid are let out, everyone else is not."""
+
+    def __init__(self, paid_plates):
+        self.paid = set(paid_plates)
+        self.index = PlateIndex()
+        for plate in self.paid:
+            self.index.add(plate)
+
+    def match(self, plate):
+        return self.index.match(plate)
+
+    def is_paid(self, plate):
+        return plate in self.paid
+
+    def mark_exited(self, plate):
+        self.paid.discard(plate)
+        self.index.remove(plate)
+
+
+def record_entry(plate, timestamp, crop):
+    db.log_entry(plate, timestamp)
+
+
+def log_unauthorized_exit(plate):
+    db.log_incident(plate, int(time.time()), 'Unauthorized Exit')
+
+
+# ===== Metrics =====
+def summarize_latencies(latencies_ms):
+    values = sorted(latencies_ms)
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 2) if values else None,
+        'p50': metrics.percentile(values, 50),
+        'p95': metrics.percentile(values, 95),
+        'p99': metrics.percentile(values, 99),
+        'max': values[-1] if values else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ===== Replay =====
+def replay(lane, source, detector, ocr, lane_trigger, paid_plates=(), variants=None):
+    """
+    Runs one lane's decision loop over `source` and returns the metrics dict.
+    Decisions are made by the live lanes' own EntryDecider / ExitDecider
+    (plate_pipeline.py), so only the gate and the session source differ.
+    """
+    settings = LANES[lane]
+    tracker = PlateTracker()
+    pipeline = PlatePipeline(detector, ocr, tracker, settings['preprocess'], variants)
+    gate = RecordingGate()
+    if lane == 'entry':
+        decider = EntryDecider(gate, record_entry, settings['cooldown'])
+    else:
+        decider = ExitDecider(ReplaySessions(paid_plates), tracker, gate, log_unauthorized_exit)
+
+    decisions = []
+    frame_ms, active_frames = [], 0
+    started = time.monotonic()
+
+    for captured in source:
+        if lane_trigger.update(captured.image):
+            active_frames += 1
+            _, reads = pipeline.process(captured.image)
+            for read in reads:
+                decision = decider.decide(read)
+                if not decision:
+                    continue
+                plate, action = decision
+                decisions.append({
+                    'frame': captured.seq,
+                    'plate': plate,
+                    'action': action,
+                    'ms_from_start': round((time.monotonic() - started) * 1000, 1),
+                })
+        # Per-frame latency: from the frame being handed over to its decisions being made
+        frame_ms.append(round((time.monotonic() - captured.captured_at) * 1000, 2))
+
+    elapsed = time.monotonic() - started
+    pipeline.close()
+    frames = len(frame_ms)
+    return {
+        'lane': lane,
+        'frames': frames,
+        'active_frames': active_frames,
+        'elapsed_seconds': round(elapsed, 3),
+        'fps': round(frames / elapsed, 2) if elapsed > 0 else None,
+        'latency_ms': summarize_latencies(frame_ms),
+        'decisions': len(decisions),
+        'decisions_per_minute': round(len(decisions) / elapsed * 60, 2) if elapsed > 0 else None,
+        'gate_commands': {cmd: gate.commands.count(cmd) for cmd in set(gate.commands)},
+        'tracker': tracker.stats(),
+        'stages_ms': metrics.REGISTRY.summary(),  # Per-stage p50/p95/p99 (see metrics.py)
+        'lane_trigger': lane_trigger.stats(),
+        'decision_log': decisions,
+    }
+
+
+def run(args):
+    from ocr_engine import get_engine, close_engine
+
+    lane_trigger = make_lane_trigger('motion') if args.trigger == 'motion' else AlwaysActive()
+
+    # Decisions are written to a scratch database, never to car_logs.db
+    scratch = tempfile.mkdtemp(prefix='replay_')
+    db.DB_FILE = os.path.join(scratch, 'replay.db')
+
+    detector = detector_from_args(args)
+    ocr = get_engine(pool_size=max(2, len(args.ocr_variants or ())))
+    source = ReplaySource(args.source, limit=args.limit)
+    try:
+        result = replay(args.lane, source, detector, ocr, lane_trigger, args.paid, args.ocr_variants)
+    finally:
+        lane_trigger.stop()
+        close_engine()
+        db.close_all()
+
+    report = {
+        'source': args.source,
+        'detector': {'backend': args.backend, 'weights': args.weights, 'imgsz': detector.imgsz,
+                     'conf': args.conf, 'threads': args.threads, 'roi': args.roi,
+                     'detect_width': args.detect_width, 'server': args.server},
+        'ocr_variants': args.ocr_variants,
+        'trigger': args.trigger,
+        'revision': git_revision(),
+        'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        **result,
+    }
+    latency = report['latency_ms']
+    print(f"[REPLAY] {report['frames']} frames in {report['elapsed_seconds']}s "
+          f"({report['fps']} FPS), latency p50/p95/p99 = "
+          f"{latency['p50']}/{latency['p95']}/{latency['p99']} ms, "
+          f"{report['decisions']} decisions ({report['decisions_per_minute']}/min)")
+    print(f"[REPLAY] Scratch database: {db.DB_FILE}")
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"[REPLAY] Results saved to {args.out}")
+    return report
+
+
+def compare(before_path, after_path):
+    """Prints the headline numbers of two saved runs side by side."""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    rows = [
+        ('fps', before['fps'], after['fps']),
+        ('latency p50 (ms)', before['latency_ms']['p50'], after['latency_ms']['p50']),
+        ('latency p95 (ms)', before['latency_ms']['p95'], after['latency_ms']['p95']),
+        ('latency p99 (ms)', before['latency_ms']['p99'], after['latency_ms']['p99']),
+        ('decisions', before['decisions'], after['decisions']),
+        ('decisions/min', before['decisions_per_minute'], after['decisions_per_minute']),
+    ]
+    print(f"{'':<18} {before.get('revision') or 'before':>12} {after.get('revision') or 'after':>12} {'change':>9}")
+    for name, a, b in rows:
+        change = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else '-'
+        print(f"{name:<18} {a if a is not None else '-':>12} {b if b is not None else '-':>12} {change:>9}")
+
+    plates_before = [d['plate'] for d in before['decision_log']]
+    plates_after = [d['plate'] for d in after['decision_log']]
+    if plates_before != plates_after:
+        print("[COMPARE] Decision sequences differ:")
+        print(f"  before: {plates_before}")
+        print(f"  after:  {plates_after}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded footage through a gate pipeline")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help="replay a video file or image folder")
+    run_parser.add_argument('lane', choices=sorted(LANES))
+    run_parser.add_argument('source', help="video file or folder of images")
+    add_detector_arguments(run_parser)
+    add_ocr_arguments(run_parser)
+    run_parser.add_argument('--trigger', choices=('always', 'motion'), default='always',
+                            help="'motion' gates detection like the live lane (for video)")
+    run_parser.add_argument('--paid', nargs='*', default=[], metavar='PLATE',
+                            help="exit lane: plates to treat as paid")
+    run_parser.add_argument('--limit', type=int, help="stop after this many frames")
+    run_parser.add_argument('--out', help="write the results as JSON to this file")
+
+    compare_parser = sub.add_parser('compare', help="compare two saved results files")
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        compare(args.before, args.after)
+
+
+if __name__ == '__main__':
+    main()
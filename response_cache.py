@@ -0,0 +1,151 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, make_response, request
+
+import db
+
+CACHE_TTL_SECONDS = 30
+CACHE_MAX_ENTRIES = 256
+CACHE_MAX_BODY_BYTES = 1 << 20  # Larger responses are served but not kept
+
+
+class ResponseCache:
+    """
+    Small in-process cache of JSON response bodies keyed by request URL.
+
+    Every entry is tagged with the change-log sequence number it was built
+    at; an entry is only served while that number is still current and it
+    is younger than the TTL, so any write invalidates it.
+    """
+
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (version, created_at, body)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, body):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = ResponseCache()
+_marker_lock = threading.Lock()
+_marker = {'seq': None, 'changed_at': None}
+
+
+def data_marker():
+    """
+    Returns (seq, changed_at): the newest change-log sequence number and the
+    wall-clock time this process first saw it (used for Last-Modified).
+    """
+    seq = db.current_change_seq()
+    with _marker_lock:
+        if seq != _marker['seq']:
+            _marker['seq'] = seq
+            _marker['changed_at'] = int(time.time())
+        return seq, _marker['changed_at']
+
+
+def _vary_marker(state, value):
+    """Wall-clock time this process first saw `value` of a route's vary state."""
+    with _marker_lock:
+        if value != state['value']:
+            state['value'] = value
+            state['changed_at'] = int(time.time())
+        return state['changed_at']
+
+
+def _not_modified(etag, changed_at):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    return since is not None and changed_at <= since.timestamp()
+
+
+def _tee(chunks, key, version):
+    """Passes a streamed body through while keeping a copy for the cache."""
+    parts, size = [], 0
+    for chunk in chunks:
+        yield chunk
+        if parts is not None:
+            data = chunk.encode() if isinstance(chunk, str) else chunk
+            parts.append(data)
+            size += len(data)
+            if size > CACHE_MAX_BODY_BYTES:
+                parts = None
+    if parts is not None:
+        _cache.put(key, version, b''.join(parts))
+
+
+def conditional(vary=None):
+    """
+    Decorator for JSON GET endpoints: answers 304 Not Modified when the
+    client's ETag / Last-Modified is still current, and otherwise serves a
+    cached body when nothing has been written since it was built. Neither
+    path runs the view's query. `vary` may return extra state the response
+    depends on besides the data (e.g. the current hour for time windows);
+    it is part of the ETag and moves Last-Modified forward when it changes.
+    """
+    def decorator(view):
+        varied = {'value': None, 'changed_at': 0}
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            seq, changed_at = data_marker()
+            version = str(seq)
+            if vary:
+                value = vary()
+                version = f"{seq}-{value}"
+                changed_at = max(changed_at, _vary_marker(varied, value))
+
+            if _not_modified(version, changed_at):
+                response = Response(status=304)
+            else:
+                key = request.full_path
+                body = _cache.get(key, version)
+                if body is not None:
+                    response = Response(body, mimetype='application/json')
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code == 200:
+                        if response.is_streamed:
+                            response.response = _tee(response.response, key, version)
+                        else:
+                            body = response.get_data()
+                            if len(body) <= CACHE_MAX_BODY_BYTES:
+                                _cache.put(key, version, body)
+
+            response.set_etag(version)
+            response.last_modified = changed_at
+            # Browsers may keep the response but must revalidate every time
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_stats():
+    return {'hits': _cache.hits, 'misses': _cache.misses}
@@ -0,0 +1,107 @@
+import asyncio
+
+import serial_asyncio
+
+
+# Queued after the last line when the port goes away, so pending reads wake up
+CONNECTION_LOST = None
+
+
+class SerialLineProtocol(asyncio.Protocol):
+    """Splits the incoming byte stream into stripped text lines."""
+
+    def __init__(self, name):
+        self.name = name
+        self.lines = asyncio.Queue()
+        self.closed = asyncio.Event()
+        self._buffer = bytearray()
+
+    def data_received(self, data):
+        self._buffer.extend(data)
+        while True:
+            newline = self._buffer.find(b'\n')
+            if newline < 0:
+                break
+            raw = bytes(self._buffer[:newline])
+            del self._buffer[:newline + 1]
+            line = raw.decode(errors='ignore').strip()
+            if line:
+                self.lines.put_nowait(line)
+
+    def connection_lost(self, exc):
+        if exc:
+            print(f"[ERROR] {self.name}: connection lost: {exc}")
+        self.closed.set()
+        self.lines.put_nowait(CONNECTION_LOST)
+
+
+class SerialTerminal:
+    """
+    One Arduino terminal on an asyncio event loop.
+
+    Reads are event driven (no polling of in_waiting), and every wait takes a
+    timeout and can be cancelled, so one process can serve several
+    terminals at once without blocking any of them.
+    """
+
+    def __init__(self, port, baudrate=9600):
+        self.port = port
+        self.baudrate = baudrate
+        self._transport = None
+        self._protocol = None
+
+    async def open(self, settle_seconds=2):
+        loop = asyncio.get_running_loop()
+        self._transport, self._protocol = await serial_asyncio.create_serial_connection(
+            loop, lambda: SerialLineProtocol(self.port), self.port, baudrate=self.baudrate)
+        # Opening the port resets most Arduinos; drop the boot chatter
+        await asyncio.sleep(settle_seconds)
+        self._transport.serial.reset_input_buffer()
+        self.drain()
+        return self
+
+    @property
+    def is_open(self):
+        return self._protocol is not None and not self._protocol.closed.is_set()
+
+    def drain(self):
+        """Discards any lines that have been received but not read."""
+        while not self._protocol.lines.empty():
+            self._protocol.lines.get_nowait()
+
+    async def readline(self, timeout=None):
+        """
+        Returns the next line. Raises asyncio.TimeoutError, or ConnectionError
+        once the port is gone (unplugged, terminal reset).
+        """
+        line = await asyncio.wait_for(self._protocol.lines.get(), timeout)
+        if line is CONNECTION_LOST:
+            self._protocol.lines.put_nowait(CONNECTION_LOST)  # Every later read fails too
+            raise ConnectionError(f"{self.port}: connection lost")
+        return line
+
+    async def expect(self, token, timeout, exact=True):
+        """
+        Waits until a line equal to `token` (or containing it, when exact is
+        False) arrives and returns it. Other lines are logged and skipped.
+        Raises asyncio.TimeoutError if it does not arrive within `timeout`.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"{self.port}: no {token!r} within {timeout}s")
+            line = await self.readline(remaining)
+            print(f"[ARDUINO {self.port}] {line}")
+            if (line == token) if exact else (token in line):
+                return line
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self._transport.write(data)
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
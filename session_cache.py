@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import OrderedDict
+
+import db
+from plate_index import PlateIndex
+
+OPEN = 'open'
+PAID = 'paid'
+# A paid session is still a plausible near-miss match for this long after payment
+PAID_EXIT_WINDOW = 2 * 3600
+
+
+class SessionCache:
+    """
+    In-process view of parking sessions keyed by plate, for O(1) exit checks.
+
+    Holds the latest session per plate (open or paid). A background thread
+    follows the database change log: PRAGMA data_version tells it cheaply
+    whether anything was committed, and only the changed car_entries rows are
+    re-read. Size is bounded with LRU eviction, and plates that have left
+    through the exit gate are evicted with mark_exited().
+
+    The cached plates are mirrored in a PlateIndex, so match() can resolve a
+    read that is one OCR confusion away from a parked car.
+    """
+
+    def __init__(self, max_size=5000, poll_interval=0.5):
+        self.max_size = max_size
+        self.poll_interval = poll_interval
+        self._sessions = OrderedDict()  # plate -> (session_id, state, paid_at)
+        self._index = PlateIndex()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._last_seq = 0
+        self._data_version = None
+        self._stopped = False
+        self._thread = None
+
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.near_misses = 0
+
+    def start(self):
+        self._conn = db.open_connection()
+        self._reload()
+        self._thread = threading.Thread(target=self._run, name='session-cache', daemon=True)
+        self._thread.start()
+        return self
+
+    # ===== Lookups =====
+    def is_paid(self, plate):
+        """
+        True if the plate's latest session is paid. Served from memory; only a
+        plate the cache has never seen costs one indexed DB lookup.
+        """
+        with self._lock:
+            entry = self._sessions.get(plate)
+            if entry is not None:
+                self._sessions.move_to_end(plate)
+                self.hits += 1
+                return entry[1] == PAID
+        self.misses += 1
+        row = db.latest_session(plate)
+        if row is None:
+            return False
+        self._apply(row)
+        return row['payment_status'] == 1
+
+    def match(self, plate):
+        """
+        The plate of the cached session an OCR read belongs to: the read itself
+        if it has a session, else the one open or recently paid session it is
+        a near-miss of (plate_index). None if there is no plausible session.
+        Answered from memory only, so it is cheap for every noise read; plates
+        the cache does not hold are still found by is_paid().
+        """
+        with self._lock:
+            if plate in self._sessions:
+                return plate
+
+        now = time.time()
+
+        def plausible(candidate):
+            entry = self._sessions.get(candidate)
+            return entry is not None and (
+                entry[1] == OPEN or now - (entry[2] or 0) <= PAID_EXIT_WINDOW)
+
+        with self._lock:
+            resolved = self._index.match(plate, accept=plausible)
+        if resolved is not None:
+            self.near_misses += 1
+        return resolved
+
+    def mark_exited(self, plate):
+        """Drops a plate once its car has left; its session is finished."""
+        with self._lock:
+            self._sessions.pop(plate, None)
+            self._index.remove(plate)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        return {'sessions': len(self), 'hits': self.hits, 'misses': self.misses,
+                'near_misses': self.near_misses, 'reloads': self.reloads}
+
+    # ===== Change feed =====
+    def _apply(self, row):
+        state = PAID if row['payment_status'] == 1 else OPEN
+        with self._lock:
+            current = self._sessions.get(row['plate'])
+            # An older session must not overwrite a newer one for the same plate
+            if current is not None and current[0] > row['id']:
+                return
+            self._sessions[row['plate']] = (row['id'], state, row['exit_time'] if state == PAID else None)
+            self._sessions.move_to_end(row['plate'])
+            self._index.add(row['plate'])
+            while len(self._sessions) > self.max_size:
+                evicted, _ = self._sessions.popitem(last=False)
+                self._index.remove(evicted)
+
+    def _reload(self):
+        _, newest = db.change_seq_bounds(self._conn)
+        rows = db.fetch_recent_sessions(self._conn, self.max_size)
+        with self._lock:
+            self._sessions.clear()
+            self._index.clear()
+        for row in reversed(rows):  # Oldest first so LRU order matches recency
+            self._apply(row)
+        self._last_seq = newest
+        self._data_version = db.data_version(self._conn)
+        self.reloads += 1
+
+    def poll(self):
+        """Applies committed changes since the last poll. Cheap when idle."""
+        version = db.data_version(self._conn)
+        if version == self._data_version:
+            return
+        self._data_version = version
+
+        oldest, _ = db.change_seq_bounds(self._conn)
+        if self._last_seq and oldest > self._last_seq + 1:
+            # Fell behind the pruned feed; start over from the table
+            self._reload()
+            return
+
+        while True:
+            changes = db.fetch_changes(self._conn, self._last_seq)
+            if not changes:
+                break
+            ids = {c['row_id'] for c in changes if c['table_name'] == 'car_entries'}
+            for row in db.fetch_sessions_by_id(self._conn, ids):
+                self._apply(row)
+            self._last_seq = changes[-1]['seq']
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"[ERROR] Session cache poll failed: {e}")
+            time.sleep(self.poll_interval)
+
+    def stop(self):
+        self._stopped = True
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self._conn is not None:
+            self._conn.close()
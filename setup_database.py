@@ -1,49 +1,32 @@
 import sqlite3
-import os
 
-DB_FILE = 'car_logs.db'
+import db
+import migrations
 
-def setup_unified_car_logs_table():
+
+def setup_database():
     """
-    Ensures the 'car_logs' table exists with the unified schema:
-    ID, Plate, Paid, Entry Time, Exit Time, Amount Paid.
-    This replaces the 'car_entries' table.
+    Creates car_logs.db or brings an existing one up to the current schema.
+
+    The schema is versioned in migrations.py: car_entries (epoch-second
+    entry/exit times and the amount paid), incidents, plate_images, the
+    hourly statistics buckets and the change log. Rows from the old
+    'car_logs' table are folded into car_entries by the migration.
+    Every service runs the same migrations when it opens the database, so
+    running this script is optional.
     """
     conn = None
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-
-        # Optional: If you had data in 'car_entries' and want to migrate,
-        # you'd do it here. For simplicity, we'll assume a fresh start
-        # or that data loss from 'car_entries' is acceptable.
-        # If 'car_entries' exists and 'car_logs' doesn't, you might
-        # want to copy data over before dropping.
-
-        # Create car_logs table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS car_logs (
-                ID INTEGER PRIMARY KEY AUTOINCREMENT,
-                Plate TEXT NOT NULL,
-                Paid INTEGER NOT NULL DEFAULT 0,
-                `Entry Time` TEXT NOT NULL,
-                `Exit Time` TEXT,
-                `Amount Paid` INTEGER
-            )
-        ''')
-        conn.commit()
-        print(f"Database '{DB_FILE}' and table 'car_logs' ensured to exist with unified schema.")
-
-        # If you previously had 'car_entries' and want to remove it:
-        # cursor.execute("DROP TABLE IF EXISTS car_entries")
-        # conn.commit()
-        # print("Old 'car_entries' table dropped (if it existed).")
-
+        conn = db.open_connection()
+        version = db.schema_version(conn)
+        print(f"Database '{db.DB_FILE}' is at schema version {version} "
+              f"(latest {migrations.LATEST_VERSION}).")
     except sqlite3.Error as e:
         print(f"[ERROR] Database setup failed: {e}")
     finally:
         if conn:
             conn.close()
 
+
 if __name__ == "__main__":
-    setup_unified_car_logs_table()
+    setup_database()
@@ -31,27 +31,32 @@ document.addEventListener("DOMContentLoaded", () => {
     link.addEventListener("click", handleNavigation);
   });
 
-  // Function to fetch and display vehicle logs
-  async function fetchAndDisplayLogs() {
-    try {
-      const response = await fetch("/api/logs");
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
-      const logs = await response.json();
+  const logsFilterForm = document.getElementById("logs-filters");
+  const alertsFilterForm = document.getElementById("alerts-filters");
+  const logsMoreButton = document.getElementById("logs-load-more");
+  const alertsMoreButton = document.getElementById("alerts-load-more");
 
-      logsTableBody.innerHTML = ""; // Clear previous logs
-      if (logs.length === 0) {
-        logsTableBody.innerHTML =
-          '<tr><td colspan="5" class="px-6 py-4 text-center text-gray-500">No vehicle activity logs available.</td></tr>';
-        return;
-      }
+  // Pagination state: the cursor for the next page and how many pages are shown,
+  // plus live updates held back while the first page is loading
+  const logsState = { cursor: null, pages: 0, loading: 0, pending: [] };
+  const alertsState = { cursor: null, pages: 0, loading: 0, pending: [] };
+
+  // Builds the query string for a page from a filter form and a cursor
+  function buildQuery(form, cursor) {
+    const params = new URLSearchParams();
+    new FormData(form).forEach((value, key) => {
+      if (value) params.append(key, value);
+    });
+    if (cursor) params.append("cursor", cursor);
+    return params.toString();
+  }
 
-      logs.forEach((log) => {
-        const row = document.createElement("tr");
-        row.className = "table-row"; // Add hover effect
+  function renderLogRow(log) {
+    const row = document.createElement("tr");
+    row.className = "table-row"; // Add hover effect
+    row.dataset.id = log.id;
 
-        row.innerHTML = `
+    row.innerHTML = `
                     <td class="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">${
                       log.id
                     }</td>
@@ -72,36 +77,15 @@ document.addEventListener("DOMContentLoaded", () => {
                       log.exit_time || "N/A"
                     }</td>
                 `;
-        logsTableBody.appendChild(row);
-      });
-    } catch (error) {
-      console.error("Error fetching logs:", error);
-      logsTableBody.innerHTML =
-        '<tr><td colspan="5" class="px-6 py-4 text-center text-red-500">Failed to load logs.</td></tr>';
-    }
+    return row;
   }
 
-  // Function to fetch and display unauthorized exit alerts
-  async function fetchAndDisplayAlerts() {
-    try {
-      const response = await fetch("/api/alerts");
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
-      const alerts = await response.json();
-
-      alertsTableBody.innerHTML = ""; // Clear previous alerts
-      if (alerts.length === 0) {
-        alertsTableBody.innerHTML =
-          '<tr><td colspan="4" class="px-6 py-4 text-center text-gray-500">No incident alerts available.</td></tr>';
-        return;
-      }
-
-      alerts.forEach((alert) => {
-        const row = document.createElement("tr");
-        row.className = "alert-row"; // Apply red background for alerts
+  function renderAlertRow(alert) {
+    const row = document.createElement("tr");
+    row.className = "alert-row"; // Apply red background for alerts
+    row.dataset.id = alert.id;
 
-        row.innerHTML = `
+    row.innerHTML = `
                     <td class="px-6 py-4 whitespace-nowrap text-sm font-medium">${
                       alert.id
                     }</td>
@@ -115,20 +99,151 @@ document.addEventListener("DOMContentLoaded", () => {
                       alert.incident_type || "N/A"
                     }</td>
                 `;
-        alertsTableBody.appendChild(row);
-      });
+    return row;
+  }
+
+  // Fetches one page and either replaces the table (first page) or appends to it
+  async function loadPage(options) {
+    const { url, form, state, tbody, moreButton, renderRow, columns, emptyText, errorText, append } = options;
+    if (!append) state.loading += 1;
+    try {
+      const query = buildQuery(form, append ? state.cursor : null);
+      const response = await fetch(`${url}?${query}`);
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      const page = await response.json();
+
+      if (!append) {
+        tbody.innerHTML = ""; // Clear previous rows
+        state.pages = 0;
+      }
+      state.pages += 1;
+      state.cursor = page.next_cursor;
+      moreButton.classList.toggle("hidden", !page.next_cursor);
+
+      if (!append && page.items.length === 0) {
+        tbody.innerHTML = `<tr><td colspan="${columns}" class="px-6 py-4 text-center text-gray-500">${emptyText}</td></tr>`;
+        return;
+      }
+
+      const fragment = document.createDocumentFragment();
+      page.items.forEach((item) => fragment.appendChild(renderRow(item)));
+      tbody.appendChild(fragment);
     } catch (error) {
-      console.error("Error fetching alerts:", error);
-      alertsTableBody.innerHTML =
-        '<tr><td colspan="4" class="px-6 py-4 text-center text-red-500">Failed to load alerts.</td></tr>';
+      console.error(`Error fetching ${url}:`, error);
+      if (!append) {
+        tbody.innerHTML = `<tr><td colspan="${columns}" class="px-6 py-4 text-center text-red-500">${errorText}</td></tr>`;
+      }
+    } finally {
+      // Re-apply the live updates that arrived while the table was being replaced
+      if (!append && --state.loading === 0) {
+        const pending = state.pending;
+        state.pending = [];
+        pending.forEach((apply) => apply());
+      }
+    }
+  }
+
+  // Function to fetch and display vehicle logs
+  function fetchAndDisplayLogs(append = false) {
+    return loadPage({
+      url: "/api/logs",
+      form: logsFilterForm,
+      state: logsState,
+      tbody: logsTableBody,
+      moreButton: logsMoreButton,
+      renderRow: renderLogRow,
+      columns: 5,
+      emptyText: "No vehicle activity logs available.",
+      errorText: "Failed to load logs.",
+      append,
+    });
+  }
+
+  // Function to fetch and display unauthorized exit alerts
+  function fetchAndDisplayAlerts(append = false) {
+    return loadPage({
+      url: "/api/alerts",
+      form: alertsFilterForm,
+      state: alertsState,
+      tbody: alertsTableBody,
+      moreButton: alertsMoreButton,
+      renderRow: renderAlertRow,
+      columns: 4,
+      emptyText: "No incident alerts available.",
+      errorText: "Failed to load alerts.",
+      append,
+    });
+  }
+
+  logsFilterForm.addEventListener("submit", (e) => {
+    e.preventDefault();
+    fetchAndDisplayLogs();
+  });
+  alertsFilterForm.addEventListener("submit", (e) => {
+    e.preventDefault();
+    fetchAndDisplayAlerts();
+  });
+  logsMoreButton.addEventListener("click", () => fetchAndDisplayLogs(true));
+  alertsMoreButton.addEventListener("click", () => fetchAndDisplayAlerts(true));
+
+  // True when a filter form has any value set
+  function hasFilters(form) {
+    return Array.from(new FormData(form).values()).some((value) => value);
+  }
+
+  // Inserts a new row at the top, or replaces the row with the same id
+  function applyRow(tbody, item, renderRow, prependIfMissing) {
+    const row = renderRow(item);
+    const existing = tbody.querySelector(`tr[data-id="${item.id}"]`);
+    if (existing) {
+      existing.replaceWith(row);
+    } else if (prependIfMissing) {
+      const placeholder = tbody.querySelector("tr:not([data-id])");
+      if (placeholder) placeholder.remove(); // "No ... available" row
+      tbody.prepend(row);
+    }
+  }
+
+  // Applies a live update now, or after the first page that is loading has
+  // replaced the table (which would otherwise wipe it)
+  function patchTable(state, apply) {
+    if (state.loading) {
+      state.pending.push(apply);
+    } else {
+      apply();
     }
   }
 
-  // Initial fetch and display
+  // Live updates: the server pushes only what changed, and the tables are
+  // patched in place instead of being re-fetched
+  function connectStream() {
+    const source = new EventSource("/api/stream");
+
+    source.addEventListener("entry", (e) => {
+      const item = JSON.parse(e.data);
+      patchTable(logsState, () => applyRow(logsTableBody, item, renderLogRow, !hasFilters(logsFilterForm)));
+    });
+    source.addEventListener("payment", (e) => {
+      const item = JSON.parse(e.data);
+      patchTable(logsState, () => applyRow(logsTableBody, item, renderLogRow, false));
+    });
+    source.addEventListener("incident", (e) => {
+      const item = JSON.parse(e.data);
+      patchTable(alertsState, () => applyRow(alertsTableBody, item, renderAlertRow, !hasFilters(alertsFilterForm)));
+    });
+    // The server could not replay what we missed; start over from page one
+    source.addEventListener("reset", () => {
+      fetchAndDisplayLogs();
+      fetchAndDisplayAlerts();
+    });
+  }
+
+  // Subscribe before the first fetch so no change falls between the two;
+  // updates that arrive during the fetch are applied once the page is shown,
+  // and rows delivered twice just replace themselves
+  connectStream();
   fetchAndDisplayLogs();
   fetchAndDisplayAlerts();
-
-  // Refresh data every 5 seconds
-  setInterval(fetchAndDisplayLogs, 5000);
-  setInterval(fetchAndDisplayAlerts, 5000);
 });
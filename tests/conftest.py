@@ -0,0 +1,12 @@
+import pytest
+
+import db
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """A fresh, migrated car_logs database in tmp_path, behind its own pool."""
+    monkeypatch.setattr(db, 'DB_FILE', str(tmp_path / 'car_logs.db'))
+    monkeypatch.setattr(db, '_pool', db.ConnectionPool())
+    yield db
+    db.close_all()
@@ -0,0 +1,87 @@
+import queue
+
+import pytest
+
+from change_feed import RESET, ChangeBroadcaster
+
+BASE = 1_700_000_000
+
+
+@pytest.fixture
+def broadcaster(database):
+    feed = ChangeBroadcaster()
+    feed._run = lambda: None  # Polled by the tests instead of the background thread
+    feed.start()
+    yield feed
+    feed._conn.close()
+
+
+def test_subscribers_get_entries_payments_and_incidents(database, broadcaster):
+    events = broadcaster.subscribe()
+    entry_id = database.log_entry('RAB123C', BASE)
+    database.mark_paid(entry_id, BASE + 3600, 500)
+    database.log_incident('RAC999Z', BASE + 10, 'unpaid_exit')
+    broadcaster.poll()
+
+    received = [events.get_nowait() for _ in range(3)]
+    assert [event.kind for event in received] == ['entry', 'payment', 'incident']
+    assert received[1].row['payment_status'] == 1
+    assert [event.seq for event in received] == sorted(event.seq for event in received)
+
+
+def test_replay_returns_events_between_two_sequence_numbers(database, broadcaster):
+    first = database.log_entry('RAB123C', BASE)
+    database.log_entry('RAB124C', BASE + 1)
+    database.mark_paid(first, BASE + 60, 500)
+
+    events = broadcaster.replay(0, 2)
+    assert [(event.seq, event.kind, event.row['plate']) for event in events] == [
+        (1, 'entry', 'RAB123C'), (2, 'entry', 'RAB124C')]
+
+
+def test_replay_gives_up_once_the_log_was_pruned(database, monkeypatch):
+    monkeypatch.setattr(database, 'CHANGE_LOG_KEEP', 2)
+    for n in range(5):
+        database.log_entry(f'RAB12{n}C', BASE + n)
+    assert ChangeBroadcaster().replay(0, 5) is None
+    assert [event.seq for event in ChangeBroadcaster().replay(3, 5)] == [4, 5]
+
+
+def test_slow_subscriber_is_reset_instead_of_blocking():
+    feed = ChangeBroadcaster(queue_size=2)
+    slow = feed.subscribe()
+    feed._publish([object(), object(), object()])
+    assert slow.get_nowait() is RESET
+    with pytest.raises(queue.Empty):
+        slow.get_nowait()
+
+
+def stream_client(broadcaster, monkeypatch):
+    pytest.importorskip('flask')
+    import dashboard_app
+
+    monkeypatch.setattr(dashboard_app, '_broadcaster', broadcaster)
+    return dashboard_app.app.test_client()
+
+
+def test_stream_rejects_a_bad_last_event_id_without_subscribing(database, broadcaster, monkeypatch):
+    client = stream_client(broadcaster, monkeypatch)
+    for bad in ('abc', '-1', '1.5'):
+        response = client.get('/api/stream', headers={'Last-Event-ID': bad})
+        assert response.status_code == 400
+    assert not broadcaster._subscribers
+
+
+def test_stream_resumes_and_unsubscribes_when_the_client_goes(database, broadcaster, monkeypatch):
+    database.log_entry('RAB123C', BASE)
+    database.log_entry('RAB124C', BASE + 1)
+    broadcaster.poll()
+    client = stream_client(broadcaster, monkeypatch)
+
+    response = client.get('/api/stream', headers={'Last-Event-ID': '1'}, buffered=False)
+    chunks = iter(response.response)
+    assert next(chunks) == b"retry: 3000\n\n"
+    assert len(broadcaster._subscribers) == 1
+    assert next(chunks).startswith(b"id: 2\nevent: entry\n")
+    response.close()
+    assert not broadcaster._subscribers
@@ -0,0 +1,52 @@
+import sqlite3
+import threading
+import time
+
+import db
+
+
+def is_closed(conn):
+    try:
+        conn.execute('SELECT 1')
+    except sqlite3.ProgrammingError:
+        return True
+    return False
+
+
+def test_close_waits_for_borrowed_connections(database):
+    pool = database._pool
+    idle, borrowed = pool.acquire(), pool.acquire()
+    pool.release(idle)
+
+    returner = threading.Timer(0.1, pool.release, (borrowed,))
+    returner.start()
+    started = time.monotonic()
+    pool.close(timeout=5)
+    returner.join()
+    assert time.monotonic() - started < 5
+    assert is_closed(idle) and is_closed(borrowed)
+
+    # The pool starts over with fresh connections
+    with database.connection() as conn:
+        assert conn not in (idle, borrowed) and not is_closed(conn)
+
+
+def test_close_closes_connections_that_are_never_returned(database):
+    pool = database._pool
+    kept = pool.acquire()
+    pool.close(timeout=0.05)
+    assert is_closed(kept)
+    pool.release(kept)  # A late return is dropped, not handed out again
+    with database.connection() as conn:
+        assert conn is not kept
+
+
+def test_pool_never_opens_more_than_its_size(database):
+    pool = db.ConnectionPool(size=2)
+    first, second = pool.acquire(), pool.acquire()
+    threading.Timer(0.05, pool.release, (first,)).start()
+    assert pool.acquire() is first
+    pool.release(first)
+    pool.release(second)
+    pool.close()
+    assert is_closed(first) and is_closed(second)
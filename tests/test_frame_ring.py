@@ -0,0 +1,70 @@
+import os
+from multiprocessing import resource_tracker
+
+import numpy as np
+import pytest
+
+from frame_ring import FrameRing
+
+
+@pytest.fixture
+def ring():
+    writer = FrameRing.create(f'pms-test-{os.getpid()}', (4, 6, 3), slots=3)
+    reader = FrameRing.attach(writer.name)
+    # attach() unregistered the block from this process's tracker; the writer still owns it
+    resource_tracker.register(writer.block._name, 'shared_memory')
+    yield writer, reader
+    reader.close()
+    writer.close()
+
+
+def frame(value):
+    return np.full((4, 6, 3), value, dtype=np.uint8)
+
+
+def test_reader_gets_the_newest_frame_and_counts_skips(ring):
+    writer, reader = ring
+    for value in (1, 2, 3):
+        writer.write(frame(value))
+    captured = reader.read(timeout=0)
+    assert captured.seq == 3 and (captured.image == 3).all()
+    assert reader.stats()['dropped'] == 2
+    assert reader.read(timeout=0) is None
+
+
+def test_frames_are_views_that_the_writer_leaves_alone_while_held(ring):
+    writer, reader = ring
+    writer.write(frame(1))
+    captured = reader.read(timeout=0)
+    assert np.shares_memory(captured.image, reader.frames)
+    assert not captured.image.flags.writeable
+    for value in (2, 3, 4, 5):
+        writer.write(frame(value))
+    assert (captured.image == 1).all()
+    assert reader.intact(captured)
+
+
+def test_intact_catches_a_slot_reused_while_in_use(ring):
+    writer, reader = ring
+    writer.write(frame(1))
+    captured = reader.read(timeout=0)
+    # The writer missed the hold (the race intact() exists for) and refilled the slot
+    slot = reader._held_slot
+    writer.slot_seq[slot] = 0
+    writer.frames[slot][:] = 2
+    writer._writing = slot
+    writer.commit()
+    assert not reader.intact(captured)
+    assert reader.stats()['torn'] == 1
+    assert reader.read(timeout=0).seq == 2
+
+
+def test_next_read_releases_the_previous_slot(ring):
+    writer, reader = ring
+    writer.write(frame(1))
+    first = reader.read(timeout=0)
+    writer.write(frame(2))
+    reader.read(timeout=0)
+    for value in (3, 4, 5):
+        writer.write(frame(value))
+    assert not reader.intact(first)  # Its slot was free to be reused
@@ -0,0 +1,68 @@
+import threading
+import time
+
+from gate_controller import ALARM, CLOSED, OPEN, GateController
+
+
+class FakeSerial:
+    """Records what the controller writes to the Arduino, and when."""
+
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append((time.monotonic(), data))
+
+    def commands(self):
+        return [data for _, data in self.writes]
+
+
+def closed_event():
+    closed = threading.Event()
+    return closed, lambda state: state == CLOSED and closed.set()
+
+
+def test_open_closes_after_the_hold():
+    ser = FakeSerial()
+    closed, on_change = closed_event()
+    gate = GateController(ser, hold_seconds=0.2, on_change=on_change)
+    started = time.monotonic()
+    gate.open()
+    assert closed.wait(2)
+    assert ser.commands() == [b'1', b'0']
+    assert ser.writes[1][0] - started >= 0.2
+    assert gate.state == CLOSED
+    gate.stop()
+
+
+def test_open_during_the_hold_extends_it():
+    ser = FakeSerial()
+    closed, on_change = closed_event()
+    gate = GateController(ser, hold_seconds=0.3, on_change=on_change)
+    gate.open()
+    time.sleep(0.15)
+    assert gate.state == OPEN
+    second = time.monotonic()
+    gate.open()  # Next car while the barrier is still up
+    assert closed.wait(2)
+    assert ser.commands() == [b'1', b'0']  # No second open, no close in between
+    assert ser.writes[1][0] - second >= 0.3
+    gate.stop()
+
+
+def test_stop_leaves_the_barrier_closed():
+    ser = FakeSerial()
+    gate = GateController(ser, hold_seconds=60)
+    gate.open()
+    gate.stop()
+    assert ser.commands() == [b'1', b'0']
+    assert gate.state == CLOSED and not gate._thread.is_alive()
+
+
+def test_stop_clears_a_sounding_alarm():
+    ser, states = FakeSerial(), []
+    gate = GateController(ser, alarm_seconds=60, on_change=states.append)
+    gate.alarm()
+    gate.stop()
+    assert ser.commands() == [b'2', b'3']
+    assert states == [ALARM, CLOSED]
@@ -0,0 +1,32 @@
+import metrics
+from metrics import Histogram, percentile
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 100) == 100
+    assert percentile([], 50) is None
+
+
+def test_percentile_rounds_ranks_up_for_small_samples():
+    assert percentile([1, 2, 3, 4, 5], 50) == 3
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile(list(range(1, 21)), 95) == 19
+    assert percentile(list(range(1, 21)), 99) == 20
+    assert percentile([7], 0) == 7
+
+
+def test_histogram_quantiles_match_percentile():
+    histogram = Histogram()
+    samples = [0.001 * n for n in (7, 3, 9, 1, 5, 2, 8, 4, 6, 10)]
+    for seconds in samples:
+        histogram.observe(seconds)
+    ordered = sorted(samples)
+    assert histogram.quantiles() == {q: percentile(ordered, q * 100) for q in metrics.QUANTILES}
+    assert histogram.quantiles()[0.5] == 0.005
+
+
+def test_empty_histogram_has_no_quantiles():
+    assert set(Histogram().quantiles().values()) == {None}
@@ -0,0 +1,94 @@
+import sqlite3
+import time
+
+import pytest
+
+import migrations
+
+RATE = 500
+
+
+def epoch(text):
+    return int(time.mktime(time.strptime(text, '%Y-%m-%d %H:%M:%S')))
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'car_logs.db'))
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+
+def legacy_database(conn):
+    """A v1 database as the old gate scripts and setup_database.py left it."""
+    for statement in migrations.V1_STATEMENTS:
+        conn.execute(statement)
+    conn.execute('CREATE TABLE car_logs (Plate TEXT, Paid INTEGER, `Entry Time` TEXT, '
+                 '`Exit Time` TEXT, `Amount Paid` INTEGER)')
+    conn.executemany('INSERT INTO car_entries (plate, payment_status, entry_time, exit_time) VALUES (?, ?, ?, ?)',
+                     [('RAB123C', 1, '2025-06-02 11:17:55', '2025-06-02 12:47:55'),
+                      ('RAC456D', 0, '2025-06-02 11:30:00', None)])
+    conn.execute("INSERT INTO incidents (plate, timestamp, incident_type) "
+                 "VALUES ('RAC456D', '2025-06-02 12:05:00', 'unpaid_exit')")
+    conn.execute("INSERT INTO car_logs VALUES ('RAE789F', 1, '2025-06-01 08:00:00', '2025-06-01 09:00:00', 700)")
+    conn.execute('PRAGMA user_version = 1')
+    conn.commit()
+
+
+def test_v1_to_v2_converts_times_and_backfills(conn):
+    legacy_database(conn)
+    assert migrations.migrate(conn, RATE, 1000) == 1
+    assert migrations.schema_version(conn) == migrations.LATEST_VERSION
+
+    rows = {row['plate']: row for row in conn.execute('SELECT * FROM car_entries')}
+    assert rows['RAB123C']['entry_time'] == epoch('2025-06-02 11:17:55')
+    assert rows['RAB123C']['exit_time'] == epoch('2025-06-02 12:47:55')
+    assert rows['RAB123C']['amount_paid'] == 2 * RATE  # 1.5 h, charged per started hour
+    assert rows['RAC456D']['exit_time'] is None and rows['RAC456D']['amount_paid'] is None
+    assert rows['RAE789F']['amount_paid'] == 700  # Imported from car_logs as recorded
+    assert conn.execute('SELECT timestamp FROM incidents').fetchone()[0] == epoch('2025-06-02 12:05:00')
+    assert not migrations._table_exists(conn, 'car_logs')
+
+    totals = conn.execute('SELECT SUM(entries), SUM(exits), SUM(revenue), SUM(incidents) '
+                          'FROM hourly_stats').fetchone()
+    assert tuple(totals) == (3, 2, 2 * RATE + 700, 1)
+    assert conn.execute('SELECT occupancy FROM parking_totals').fetchone()[0] == 1
+    # Converted rows are history, not changes
+    assert conn.execute('SELECT COUNT(*) FROM change_log').fetchone()[0] == 0
+
+
+def test_migrate_is_a_no_op_when_up_to_date(conn):
+    migrations.migrate(conn, RATE, 1000)
+    assert migrations.migrate(conn, RATE, 1000) == migrations.LATEST_VERSION
+
+
+def test_triggers_feed_the_change_log_and_stats(conn):
+    migrations.migrate(conn, RATE, 1000)
+    entry_time = epoch('2025-06-02 11:17:55')
+    entry_id = conn.execute('INSERT INTO car_entries (plate, payment_status, entry_time) VALUES (?, 0, ?)',
+                            ('RAB123C', entry_time)).lastrowid
+    assert conn.execute('SELECT occupancy FROM parking_totals').fetchone()[0] == 1
+    conn.execute('UPDATE car_entries SET payment_status = 1, exit_time = ?, amount_paid = ? WHERE id = ?',
+                 (entry_time + 5400, 2 * RATE, entry_id))
+    conn.execute('INSERT INTO incidents (plate, timestamp, incident_type) VALUES (?, ?, ?)',
+                 ('RAC456D', entry_time + 60, 'unpaid_exit'))
+    conn.commit()
+
+    changes = [tuple(row) for row in conn.execute('SELECT table_name, row_id, op FROM change_log ORDER BY seq')]
+    assert changes == [('car_entries', entry_id, 'insert'), ('car_entries', entry_id, 'update'),
+                       ('incidents', 1, 'insert')]
+    exit_hour = (entry_time + 5400) - (entry_time + 5400) % 3600
+    row = conn.execute('SELECT exits, revenue, dwell_seconds FROM hourly_stats WHERE hour = ?',
+                       (exit_hour,)).fetchone()
+    assert tuple(row) == (1, 2 * RATE, 5400)
+    assert conn.execute('SELECT occupancy FROM parking_totals').fetchone()[0] == 0
+
+
+def test_change_log_is_pruned_to_the_configured_size(conn):
+    migrations.migrate(conn, RATE, 3)
+    for n in range(10):
+        conn.execute("INSERT INTO car_entries (plate, payment_status, entry_time) VALUES (?, 0, ?)",
+                     (f'RAB12{n}C', 1_700_000_000 + n))
+    conn.commit()
+    assert [row[0] for row in conn.execute('SELECT seq FROM change_log ORDER BY seq')] == [8, 9, 10]
@@ -0,0 +1,52 @@
+import motion_trigger
+from motion_trigger import LaneTrigger
+
+
+class ScriptedSource:
+    """Presence source that replays a fixed list of readings."""
+
+    def __init__(self, readings):
+        self.readings = iter(readings)
+        self.active_flags = []
+
+    def present(self, frame, active=False):
+        self.active_flags.append(active)
+        return next(self.readings)
+
+
+def run(trigger, clock, steps, monkeypatch, dt=0.5):
+    monkeypatch.setattr(motion_trigger.time, 'monotonic', lambda: clock[0])
+    states = []
+    for _ in range(steps):
+        clock[0] += dt
+        states.append(trigger.update(None))
+    return states
+
+
+def test_single_positive_frame_does_not_activate(monkeypatch):
+    trigger = LaneTrigger(ScriptedSource([True, False, True, False]), on_frames=2)
+    assert run(trigger, [0.0], 4, monkeypatch) == [False] * 4
+    assert trigger.stats() == {'frames': 4, 'active': 0, 'skipped': 4}
+
+
+def test_lane_stays_active_through_short_gaps_and_idles_after_off_seconds(monkeypatch):
+    readings = [True, True, False, False, True] + [False] * 8
+    source = ScriptedSource(readings)
+    trigger = LaneTrigger(source, on_frames=2, off_seconds=3.0)
+    states = run(trigger, [0.0], len(readings), monkeypatch)
+    # Active from the second positive frame; the 1 s gap is bridged and the
+    # lane goes idle once more than 3 s pass without presence
+    assert states == [False, True, True, True, True, True, True, True, True, True, True, False, False]
+    assert source.active_flags[2] is True  # The source is told the lane is active
+
+
+def test_motion_detector_ignores_a_static_scene_and_sees_a_car():
+    import numpy as np
+
+    detector = motion_trigger.MotionDetector(width=80)
+    empty = np.full((120, 160, 3), 60, dtype=np.uint8)
+    car = empty.copy()
+    car[40:100, 40:120] = 220
+    assert not detector.present(empty)  # First frame only seeds the background
+    assert not detector.present(empty)
+    assert detector.present(car)
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+import ocr_bench
+
+
+@pytest.fixture
+def crops(tmp_path):
+    for name in ('RAG187P_20250602_111755.jpg', 'plate_0.jpg', 'plate_1.jpg', 'plate_2.jpg'):
+        (tmp_path / name).write_bytes(b'')
+    return tmp_path
+
+
+def test_labels_manifest_labels_unnamed_crops(crops):
+    (crops / 'labels.csv').write_text('file,plate\nplate_0.jpg,rab123c\nplate_1.jpg,NOTAPLATE\n')
+    labels = ocr_bench.load_labels(str(crops / 'labels.csv'))
+    corpus, skipped = ocr_bench.load_corpus(str(crops), labels=labels)
+    assert [(path.rsplit('/', 1)[-1], plate) for path, plate in corpus] == [
+        ('RAG187P_20250602_111755.jpg', 'RAG187P'), ('plate_0.jpg', 'RAB123C')]
+    assert skipped == 2
+
+
+def test_json_manifest_overrides_file_name(crops):
+    (crops / 'labels.json').write_text(json.dumps({'RAG187P_20250602_111755.jpg': 'RAG181P'}))
+    corpus, _ = ocr_bench.load_corpus(str(crops), labels=ocr_bench.load_labels(str(crops / 'labels.json')))
+    assert [plate for _, plate in corpus] == ['RAG181P']
+
+
+def test_benchmark_refuses_a_small_corpus(crops):
+    with pytest.raises(SystemExit, match='Only 1 labelled crops'):
+        ocr_bench.benchmark(str(crops), min_crops=10)
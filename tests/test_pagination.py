@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+flask = pytest.importorskip('flask')
+
+import dashboard_app
+from dashboard_app import decode_cursor, encode_cursor
+
+BASE = 1_700_000_000
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    token = encode_cursor(BASE, 42)
+    assert decode_cursor(token) == (BASE, 42)
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+
+
+def test_logs_page_walks_keyset_pages_without_gaps(database):
+    for n in range(5):
+        database.log_entry(f'RAB12{n}C', BASE + n // 2)  # Pairs share an entry time
+    pages, after = [], None
+    while True:
+        rows = database.logs_page(3, after=after)
+        pages.append([row['plate'] for row in rows[:2]])
+        if len(rows) <= 2:
+            break
+        after = (rows[1]['entry_time'], rows[1]['id'])
+    assert pages == [['RAB124C', 'RAB123C'], ['RAB122C', 'RAB121C'], ['RAB120C']]
+
+
+def test_logs_page_filters_by_plate_prefix(database):
+    for plate in ('RAB123C', 'RAC123C', 'RAB999Z'):
+        database.log_entry(plate, BASE)
+    assert sorted(row['plate'] for row in database.logs_page(10, plate_prefix='rab')) == ['RAB123C',
+                                                                                        'RAB999Z']
+
+
+def test_api_logs_streams_a_page_and_its_next_cursor(database):
+    for n in range(3):
+        database.log_entry(f'RAB12{n}C', BASE + n)
+    client = dashboard_app.app.test_client()
+    first = json.loads(client.get('/api/logs?limit=2').get_data())
+    assert [item['plate'] for item in first['items']] == ['RAB122C', 'RAB121C']
+    rest = json.loads(client.get(f"/api/logs?limit=2&cursor={first['next_cursor']}").get_data())
+    assert [item['plate'] for item in rest['items']] == ['RAB120C']
+    assert rest['next_cursor'] is None
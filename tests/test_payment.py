@@ -0,0 +1,44 @@
+import asyncio
+import gc
+
+import pytest
+
+pytest.importorskip('serial_asyncio')
+
+import process_payment
+from serial_service import SerialLineProtocol, SerialTerminal
+
+
+def _terminal():
+    terminal = SerialTerminal('/dev/null')
+    terminal._protocol = SerialLineProtocol(terminal.port)
+    return terminal
+
+
+def test_readline_fails_once_connection_is_lost():
+    async def scenario():
+        terminal = _terminal()
+        terminal._protocol.data_received(b'RAB123C,5000\n')
+        terminal._protocol.connection_lost(None)
+        assert await terminal.readline(1) == 'RAB123C,5000'
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await terminal.readline(1)
+        assert not terminal.is_open
+
+    asyncio.run(scenario())
+
+
+def test_plate_locks_are_dropped_after_payment(monkeypatch):
+    async def charge(plate, balance, terminal):
+        assert plate in process_payment._plate_locks
+
+    monkeypatch.setattr(process_payment, '_charge', charge)
+    asyncio.run(process_payment.process_payment('RAB123C', 5000, None))
+    gc.collect()
+    assert 'RAB123C' not in process_payment._plate_locks
+
+
+def test_parse_arduino_data():
+    assert process_payment.parse_arduino_data('RAB123C, 5000 RWF\r\n') == ('RAB123C', 5000)
+    assert process_payment.parse_arduino_data('garbage') == (None, None)
@@ -0,0 +1,65 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+import plate_archive
+from plate_archive import UNKNOWN_PLATE, PlateArchive, migrate_flat_directory
+
+
+def crop(seed):
+    return np.random.default_rng(seed).integers(0, 255, (40, 120, 3), dtype=np.uint8)
+
+
+def write(path, image, mtime=None):
+    cv2.imwrite(str(path), image)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_migration_imports_unlabelled_crops_by_mtime_and_skips_duplicates(tmp_path, database):
+    source, root = tmp_path / 'flat', tmp_path / 'archive'
+    source.mkdir()
+    mtime = time.mktime((2025, 6, 2, 11, 17, 55, 0, 0, -1))
+    write(source / 'RAG187P_20250602_111755.jpg', crop(1))
+    write(source / 'RAG187P_20250602_111756.jpg', crop(1))  # Same picture a second later
+    write(source / 'plate_0.jpg', crop(2), mtime)
+    write(source / 'plate_1.jpg', crop(2), mtime + 1)
+    write(source / 'plate_2.jpg', crop(3), mtime + 2)
+    (source / 'notes.txt').write_text('not a crop')
+
+    imported, duplicates, skipped = migrate_flat_directory(str(source), str(root))
+
+    assert (imported, duplicates, skipped) == (3, 2, 1)
+    assert (root / '2025/06/02/RAG187P_20250602_111755.jpg').exists()
+    assert (root / 'unknown/2025/06/02/plate_0.jpg').exists()
+    assert (root / 'unknown/2025/06/02/plate_2.jpg').exists()
+    assert sorted(os.listdir(source)) == ['RAG187P_20250602_111756.jpg', 'notes.txt', 'plate_1.jpg']
+    unknown = database.images_for_plate(UNKNOWN_PLATE)
+    assert sorted(row['path'] for row in unknown) == ['unknown/2025/06/02/plate_0.jpg',
+                                                      'unknown/2025/06/02/plate_2.jpg']
+    assert all(row['session_id'] is None for row in unknown)
+
+
+def test_store_files_unread_crops_under_unknown(tmp_path, database):
+    archive = PlateArchive(str(tmp_path))
+    first = archive.store(None, crop(4))
+    assert first.startswith(f"{plate_archive.UNKNOWN_SHARD}/")
+    assert os.path.exists(archive.full_path(first))
+    assert archive.store(None, crop(4)) is None
+    assert archive.stats() == {'stored': 1, 'deduped': 1}
+
+
+def test_each_session_of_a_returning_car_keeps_its_snapshot(tmp_path, database):
+    archive = PlateArchive(str(tmp_path))
+    first_visit = time.mktime((2025, 6, 2, 8, 0, 0, 0, 0, -1))
+    second_visit = first_visit + 86400
+    first_id = database.log_entry('RAB123C', int(first_visit))
+    assert archive.store('RAB123C', crop(5), time.localtime(first_visit))
+    assert archive.store('RAB123C', crop(5), time.localtime(first_visit + 2)) is None  # Same visit
+
+    second_id = database.log_entry('RAB123C', int(second_visit))
+    assert archive.store('RAB123C', crop(5), time.localtime(second_visit))
+    assert len(database.images_for_session(first_id)) == 1
+    assert len(database.images_for_session(second_id)) == 1
@@ -0,0 +1,55 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from plate_detector import Box, Detector, RegionDetector
+
+
+class StubDetector(Detector):
+    """Returns fixed boxes in the coordinates of whatever image it is given."""
+
+    name = 'stub'
+    imgsz = 320
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+        self.shapes = []
+
+    def detect(self, frame):
+        self.shapes.append(frame.shape)
+        return list(self.boxes)
+
+
+def frame(width=1280, height=720):
+    return np.zeros((height, width, 3), dtype=np.uint8)
+
+
+def test_boxes_in_the_roi_map_back_to_the_frame():
+    stub = StubDetector([Box(10, 20, 110, 60, 0.9)])
+    detector = RegionDetector(stub, roi=(0.25, 0.5, 0.75, 1.0))
+    (box,) = detector.detect(frame())
+    assert stub.shapes == [(360, 640, 3)]  # The region, not the frame
+    assert box == Box(320 + 10, 360 + 20, 320 + 110, 360 + 60, 0.9)
+
+
+def test_boxes_from_the_downscaled_roi_are_scaled_up():
+    stub = StubDetector([Box(10, 20, 110, 60, 0.8)])
+    detector = RegionDetector(stub, roi=(0.25, 0.5, 0.75, 1.0), detect_width=320)
+    (box,) = detector.detect(frame())
+    assert stub.shapes == [(180, 320, 3)]  # 640x360 region at half size
+    assert box == Box(320 + 20, 360 + 40, 320 + 220, 360 + 120, 0.8)
+
+
+def test_boxes_are_clipped_to_the_roi():
+    stub = StubDetector([Box(-4, -2, 330, 190, 0.7)])  # Overhangs the 320x180 input
+    detector = RegionDetector(stub, roi=(0.25, 0.5, 0.75, 1.0), detect_width=320)
+    (box,) = detector.detect(frame())
+    assert box == Box(320, 360, 960, 720, 0.7)
+
+
+def test_without_roi_or_downscaling_boxes_pass_through():
+    stub = StubDetector([Box(5, 6, 7, 8, 0.5)])
+    (box,) = RegionDetector(stub).detect(frame(640, 480))
+    assert stub.shapes == [(480, 640, 3)]
+    assert box == Box(5, 6, 7, 8, 0.5)
@@ -0,0 +1,100 @@
+import session_cache
+from plate_index import MAX_COST, PlateIndex, normalize_read, substitution_cost
+from plate_pipeline import extract_plate
+
+
+def make_index(*plates, max_cost=MAX_COST):
+    index = PlateIndex(max_cost=max_cost)
+    for plate in plates:
+        index.add(plate)
+    return index
+
+
+# ===== Costs and normalisation =====
+def test_substitution_cost_is_zero_for_identical_plates():
+    assert substitution_cost('RAB123C', 'RAB123C') == 0
+
+
+def test_substitution_cost_charges_less_for_known_confusions():
+    assert substitution_cost('RAB123C', 'RAB128C') == 1  # 3/8
+    assert substitution_cost('RAB123C', 'RAB124C') == 2  # 3/4 is not a known confusion
+    assert substitution_cost('RAD123C', 'RAO128C') == 2  # D/O + 3/8
+
+
+def test_substitution_cost_is_symmetric():
+    assert substitution_cost('RAB128C', 'RAB123C') == substitution_cost('RAB123C', 'RAB128C')
+
+
+def test_normalize_read_fixes_cross_class_lookalikes():
+    assert normalize_read('RA8I23C') == 'RAB123C'
+    assert normalize_read('rab12oc') == 'RAB120C'
+    assert normalize_read('RAB 123 C') == 'RAB123C'
+
+
+def test_extract_plate_accepts_cross_class_lookalikes():
+    assert extract_plate('RAB12OC') == 'RAB120C'
+    assert extract_plate('xxRA8123C') == 'RAB123C'
+    assert extract_plate('RAB1Z3C') == 'RAB123C'
+    assert extract_plate('RAB12XC') is None
+    assert extract_plate('RAB12') is None
+
+
+# ===== Matching =====
+def test_match_returns_exact_plate():
+    assert make_index('RAB123C', 'RAC555B').match('RAB123C') == 'RAB123C'
+
+
+def test_match_resolves_one_known_confusion():
+    index = make_index('RAB123C', 'RAC555B')
+    assert index.match('RAB128C') == 'RAB123C'
+    assert index.match('RA8I23C') == 'RAB123C'  # Cross-class lookalikes are normalised first
+
+
+def test_match_rejects_substitutions_above_max_cost():
+    index = make_index('RAB123C')
+    assert index.match('RAB124C') is None  # Cost 2
+    assert index.match('RAB188C') is None  # Two substitutions
+    assert make_index('RAB123C', max_cost=2).match('RAB124C') == 'RAB123C'
+
+
+def test_match_is_ambiguous_when_two_plates_tie():
+    index = make_index('RAD128E', 'RAD126E')
+    assert index.match('RAD129E') is None  # 9~8 and 9~6 cost the same
+
+
+def test_match_prefers_the_cheaper_candidate():
+    index = make_index('RAD128E', 'RAD124E', max_cost=2)
+    assert index.match('RAD129E') == 'RAD128E'  # 9~8 costs 1, 9->4 costs 2
+
+
+def test_match_honours_accept():
+    index = make_index('RAB123C')
+    assert index.match('RAB128C', accept=lambda plate: False) is None
+
+
+def test_remove_drops_plate_from_matches():
+    index = make_index('RAB123C', 'RAC555B')
+    index.remove('RAB123C')
+    assert index.match('RAB128C') is None
+    assert 'RAB123C' not in index
+    assert len(index) == 1
+    index.remove('RAB123C')  # Removing twice is harmless
+
+
+# ===== SessionCache =====
+def test_session_cache_match_answers_misses_from_memory(database, monkeypatch):
+    database.log_entry('RAB123C', 1_700_000_000)
+    database.log_entry('RAC555B', 1_700_000_000)
+    cache = session_cache.SessionCache()
+    cache._conn = database.open_connection()
+    cache._reload()
+
+    def no_db(plate):
+        raise AssertionError("match() must not query the database")
+    monkeypatch.setattr(database, 'latest_session', no_db)
+
+    assert cache.match('RAB128C') == 'RAB123C'
+    assert cache.match('RAX777Y') is None
+    cache.mark_exited('RAB123C')
+    assert cache.match('RAB128C') is None
+    cache._conn.close()
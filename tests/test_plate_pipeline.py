@@ -0,0 +1,169 @@
+from collections import namedtuple
+
+from plate_pipeline import EntryDecider, ExitDecider, MultiVariantOcr, PlateRead, fuse_reads
+from plate_tracker import PlateTracker
+
+# Same shape as ocr_engine.OcrResult (importing it needs pytesseract)
+OcrResult = namedtuple('OcrResult', ['text', 'char_confidences', 'confidence'])
+
+
+def result(text, confidence=90.0):
+    return OcrResult(text, [confidence] * len(text), confidence)
+
+
+def test_fuse_reads_votes_per_position_by_confidence():
+    fused = fuse_reads({
+        'adaptive': result('RAB123C', 90),
+        'otsu': result('RAB128C', 40),
+        'upscaled': result('xRAB123C', 80),  # Aligned on its 'RA'
+    })
+    assert fused.plate == 'RAB123C'
+    assert fused.confidence == round((90 + 80) / 3, 1)  # Position 5 is only two-thirds agreed
+    assert fused.texts['upscaled'] == 'xRAB123C'
+
+
+def test_fuse_reads_fixes_lookalikes_before_voting():
+    fused = fuse_reads({'a': result('RA8I23C'), 'b': result('RAB1Z3C')})
+    assert fused.plate == 'RAB123C'
+    assert fused.confidence == 90.0
+
+
+def test_fuse_reads_without_a_plate_window():
+    assert fuse_reads({'a': result('RAB12'), 'b': result('HELLO')}).plate is None
+    assert fuse_reads({'a': result('RA?123C')}).plate is None
+
+
+def test_multi_variant_ocr_runs_every_variant():
+    seen = []
+
+    class Ocr:
+        def recognize(self, image):
+            seen.append(image)
+            return result('RAB123C')
+
+    ocr = MultiVariantOcr(Ocr(), variants=('adaptive', 'otsu'))
+    ocr.variants = {'adaptive': lambda crop: 'adaptive', 'otsu': lambda crop: 'otsu'}
+    fused, processed = ocr.recognize(None)
+    ocr.close()
+    assert fused.plate == 'RAB123C' and processed == 'adaptive'
+    assert sorted(seen) == ['adaptive', 'otsu']
+
+
+def test_confident_reads_settle_the_track_early():
+    tracker = PlateTracker(votes_needed=3, lock_confidence=85, confirm_confidence=60)
+    locked, track = tracker.update([(0, 0, 100, 40), (500, 0, 600, 40)])
+    assert tracker.add_read(locked, 'RAB123C', 90) == 'RAB123C'
+
+    assert tracker.add_read(track, 'RAC456D', 70) is None
+    assert tracker.add_read(track, 'RAC456D', 30) is None  # Too unsure to confirm
+    assert tracker.add_read(track, 'RAC456D', 65) == 'RAC456D'
+
+
+def test_variants_without_a_plate_count_against_the_confidence():
+    tracker = PlateTracker()
+    fused = fuse_reads({
+        'adaptive': result('RAB123C', 90),
+        'otsu': result('###', 0),
+        'upscaled': result('RA', 50),
+        'deskewed': result('', 0),
+    })
+    assert fused.plate == 'RAB123C'
+    assert fused.confidence == 22.5
+    assert fused.confidence < tracker.lock_confidence
+    (track,) = tracker.update([(0, 0, 100, 40)])
+    assert tracker.add_read(track, fused.plate, fused.confidence) is None
+
+
+def test_reads_from_an_overwritten_frame_never_reach_the_tracker():
+    import numpy as np
+
+    from plate_detector import Box
+    from plate_pipeline import PlatePipeline
+
+    class Detector:
+        def detect(self, frame):
+            return [Box(0, 0, 20, 10, 0.9), Box(30, 0, 50, 10, 0.9)]
+
+    class Ocr:
+        def recognize(self, image):
+            return result('RAB123C')
+
+    tracker = PlateTracker(lock_confidence=0)
+    pipeline = PlatePipeline(Detector(), Ocr(), tracker, lambda crop: crop)
+    image = np.zeros((20, 60, 3), dtype=np.uint8)
+    boxes, reads = pipeline.process(image, intact=lambda: False)
+    assert len(boxes) == 2 and reads == []
+    assert all(track.plate is None and not track.reads for track in tracker.tracks.values())
+    _, reads = pipeline.process(image, intact=lambda: True)
+    assert [read.candidate for read in reads] == ['RAB123C', 'RAB123C']
+
+
+class FakeSessions:
+    """SessionCache stand-in with a fixed set of paid plates."""
+
+    def __init__(self, paid):
+        self.paid = set(paid)
+        self.exited = []
+
+    def is_paid(self, plate):
+        return plate in self.paid
+
+    def match(self, plate):
+        # One substitution away from a paid plate is that plate
+        for paid in self.paid:
+            if len(paid) == len(plate) and sum(a != b for a, b in zip(paid, plate)) == 1:
+                return paid
+        return None
+
+    def mark_exited(self, plate):
+        self.paid.discard(plate)
+        self.exited.append(plate)
+
+
+class FakeGate:
+    def __init__(self):
+        self.commands = []
+
+    def open(self):
+        self.commands.append('open')
+
+    def alarm(self):
+        self.commands.append('alarm')
+
+
+def exit_decider(paid):
+    sessions, gate, incidents = FakeSessions(paid), FakeGate(), []
+    decider = ExitDecider(sessions, PlateTracker(), gate, incidents.append)
+    (track,) = decider.tracker.update([(0, 0, 100, 40)])
+    return decider, track, sessions, gate, incidents
+
+
+def test_exit_decider_lets_a_paid_car_out():
+    decider, track, sessions, gate, incidents = exit_decider(['RAB123C'])
+    assert decider.decide(PlateRead(track, None, None, 'RAB123C', 'RAB123C')) == ('RAB123C', 'open')
+    assert sessions.exited == ['RAB123C'] and gate.commands == ['open'] and incidents == []
+
+
+def test_exit_decider_resolves_a_near_miss_on_a_single_read():
+    decider, track, sessions, gate, incidents = exit_decider(['RAB123C'])
+    assert decider.decide(PlateRead(track, None, None, 'RAB128C', None)) == ('RAB123C', 'open')
+    assert track.plate == 'RAB123C'  # Settled: no more OCR on this car
+    assert sessions.exited == ['RAB123C'] and gate.commands == ['open']
+
+
+def test_exit_decider_alarms_on_the_plate_that_was_read():
+    decider, track, sessions, gate, incidents = exit_decider(['RAB123C'])
+    assert decider.decide(PlateRead(track, None, None, 'RAC555B', None)) is None  # Still voting
+    assert decider.decide(PlateRead(track, None, None, 'RAC555B', 'RAC555B')) == ('RAC555B', 'alarm')
+    assert gate.commands == ['alarm'] and incidents == ['RAC555B'] and sessions.exited == []
+
+
+def test_entry_decider_opens_once_per_cooldown():
+    gate, entries = FakeGate(), []
+    decider = EntryDecider(gate, lambda plate, timestamp, crop: entries.append((plate, crop)))
+    tracker = PlateTracker()
+    (track,) = tracker.update([(0, 0, 100, 40)])
+    assert decider.decide(PlateRead(track, 'crop', None, 'RAB123C', None)) is None  # Still voting
+    assert decider.decide(PlateRead(track, 'crop', None, 'RAB123C', 'RAB123C')) == ('RAB123C', 'open')
+    assert decider.decide(PlateRead(track, 'crop', None, 'RAB123C', 'RAB123C')) is None  # Cooldown
+    assert gate.commands == ['open'] and entries == [('RAB123C', 'crop')]
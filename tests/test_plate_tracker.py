@@ -0,0 +1,56 @@
+from plate_tracker import PlateTracker, box_iou
+
+
+def test_box_iou():
+    assert box_iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert box_iou((0, 0, 10, 10), (5, 0, 15, 10)) == 50 / 150
+    assert box_iou((0, 0, 10, 10), (20, 20, 30, 30)) == 0.0
+
+
+def test_update_follows_a_moving_box_and_expires_it():
+    tracker = PlateTracker(max_missed=2)
+    (first,) = tracker.update([(100, 100, 200, 140)])
+    (same,) = tracker.update([(110, 102, 210, 142)])  # Overlapping: matched on IoU
+    (jumped,) = tracker.update([(110, 130, 210, 170)])  # Too little overlap: centroid fallback
+    assert first is same is jumped
+    for _ in range(3):
+        tracker.update([])
+    assert tracker.tracks == {}
+
+
+def test_separate_plates_get_separate_tracks():
+    tracker = PlateTracker()
+    left, right = tracker.update([(0, 0, 100, 40), (500, 0, 600, 40)])
+    assert left is not right
+
+
+def test_consensus_needs_votes_and_then_stops_ocr():
+    tracker = PlateTracker(votes_needed=3, window=5)
+    (track,) = tracker.update([(0, 0, 100, 40)])
+    assert tracker.add_read(track, 'RAB123C') is None
+    assert tracker.add_read(track, 'RAB128C') is None
+    assert tracker.add_read(track, 'RAB123C') is None
+    assert tracker.add_read(track, 'RAB123C') == 'RAB123C'
+    assert not track.needs_ocr
+    assert tracker.add_read(track, 'RAB123C') is None  # Reported once only
+
+    tracker.update([(0, 0, 100, 40)])
+    assert tracker.stats()['ocr_skipped'] == 1
+
+
+def test_votes_only_count_within_the_window():
+    tracker = PlateTracker(votes_needed=2, window=2)
+    (track,) = tracker.update([(0, 0, 100, 40)])
+    for plate in ('RAB123C', 'RAB128C', 'RAB129C'):
+        assert tracker.add_read(track, plate) is None
+    assert tracker.add_read(track, 'RAB129C') == 'RAB129C'
+
+
+def test_settle_locks_a_track_to_a_known_plate():
+    tracker = PlateTracker()
+    (track,) = tracker.update([(0, 0, 100, 40)])
+    tracker.add_read(track, 'RAB128C')
+    assert tracker.settle(track, 'RAB123C') == 'RAB123C'
+    assert track.plate == 'RAB123C' and not track.needs_ocr
+    assert tracker.settle(track, 'RAC456D') is None  # Already settled
+    assert tracker.add_read(track, 'RAB128C') is None
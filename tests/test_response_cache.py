@@ -0,0 +1,71 @@
+import pytest
+
+flask = pytest.importorskip('flask')
+
+import response_cache
+from response_cache import ResponseCache, conditional
+
+
+def test_cache_serves_only_the_current_version():
+    cache = ResponseCache(ttl=60, max_entries=2)
+    cache.put('/a', '1', b'one')
+    assert cache.get('/a', '1') == b'one'
+    assert cache.get('/a', '2') is None
+    cache.put('/b', '1', b'two')
+    cache.get('/a', '1')
+    cache.put('/c', '1', b'three')  # Evicts /b, the least recently used
+    assert cache.get('/b', '1') is None
+    assert cache.get('/a', '1') == b'one'
+
+
+def test_cache_entries_expire(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(response_cache.time, 'monotonic', lambda: clock[0])
+    cache = ResponseCache(ttl=30)
+    cache.put('/a', '1', b'one')
+    clock[0] += 31
+    assert cache.get('/a', '1') is None
+
+
+@pytest.fixture
+def app(monkeypatch):
+    state = {'seq': 1, 'hour': '2025060211', 'calls': 0, 'now': 1_700_000_000}
+    monkeypatch.setattr(response_cache.db, 'current_change_seq', lambda: state['seq'])
+    monkeypatch.setattr(response_cache.time, 'time', lambda: state['now'])
+    monkeypatch.setattr(response_cache, '_cache', ResponseCache())
+    monkeypatch.setattr(response_cache, '_marker', {'seq': None, 'changed_at': None})
+    app = flask.Flask(__name__)
+
+    @app.route('/stats')
+    @conditional(vary=lambda: state['hour'])
+    def stats():
+        state['calls'] += 1
+        return flask.jsonify(calls=state['calls'])
+
+    return app.test_client(), state
+
+
+def test_etag_revalidation_and_cached_body(app):
+    client, state = app
+    first = client.get('/stats')
+    assert first.status_code == 200 and state['calls'] == 1
+    etag = first.headers['ETag']
+    assert client.get('/stats', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/stats').get_json() == {'calls': 1}  # From the cache
+    assert state['calls'] == 1
+
+    state['seq'] += 1
+    assert client.get('/stats', headers={'If-None-Match': etag}).status_code == 200
+    assert state['calls'] == 2
+
+
+def test_last_modified_moves_when_the_vary_state_changes(app):
+    client, state = app
+    last_modified = client.get('/stats').headers['Last-Modified']
+    state['now'] += 60
+    assert client.get('/stats', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+    state['hour'], state['now'] = '2025060212', state['now'] + 3600
+    response = client.get('/stats', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 200
+    assert response.headers['Last-Modified'] != last_modified
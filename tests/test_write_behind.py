@@ -0,0 +1,62 @@
+import json
+import sqlite3
+
+import db
+import write_behind
+from write_behind import WriteBehind
+
+
+def make_writer(tmp_path, retries=2):
+    return WriteBehind(image_workers=1, flush_interval=0.01, retry_delays=(0,) * retries,
+                       failed_rows_file=str(tmp_path / 'failed.jsonl'))
+
+
+def test_failed_batch_is_retried_until_it_commits(tmp_path, monkeypatch):
+    written, failures = [], [sqlite3.OperationalError('database is locked')] * 2
+
+    def run_batch(statements):
+        if failures:
+            raise failures.pop()
+        written.extend(statements)
+    monkeypatch.setattr(db, 'run_batch', run_batch)
+
+    writer = make_writer(tmp_path)
+    writer.log_entry('RAB123C', 1_700_000_000)
+    writer.close()
+
+    assert [params for _, params in written] == [('RAB123C', 1_700_000_000)]
+    assert writer.stats()['write_errors'] == 2
+    assert writer.stats()['rows_failed'] == 0
+    assert not (tmp_path / 'failed.jsonl').exists()
+
+
+def test_rows_that_keep_failing_are_saved_not_dropped(tmp_path, monkeypatch):
+    written = []
+
+    def run_batch(statements):
+        if any(params[0] == 'BAD' for _, params in statements):
+            raise sqlite3.OperationalError('disk I/O error')
+        written.extend(statements)
+    monkeypatch.setattr(db, 'run_batch', run_batch)
+
+    writer = make_writer(tmp_path, retries=1)
+    writer._flush([(db.SQL_INSERT_ENTRY, ('RAB123C', 1)), (db.SQL_INSERT_ENTRY, ('BAD', 2)),
+                   (db.SQL_INSERT_ENTRY, ('RAC555B', 3))])
+    writer.close()
+
+    # The good rows still get in; only the bad one is set aside
+    assert [params[0] for _, params in written] == ['RAB123C', 'RAC555B']
+    saved = [json.loads(line) for line in (tmp_path / 'failed.jsonl').read_text().splitlines()]
+    assert [row['params'] for row in saved] == [['BAD', 2]]
+    assert writer.stats()['rows_failed'] == 1
+
+
+def test_replay_failed_writes_saved_rows(tmp_path, monkeypatch):
+    path = tmp_path / 'failed.jsonl'
+    path.write_text(json.dumps({'sql': db.SQL_INSERT_ENTRY, 'params': ['RAB123C', 1]}) + '\n')
+    replayed = []
+    monkeypatch.setattr(db, 'run_batch', replayed.extend)
+
+    assert write_behind.replay_failed(str(path)) == 1
+    assert replayed == [(db.SQL_INSERT_ENTRY, ['RAB123C', 1])]
+    assert not path.exists()
@@ -1,20 +1,27 @@
 import sqlite3
+import time
 
 # Connect to the SQLite database
 conn = sqlite3.connect('car_logs.db')
 cursor = conn.cursor()
 
 # Query all records
-cursor.execute('SELECT id, plate, payment_status, entry_time, exit_time FROM car_entries')
+cursor.execute('SELECT id, plate, payment_status, entry_time, exit_time, amount_paid FROM car_entries')
 rows = cursor.fetchall()
 
+
+def fmt(timestamp):
+    # Times are stored as Unix epoch seconds
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp)) if timestamp else '-'
+
+
 # Display records
 if rows:
-    print(f"{'ID':<5} {'Plate':<10} {'Paid':<6} {'Entry Time':<20} {'Exit Time'}")
-    print("-" * 60)
+    print(f"{'ID':<5} {'Plate':<10} {'Paid':<6} {'Entry Time':<20} {'Exit Time':<20} {'Amount'}")
+    print("-" * 75)
     for row in rows:
-        id, plate, paid, entry, exit_time = row
-        print(f"{id:<5} {plate:<10} {paid:<6} {entry:<20} {exit_time}")
+        id, plate, paid, entry, exit_time, amount = row
+        print(f"{id:<5} {plate:<10} {paid:<6} {fmt(entry):<20} {fmt(exit_time):<20} {amount if amount is not None else '-'}")
 else:
     print("No records found.")
 
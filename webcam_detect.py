@@ -1,8 +1,16 @@
-from ultralytics import YOLO
+import argparse
+
 import cv2
 
-# Load your trained model
-model = YOLO('best.pt')  # Update path if needed
+from plate_detector import add_detector_arguments, detector_from_args, draw_boxes
+
+parser = argparse.ArgumentParser(description="Live plate detection preview")
+add_detector_arguments(parser)  # --backend, --server, --imgsz, --roi, ... (plate_detector.py)
+parser.set_defaults(conf=0.5)
+args = parser.parse_args()
+
+# Load the plate detector (or connect to the shared inference server)
+detector = detector_from_args(args)
 
 # Open webcam (0 = default cam)
 cap = cv2.VideoCapture(0)
@@ -17,13 +25,9 @@ while True:
         print("❌ Failed to grab frame")
         break
 
-    # Run detection
-    results = model.predict(frame, stream=True, conf=0.5)
-
-    # Display results
-    for r in results:
-        annotated_frame = r.plot()
-        cv2.imshow("License Plate Detection", annotated_frame)
+    # Run detection and display results
+    boxes = detector.detect(frame)
+    cv2.imshow("License Plate Detection", draw_boxes(frame, boxes))
 
     # Exit on 'q' key
     if cv2.waitKey(1) & 0xFF == ord('q'):
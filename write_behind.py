@@ -0,0 +1,173 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+import db
+import metrics
+
+# Seconds to wait before each retry of a batch that failed (e.g. 'database is locked')
+RETRY_DELAYS = (0.5, 1, 2, 5, 10)
+# Rows that still fail after every retry are appended here instead of being lost;
+# replay them with replay_failed() once the cause is fixed
+FAILED_ROWS_FILE = 'write_behind_failed.jsonl'
+
+
+class WriteBehind:
+    """
+    Takes snapshot writes and DB inserts off the gate's critical path.
+
+    save_image() hands JPEG encoding and the file write to a small thread pool
+    (cv2.imwrite releases the GIL). log_entry() and log_incident() queue rows
+    for a writer thread that groups them into one transaction per batch,
+    flushing at most `flush_interval` seconds after the first queued row.
+    close() drains both and must be called on shutdown.
+
+    A batch that fails is retried with backoff (RETRY_DELAYS) before anything
+    queued after it, so rows keep their order. If it still fails, its rows are
+    retried one by one and the ones that cannot be written go to
+    `failed_rows_file`. Entry rows are the billing record; none are dropped.
+    """
+
+    def __init__(self, image_workers=2, batch_size=50, flush_interval=0.5,
+                 retry_delays=RETRY_DELAYS, failed_rows_file=FAILED_ROWS_FILE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delays = retry_delays
+        self.failed_rows_file = failed_rows_file
+        self._images = ThreadPoolExecutor(max_workers=image_workers, thread_name_prefix='snapshot')
+        self._rows = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+        self.images_written = 0
+        self.rows_written = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.rows_failed = 0
+
+    # ===== Producers (non-blocking) =====
+    def save_image(self, path, image):
+        # Own a copy: the crop is a view into a frame the loop will drop
+        self._images.submit(self._write_image, path, image.copy())
+
+    def log_entry(self, plate, entry_time):
+        self._rows.put((db.SQL_INSERT_ENTRY, (plate, entry_time)))
+
+    def log_incident(self, plate, timestamp, incident_type):
+        self._rows.put((db.SQL_INSERT_INCIDENT, (plate, timestamp, incident_type)))
+
+    def execute(self, sql, params):
+        """Queues any other statement; it runs after everything queued before it."""
+        self._rows.put((sql, params))
+
+    # ===== Workers =====
+    def _write_image(self, path, image):
+        try:
+            with metrics.span('snapshot_write'):
+                written = cv2.imwrite(path, image)
+            if not written:
+                print(f"[ERROR] Could not write snapshot {path}")
+                return
+            self.images_written += 1
+        except Exception as e:
+            print(f"[ERROR] Snapshot write failed for {path}: {e}")
+
+    def _run(self):
+        while True:
+            try:
+                first = self._rows.get(timeout=0.2)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    return
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._rows.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _write(self, batch):
+        """One attempt at a batch; returns the error, or None once it is committed."""
+        try:
+            with metrics.span('db_write'):
+                db.run_batch(batch)
+        except Exception as e:
+            self.write_errors += 1
+            metrics.inc('db_write_errors')
+            return e
+        metrics.inc('db_rows_written', len(batch))
+        self.rows_written += len(batch)
+        self.batches += 1
+        return None
+
+    def _flush(self, batch):
+        error = self._write(batch)
+        for delay in self.retry_delays:
+            if error is None:
+                return
+            print(f"[WRITER] Flush of {len(batch)} rows failed ({error}); retrying in {delay}s")
+            time.sleep(delay)
+            error = self._write(batch)
+        if error is None:
+            return
+
+        # Still failing: isolate bad rows so the rest of the batch gets in
+        failed = []
+        for row in batch:
+            row_error = self._write([row]) if len(batch) > 1 else error
+            if row_error is not None:
+                failed.append((row, row_error))
+        if failed:
+            self._save_failed(failed)
+
+    def _save_failed(self, failed):
+        self.rows_failed += len(failed)
+        metrics.inc('db_rows_failed', len(failed))
+        lines = [json.dumps({'sql': sql, 'params': list(params), 'error': str(error),
+                             'failed_at': int(time.time())})
+                 for (sql, params), error in failed]
+        try:
+            with open(self.failed_rows_file, 'a') as f:
+                f.write('\n'.join(lines) + '\n')
+            print(f"[ERROR] {len(failed)} rows could not be written; saved to {self.failed_rows_file}")
+        except OSError as e:
+            # Last resort (e.g. disk full): keep the rows in the log
+            print(f"[ERROR] {len(failed)} rows could not be written or saved ({e}):")
+            for line in lines:
+                print(f"[ERROR]   {line}")
+
+    def stats(self):
+        return {'images': self.images_written, 'rows': self.rows_written,
+                'batches': self.batches, 'pending_rows': self._rows.qsize(),
+                'write_errors': self.write_errors, 'rows_failed': self.rows_failed}
+
+    def close(self):
+        """Flushes pending snapshots and rows, then stops the workers."""
+        self._images.shutdown(wait=True)
+        self._stopped.set()
+        self._thread.join()  # The writer drains the queue, retries included, before it exits
+
+
+def replay_failed(path=FAILED_ROWS_FILE):
+    """
+    Re-runs the rows saved by a WriteBehind, in order, in one transaction.
+    The file is renamed to <path>.done once they are in. Returns the row count.
+    """
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    db.run_batch([(row['sql'], row['params']) for row in rows])
+    os.replace(path, path + '.done')
+    return len(rows)